@@ -1,8 +1,115 @@
+import os
+import uuid
+from functools import partial
+
 import streamlit as st
-import pandas as pd
-import io
-import matplotlib.pyplot as plt
-from datetime import datetime
+
+from passerelles.chargement import charger_codes_client, empreinte
+from passerelles.diagnostic import Diagnostic, outils_profil
+from passerelles.export import FORMATS, exporter_excel, titres_export
+from passerelles.magasin import magasin_disponible, ouvrir_magasin
+from passerelles.parcours import NB_ETAPES_MAX, SEUIL_SCORE, graphe_passerelles
+from passerelles.recherche import MODES, charger_referentiel, metiers_du_mode, partages, sens_bruts
+from passerelles.referentiel import TOUS_LES_SECTEURS
+from passerelles.taches import TERMINEE, GestionnaireTaches
+
+
+@st.cache_resource(max_entries=4, show_spinner="Préparation du référentiel…")
+def referentiel_partage(cle, _donnees):
+    """Instantané du référentiel, construit une fois par empreinte pour toutes les sessions."""
+    return charger_referentiel(_donnees, cle=cle)
+
+
+@st.cache_resource(max_entries=4)
+def magasin_partage(cle):
+    """Similarités précalculées du référentiel (tableaux projetés en mémoire à la demande)."""
+    return ouvrir_magasin(cle)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def partages_en_cache(cle_referentiel, cle_client, mode, code, _referentiel, _arrivee, _magasin=None):
+    """Comptes de compétences partagées par (métier d'arrivée, catégorie).
+
+    Indépendants des pondérations et des catégories cochées : les modifier ne
+    fait que recombiner ces comptes. Lus dans le magasin précalculé s'il existe.
+    """
+    return partages(_referentiel, code, _arrivee, magasin=_magasin)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def export_en_cache(cle_referentiel, cle_client, mode, code, poids, _detail, _metier):
+    """Classeur Excel des passerelles filtrées, produit au premier téléchargement seulement."""
+    return exporter_excel(_detail, "Passerelles filtrées", titres_export(_metier, [cat for cat, _ in poids], dict(poids)))
+
+
+@st.cache_resource(max_entries=4, show_spinner="Construction du graphe des passerelles…")
+def graphe_partage(cle_referentiel, poids, seuil, _referentiel):
+    """Graphe des passerelles d'un référentiel, une fois par (pondérations, seuil) pour toutes les sessions."""
+    return graphe_passerelles(_referentiel, dict(poids), seuil=seuil)
+
+
+@st.cache_resource
+def gestionnaire_taches():
+    """Registre des exports en arrière-plan, commun à toutes les sessions."""
+    return GestionnaireTaches()
+
+
+def afficher_progression(etat):
+    """Une barre de progression par sens calculé."""
+    for nom, fraction in etat.progression.items():
+        st.markdown(f"🔄 Calcul des {nom.lower()}...")
+        st.progress(min(fraction, 1.0))
+
+
+@st.fragment(run_every=1)
+def suivre_tache(gestionnaire, identifiant):
+    """Suivi d'une tâche d'arrière-plan, rafraîchi chaque seconde."""
+    etat = gestionnaire.etat(identifiant)
+    if etat is None or not etat.active:
+        st.rerun()
+    st.markdown("###\n### ⏳ Génération des passerelles brutes...")
+    afficher_progression(etat)
+    st.caption(etat.message)
+    st.button("⏹️ Annuler", on_click=gestionnaire.annuler, args=(identifiant,))
+
+
+def demander_profil():
+    st.session_state["profil_demande"] = True
+
+
+# ------------------------------
+# 🩺 Diagnostic (PASSERELLES_DIAGNOSTIC=1) : durée, CPU, mémoire et lignes par étape
+# ------------------------------
+st.session_state.setdefault("diagnostic_session", uuid.uuid4().hex[:12])
+st.session_state["diagnostic_execution"] = st.session_state.get("diagnostic_execution", 0) + 1
+diagnostic = Diagnostic(contexte={
+    "session": st.session_state["diagnostic_session"],
+    "execution": st.session_state["diagnostic_execution"],
+})
+if diagnostic.actif and st.session_state.pop("profil_demande", False):
+    diagnostic.demarrer_profil(st.session_state.get("outil_profil", "cProfile"))
+
+
+def afficher_diagnostic():
+    """Clôt les mesures de l'exécution et en affiche le détail (mode diagnostic)."""
+    if not diagnostic.actif:
+        return
+    diagnostic.terminer()
+    with st.expander("🩺 Diagnostic de cette exécution"):
+        diagnostic.arreter_profil()
+        if diagnostic.etapes:
+            st.dataframe(diagnostic.tableau())
+        st.radio("Profileur", outils_profil(), horizontal=True, key="outil_profil")
+        st.button("🔬 Profiler la prochaine exécution", on_click=demander_profil)
+        if diagnostic.profil:
+            st.code(diagnostic.profil)
+
+
+def arreter():
+    """``st.stop()`` précédé du diagnostic : ni la mesure ni le profil demandé ne sont perdus."""
+    afficher_diagnostic()
+    st.stop()
+
 
 # ------------------------------
 # 🔐 Sécurité : accès par mot de passe
@@ -13,7 +120,7 @@ password = st.text_input("🔒 Veuillez entrer le mot de passe pour accéder à
 
 if password != CORRECT_PASSWORD:
     st.warning("Mot de passe incorrect ou manquant. Veuillez entrer le bon mot de passe.")
-    st.stop()
+    arreter()
 
 # ------------------------------
 # TITRE & UPLOAD
@@ -53,7 +160,7 @@ if fichier_competences and fichier_client:
     # CHOIX DU MODE ET DES OPTIONS
     # ------------------------------
     st.markdown("###\n**🔍 3. Type de passerelle**")
-    mode = st.radio("", ["Passerelle entrante", "Passerelle sortante"])
+    mode = st.radio("", MODES)
 
     st.markdown("###\n**🎯 4. Catégories de compétences**")
     col1, col2, col3 = st.columns(3)
@@ -87,7 +194,7 @@ if fichier_competences and fichier_client:
 
     if total_pondere != 100:
         st.error("❌ La somme des pondérations doit être égale à 100% pour les catégories sélectionnées.")
-        st.stop()
+        arreter()
 
     # Liste des catégories sélectionnées
     categories_selectionnees = []
@@ -100,57 +207,40 @@ if fichier_competences and fichier_client:
     
     if not categories_selectionnees:
         st.warning("⚠️ Veuillez sélectionner au moins une catégorie de compétence (savoir-faire, savoir-être professionnels ou savoirs).")
-        st.stop() 
-
-    # Chargement unique depuis l'onglet centralisé
-    df_comp_brut = pd.read_excel(fichier_competences, sheet_name="Macro-Compétences")
-    df_comp = df_comp_brut[df_comp_brut["Catégorie"].isin(categories_selectionnees)].copy()
-    df_comp = df_comp.dropna(subset=["Code Métier", "Intitulé", "Macro Compétence"])  # Nettoyage
+        arreter()
+
+    # Référentiel partagé entre toutes les sessions (un instantané par empreinte)
+    with diagnostic.etape("referentiel") as etape:
+        donnees_competences = fichier_competences.getvalue()
+        referentiel = referentiel_partage(empreinte(donnees_competences), donnees_competences)
+        etape["lignes"] = len(referentiel.encode.metier)
+    # Similarités précalculées (python -m passerelles.magasin), si disponibles
+    magasin = magasin_partage(referentiel.empreinte) if magasin_disponible(referentiel.empreinte) else None
+    st.caption(
+        f"📦 Référentiel : {referentiel.nb_metiers} métiers, "
+        f"{referentiel.memoire / 1024 ** 2:.1f} Mo en mémoire partagée"
+        + (" · similarités précalculées" if magasin is not None else "")
+    )
 
     # Chargement des métiers client
-    df_client = pd.read_excel(fichier_client)
-    codes_client = df_client["Code ROME"].dropna().unique()
+    with diagnostic.etape("client") as etape:
+        donnees_client = fichier_client.getvalue()
+        empreinte_client = empreinte(donnees_client)
+        codes_client = charger_codes_client(donnees_client, cle=empreinte_client)
+        est_client = referentiel.masque(codes_client)
+        etape["lignes"] = len(codes_client)
 
     # Définir métiers de départ et d'arrivée selon le mode
-    if mode == "Passerelle entrante":
-        df_depart = df_comp.copy()  # Tous les métiers (ROME + client)
-        df_arrivee = df_comp[df_comp["Code Métier"].isin(codes_client)]
-    else:
-        df_depart = df_comp[df_comp["Code Métier"].isin(codes_client)]
-        df_arrivee = df_comp[~df_comp["Code Métier"].isin(codes_client)]
-
-
-    # Liste des métiers de départ disponibles
-    metiers_depart = df_depart[["Code Métier", "Intitulé"]].drop_duplicates().sort_values("Intitulé")
-
-    # Dictionnaire de correspondance lettre → secteur
-    secteurs = {
-        "A": "Agriculture et Pêche, Espaces naturels et Espaces verts, Soins aux animaux",
-        "B": "Arts et Façonnage d'ouvrages d'art",
-        "C": "Banque, Assurance, Immobilier",
-        "D": "Commerce, Vente et Grande distribution",
-        "E": "Communication, Média et Multimédia",
-        "F": "Construction, Bâtiment et Travaux publics",
-        "G": "Hôtellerie-Restauration, Tourisme, Loisirs et Animation",
-        "H": "Industrie",
-        "I": "Installation et Maintenance",
-        "J": "Santé",
-        "K": "Services à la personne et à la collectivité",
-        "L": "Spectacle",
-        "M": "Support à l'entreprise",
-        "N": "Transport et Logistique"
-    }
-
-    # Lettres présentes dans les métiers de départ
-    lettres_disponibles = df_depart["Code Métier"].str[0].unique()
-    secteurs_disponibles = {lettre: secteurs[lettre] for lettre in lettres_disponibles if lettre in secteurs}
+    with diagnostic.etape("metiers_du_mode") as etape:
+        depart, arrivee = metiers_du_mode(referentiel, est_client, mode, categories_selectionnees)
+        etape["lignes"] = int(depart.sum())
 
     # Construction des options de filtre secteur
-    options_secteurs = ["Tous les secteurs"] + [f"{lettre} - {secteurs[lettre]}" for lettre in sorted(secteurs_disponibles)]
+    options_secteurs = referentiel.options_secteurs(depart)
 
     # Initialisation du filtre secteur en session_state
-    if "secteur_selectionne" not in st.session_state:
-        st.session_state["secteur_selectionne"] = "Tous les secteurs"
+    if st.session_state.get("secteur_selectionne") not in options_secteurs:
+        st.session_state["secteur_selectionne"] = TOUS_LES_SECTEURS
 
     # Menu déroulant secteur
     st.markdown("###\n**🗂️ 6. Secteur d'activité**")
@@ -162,271 +252,171 @@ if fichier_competences and fichier_client:
     )
 
     # Filtrage des métiers de départ si un secteur est sélectionné
-    if secteur_selectionne == "Tous les secteurs":
-        metiers_filtrés = metiers_depart.copy()
+    if secteur_selectionne == TOUS_LES_SECTEURS:
+        lettre_selectionnee = None
     else:
         lettre_selectionnee = secteur_selectionne.split(" - ")[0]
-        metiers_filtrés = metiers_depart[metiers_depart["Code Métier"].str.startswith(lettre_selectionnee)]
 
-    # Liste des métiers de départ disponibles
+    # Liste des métiers de départ disponibles (triés par intitulé)
     st.markdown("###\n**👤 7. Métier de départ**")
-    metiers_filtrés["Affichage"] = metiers_filtrés["Code Métier"] + " - " + metiers_filtrés["Intitulé"]
-    choix_affichage = st.selectbox("", options=metiers_filtrés["Affichage"].tolist())
-    code_selectionne = metiers_filtrés[metiers_filtrés["Affichage"] == choix_affichage]["Code Métier"].values[0]
-    choix_metier = metiers_filtrés[metiers_filtrés["Code Métier"] == code_selectionne]["Intitulé"].values[0]
-
+    options_metiers = referentiel.options_metiers(depart, lettre_selectionnee)
+    if not options_metiers:
+        st.warning("⚠️ Aucun métier de départ disponible pour cette sélection.")
+        arreter()
+    choix_affichage = st.selectbox("", options=options_metiers)
 
     # Code métier sélectionné
-    code_selectionne = metiers_depart[metiers_depart["Intitulé"] == choix_metier]["Code Métier"].values[0]
-
-    # Macro-compétences du métier sélectionné
-    competences_selection = set(df_depart[df_depart["Code Métier"] == code_selectionne]["Macro Compétence"].dropna())
-
-    # Calcul des similarités avec les métiers d'arrivée
-    lignes_resultats = []
-    lettre_depart = code_selectionne[0]
-
-    for code_metier, groupe in df_arrivee.groupby("Code Métier"):
-        if code_metier == code_selectionne:
-            continue  # On saute si c'est le même métier
-        intitule = groupe["Intitulé"].iloc[0]
-        competences_metier = set(groupe["Macro Compétence"].dropna())
-        intersection = competences_selection & competences_metier
-        score = len(intersection)
-        if score > 0:
-            for comp in intersection:
-                # On récupère la catégorie depuis le df_arrivee
-                categorie = groupe[groupe["Macro Compétence"] == comp]["Catégorie"].iloc[0]
-                    # Appliquer le poids en fonction de la catégorie
-                if categorie == "Savoir-faire":
-                    poids = poids_sf
-                elif categorie == "Savoir-être professionnels":
-                    poids = poids_se
-                elif categorie == "Savoirs":
-                    poids = poids_savoirs
-                else:
-                    poids = 0  # sécurité
-
-                bonus = 1.25 if code_metier.startswith(lettre_depart) else 1
-                score_pondere_final = (score * poids / 100) * bonus
-                
-                lignes_resultats.append({
-                    "Code Métier": code_metier,
-                    "Intitulé": intitule,
-                    "Nb de passerelles communes": score,
-                    "Score pondéré": score * poids / 100,
-                    "Catégorie": categorie,
-                    "Compétence commune": comp
-                })
-
-    if lignes_resultats:
-        df_resultats_complets = pd.DataFrame(lignes_resultats)
+    code_selectionne = referentiel.code_affiche(choix_affichage)
+    choix_metier = referentiel.intitule_par_code[code_selectionne]
+
+    # Pondération de chaque catégorie sélectionnée
+    poids_categories = {
+        "Savoir-faire": poids_sf,
+        "Savoir-être professionnels": poids_se,
+        "Savoirs": poids_savoirs,
+    }
+    poids = {categorie: poids_categories[categorie] for categorie in categories_selectionnees}
+
+    # Compétences partagées avec les métiers d'arrivée (en cache), puis
+    # recombinaison selon les pondérations et catégories cochées (Top 20)
+    with diagnostic.etape("partages") as etape:
+        partages = partages_en_cache(
+            referentiel.empreinte, empreinte_client, mode, code_selectionne,
+            _referentiel=referentiel, _arrivee=arrivee, _magasin=magasin,
+        )
+        etape["lignes"] = len(partages.ligne)
+    with diagnostic.etape("classement") as etape:
+        resultat = referentiel.index.classer(partages, poids, n=20)
+        etape["lignes"] = len(resultat.detail)
 
+    if not resultat.vide:
         # Affichage top 20 pour l'écran
-        top_metiers = (
-            df_resultats_complets.groupby(["Code Métier", "Intitulé"])
-            .agg({
-                "Score pondéré": "sum",
-                "Compétence commune": "count"
-            })
-            .reset_index()
-            .rename(columns={
-                "Score pondéré": "Score pondéré total",
-                "Compétence commune": "Nombre de compétences partagées"
-            })
-            .sort_values("Score pondéré total", ascending=False)
-            .head(20)
-        )
+        top_metiers = resultat.top
         st.markdown("###\n### 🌟 Top 20 des passerelles proposées :")
         st.dataframe(top_metiers)
 
         # 🔍 Graphique des scores (bar chart)
-        # 🔁 Créer un tableau croisé avec Score pondéré par catégorie
-        df_pivot = df_resultats_complets.pivot_table(
-            index=["Code Métier", "Intitulé"],
-            columns="Catégorie",
-            values="Score pondéré",
-            aggfunc="sum",
-            fill_value=0
-        ).reset_index()
-
-        # 🔁 Recalcul du score total pour tri
-        df_pivot["Score total"] = df_pivot[categories_selectionnees].sum(axis=1)
-        df_pivot = df_pivot.sort_values("Score total", ascending=False).head(20)
-
-        # 🔍 Graphique empilé
-        st.markdown("### 📊 Répartition des scores pondérés par type de compétence")
-        fig, ax = plt.subplots(figsize=(8, 6))
-
-        bottom = None
-        labels = df_pivot["Intitulé"]
-
-        # Colorer chaque barre selon la catégorie
-        for cat in categories_selectionnees:
-            ax.barh(labels, df_pivot[cat], left=bottom, label=cat)
-            if bottom is None:
-                bottom = df_pivot[cat].copy()
-            else:
-                bottom += df_pivot[cat]
-
-        ax.invert_yaxis()
-        ax.set_xlabel("Score pondéré")
-        ax.set_title("Top 20 métiers – scores par type de compétence")
-        ax.legend(title="Catégorie")
-
-        st.pyplot(fig)
-
-        # Filtres et formats Excel
-        df_filtré = df_resultats_complets.copy()
-        categories_str = ", ".join(categories_selectionnees)
-
-        # Ajouter le score pondéré total dans df_filtré
-        df_scores = (
-            df_filtré.groupby(["Code Métier", "Intitulé"])["Score pondéré"]
-            .sum()
-            .reset_index()
-            .rename(columns={"Score pondéré": "Score pondéré total"})
-        )
-
-        # Merge avec le fichier filtré ligne par ligne
-        df_filtré = df_filtré.merge(df_scores, on=["Code Métier", "Intitulé"], how="left")
-
-        # Réorganiser les colonnes et supprimer "Score pondéré"
-        colonnes_ordre = [
-            "Code Métier",
-            "Intitulé",
-            "Score pondéré total",
-            "Nb de passerelles communes",
-            "Catégorie",
-            "Compétence commune"
-        ]
-        df_filtré = df_filtré[colonnes_ordre]
-
-        # Trier par Score pondéré total décroissant
-        df_filtré = df_filtré.sort_values(
-            by=["Score pondéré total", "Code Métier", "Intitulé"],
-            ascending=[False, True, True]
-        )
+        # 🔁 Tableau croisé avec Score pondéré par catégorie, trié par score total
+        df_pivot = resultat.repartition
 
-        def exporter_excel(df, titre_feuille, nom_fichier):
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-                workbook = writer.book
-                worksheet = workbook.add_worksheet(titre_feuille)
-                writer.sheets[titre_feuille] = worksheet
-
-                format_titre = workbook.add_format({'bold': True, 'font_size': 14})
-                format_soustitre = workbook.add_format({'italic': True})
-
-                # Écriture du titre et des dimensions choisies
-                worksheet.write("A1", f"Métier de départ : {choix_metier}", format_titre)
-                worksheet.write("A2", f"Dimensions sélectionnées : {categories_str}", format_soustitre)
-                # Définir les pondérations appliquées (selon sélection)
-                pond_list = []
-                if avec_savoir_faire:
-                    pond_list.append(f"Savoir-faire = {poids_sf}%")
-                if avec_savoir_etre:
-                    pond_list.append(f"Savoir-être professionnels = {poids_se}%")
-                if avec_savoirs:
-                    pond_list.append(f"Savoirs = {poids_savoirs}%")
-
-                pond_str = " / ".join(pond_list)
-                worksheet.write("A3", f"Pondérations appliquées : {pond_str}", format_soustitre)
-
-                date_export = datetime.now().strftime("%d/%m/%Y à %Hh%M")
-                worksheet.write("A4", f"Date d’export : {date_export}", format_soustitre)
-
-                # Export des données à partir de la ligne 6 (index 5)
-                df.to_excel(writer, index=False, startrow=5, sheet_name=titre_feuille)
-
-                # Ajustement automatique de la largeur des colonnes
-                for i, col in enumerate(df.columns):
-                    column_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                    worksheet.set_column(i, i, column_len)
-
-            return buffer.getvalue()
-
-        # ⬇️ Bouton 1 : Télécharger uniquement les passerelles filtrées (score > 3)
+        # 🔍 Graphique empilé, dessiné par le navigateur : aucun rendu d'image côté serveur
+        st.markdown("### 📊 Répartition des scores pondérés par type de compétence")
+        with diagnostic.etape("graphique", lignes=len(df_pivot)):
+            st.bar_chart(
+                df_pivot, x="Intitulé", y=list(poids), x_label="", y_label="Score pondéré",
+                horizontal=True, stack=True, sort=False,
+            )
+
+        # Filtres et formats Excel : une ligne par compétence commune, triée par score
+        df_filtré = resultat.detail
+        cle_resultat = (referentiel.empreinte, empreinte_client, mode, code_selectionne, tuple(poids.items()))
+
+        # ⬇️ Bouton 1 : Télécharger uniquement les passerelles filtrées
+        # (classeur produit au clic seulement, puis gardé en cache)
         st.download_button(
             label="📥 Télécharger les passerelles",
-            data=exporter_excel(df_filtré, "Passerelles filtrées", "passerelles_filtrees.xlsx"),
+            data=partial(export_en_cache, *cle_resultat, _detail=df_filtré, _metier=choix_metier),
             file_name="passerelles_filtrees.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
         with st.expander("📦 Télécharger toutes les passerelles (brutes)"):
-            if st.button("➡️ Générer toutes les passerelles sans aucun filtre"):
-
-                st.markdown("###\n### ⏳ Génération des passerelles brutes...")
-
-                # Rechargement brut
-                df_brut = pd.read_excel(fichier_competences, sheet_name="Macro-Compétences")
-                df_brut = df_brut.dropna(subset=["Code Métier", "Intitulé", "Macro Compétence"])
-
-                df_metiers_client = pd.read_excel(fichier_client)
-                codes_client_brut = df_metiers_client["Code ROME"].dropna().unique()
-
-                df_metiers_client = df_brut[df_brut["Code Métier"].isin(codes_client_brut)]
-                df_metiers_hors_client = df_brut[~df_brut["Code Métier"].isin(codes_client_brut)]
-
-                # Fonction de calcul avec barre de progression
-                def calculer_passerelles(metiers_depart, metiers_arrivee, progress_bar=None):
-                    lignes = []
-                    total = len(metiers_depart["Code Métier"].unique())
-                    for i, (code_depart, groupe_depart) in enumerate(metiers_depart.groupby("Code Métier")):
-                        intitule_depart = groupe_depart["Intitulé"].iloc[0]
-                        competences_depart = set(groupe_depart["Macro Compétence"].dropna())
-                        for code_arrivee, groupe_arrivee in metiers_arrivee.groupby("Code Métier"):
-                            intitule_arrivee = groupe_arrivee["Intitulé"].iloc[0]
-                            competences_arrivee = set(groupe_arrivee["Macro Compétence"].dropna())
-                            intersection = competences_depart & competences_arrivee
-                            if intersection:
-                                for comp in intersection:
-                                    # Cherche catégorie dans le groupe d’arrivée (prioritaire) ou de départ
-                                    if comp in groupe_arrivee["Macro Compétence"].values:
-                                        cat = groupe_arrivee[groupe_arrivee["Macro Compétence"] == comp]["Catégorie"].iloc[0]
-                                    else:
-                                        cat = groupe_depart[groupe_depart["Macro Compétence"] == comp]["Catégorie"].iloc[0]
-
-                                    lignes.append({
-                                        "Code Métier Départ": code_depart,
-                                        "Intitulé Départ": intitule_depart,
-                                        "Code Métier Arrivée": code_arrivee,
-                                        "Intitulé Arrivée": intitule_arrivee,
-                                        "Nombre de compétences partagées": len(intersection),
-                                        "Catégorie": cat,
-                                        "Compétence commune": comp
-                                    })
-
-                        if progress_bar:
-                            progress_bar.progress((i + 1) / total)
-                    return pd.DataFrame(lignes)
-
-                # Calcul des passerelles avec barres de progression
-                st.markdown("🔄 Calcul des passerelles entrantes...")
-                bar1 = st.progress(0)
-                df_entrantes = calculer_passerelles(df_metiers_hors_client, df_metiers_client, progress_bar=bar1)
-
-                st.markdown("🔄 Calcul des passerelles sortantes...")
-                bar2 = st.progress(0)
-                df_sortantes = calculer_passerelles(df_metiers_client, df_metiers_hors_client, progress_bar=bar2)
+            formats_brut = {
+                "Excel (.xlsx)": "xlsx",
+                "CSV compressé (.csv.gz)": "csv.gz",
+                "Parquet (.parquet)": "parquet",
+            }
+            choix_format = st.radio("Format du fichier", list(formats_brut), horizontal=True)
+            format_brut = formats_brut[choix_format]
+
+            # Sans magasin précalculé, le calcul peut être réparti sur plusieurs cœurs
+            nb_coeurs = os.cpu_count() or 1
+            calcul_parallele = magasin is None and st.checkbox(
+                f"⚡ Calcul parallèle ({nb_coeurs} cœurs)",
+                value=nb_coeurs > 1,
+                disabled=nb_coeurs == 1,
+            )
+
+            # Export exécuté en arrière-plan : la session reste utilisable pendant le calcul
+            gestionnaire = gestionnaire_taches()
+            sens = sens_bruts(est_client)
+            parametres_export = {
+                "referentiel": referentiel.empreinte,
+                "client": empreinte_client,
+                "format": format_brut,
+            }
+            identifiant_tache = gestionnaire.identifiant(parametres_export)
+            etat_tache = gestionnaire.etat(identifiant_tache)
+
+            def lancer_export_brut():
+                gestionnaire.lancer(
+                    parametres_export, referentiel.encode, sens, format_brut,
+                    parallele=calcul_parallele, magasin=magasin,
+                )
 
+            if etat_tache is None:
+                st.button("➡️ Générer toutes les passerelles sans aucun filtre", on_click=lancer_export_brut)
+                st.info("Cliquez sur le bouton ci-dessus pour lancer le calcul complet.")
+            elif etat_tache.active:
+                suivre_tache(gestionnaire, identifiant_tache)
+            elif etat_tache.statut == TERMINEE:
                 st.success("✅ Calcul terminé ! Prêt à télécharger")
-
-                # Export Excel
-                buffer_brut = io.BytesIO()
-                with pd.ExcelWriter(buffer_brut, engine="xlsxwriter") as writer:
-                    df_entrantes.to_excel(writer, index=False, sheet_name="Passerelles entrantes")
-                    df_sortantes.to_excel(writer, index=False, sheet_name="Passerelles sortantes")
-
+                _, mime = FORMATS[format_brut]
+                # Fichier lu au clic seulement : l'export complet peut peser plusieurs Go
                 st.download_button(
                     label="📥 Télécharger le fichier complet des passerelles",
-                    data=buffer_brut.getvalue(),
-                    file_name="passerelles_brutes.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    data=partial(open, gestionnaire.chemin_fichier(etat_tache), "rb"),
+                    file_name=etat_tache.fichier,
+                    mime=mime
                 )
             else:
-                st.info("Cliquez sur le bouton ci-dessus pour lancer le calcul complet.")
+                st.warning(f"⚠️ Génération interrompue ({etat_tache.message or etat_tache.statut}).")
+                afficher_progression(etat_tache)
+                st.button("▶️ Reprendre la génération", on_click=lancer_export_brut)
 
     else:
         st.warning("Aucune compétence partagée trouvée avec les métiers cibles.")
+
+    # 🧗 Parcours en plusieurs étapes vers un métier cible, via des métiers intermédiaires
+    # (le corps d'un expander s'exécute même replié : le graphe n'est construit qu'à la demande)
+    with st.expander("🧗 Parcours en plusieurs étapes vers un métier cible"):
+        options_cibles = [
+            option for option in referentiel.options_metiers(arrivee)
+            if referentiel.code_affiche(option) != code_selectionne
+        ]
+        if not options_cibles:
+            st.info("Aucun métier cible disponible pour ce type de passerelle.")
+        elif not st.toggle("Rechercher des parcours", key="parcours_actifs"):
+            st.info("Activez la recherche : le graphe des passerelles est alors construit pour ces pondérations.")
+        else:
+            choix_cible = st.selectbox("Métier cible", options=options_cibles)
+            col_p1, col_p2 = st.columns(2)
+            with col_p1:
+                nb_etapes_max = st.slider("Nombre d'étapes maximum", 1, NB_ETAPES_MAX, NB_ETAPES_MAX)
+            with col_p2:
+                seuil_parcours = st.number_input(
+                    "Score minimal d'une étape", min_value=0.5, value=SEUIL_SCORE, step=0.5,
+                    help="Une étape du parcours doit être une passerelle d'au moins ce score (bonus secteur compris).",
+                )
+            with diagnostic.etape("graphe_parcours") as etape:
+                graphe = graphe_partage(
+                    referentiel.empreinte, tuple(poids.items()), seuil_parcours, _referentiel=referentiel
+                )
+                etape["lignes"] = graphe.nb_aretes
+            with diagnostic.etape("parcours") as etape:
+                parcours = graphe.chemins(code_selectionne, referentiel.code_affiche(choix_cible),
+                                          k=5, nb_etapes_max=nb_etapes_max)
+                etape["lignes"] = len(parcours)
+            if parcours.empty:
+                st.warning(f"Aucun parcours d'au plus {nb_etapes_max} étape(s) au-dessus du score minimal.")
+            else:
+                st.dataframe(parcours, hide_index=True)
+                st.caption(
+                    "Score du parcours : inverse de la somme des inverses des scores des étapes "
+                    "(une étape faible pèse lourd). Même secteur : score de l'étape × 1,25."
+                )
+
+# ------------------------------
+# 🩺 Détail de l'exécution courante (mode diagnostic)
+# ------------------------------
+afficher_diagnostic()
@@ -0,0 +1 @@
+"""Bancs d'essai des passerelles métiers sur des référentiels synthétiques."""
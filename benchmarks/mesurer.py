@@ -0,0 +1,339 @@
+"""Banc d'essai : durée et pic mémoire de chaque étape, résultats en JSON.
+
+Étapes mesurées sur un référentiel synthétique (voir
+:mod:`benchmarks.synthetique`) à une ou plusieurs échelles :
+
+- ``chargement_excel`` : lecture de l'onglet ``Macro-Compétences`` (cache froid) ;
+- ``chargement_cache`` : relecture du même fichier depuis le cache Parquet ;
+- ``referentiel`` : construction de l'instantané partagé ;
+- ``requete`` : Top 20 d'un métier de départ (médiane et 95e centile) ;
+- ``generation`` : toutes les passerelles entrantes et sortantes ;
+- ``generation_parallele`` : la même génération dans un pool de processus,
+  pour chaque nombre de processus de ``--processus`` (accélération par
+  rapport à ``generation`` ; pic mémoire du seul processus principal) ;
+- ``export_xlsx`` : génération et écriture du fichier brut xlsx.
+
+Chaque étape est chronométrée et son pic de mémoire résidente relevé
+pendant le même appel (voir :func:`mesurer`). Exemples ::
+
+    python -m benchmarks.mesurer --echelles 1 2 10 --sortie mesures.json
+    python -m benchmarks.mesurer --comparer avant.json apres.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from benchmarks.synthetique import fichiers_synthetiques
+from passerelles.chargement import charger_codes_client, charger_competences, empreinte
+from passerelles.export import exporter_passerelles
+from passerelles.moteur import iterer_passerelles, morceaux_passerelles
+from passerelles.parallele import iterer_passerelles_paralleles
+from passerelles.recherche import sens_bruts
+from passerelles.referentiel import construire_referentiel
+
+ETAPES = [
+    "chargement_excel", "chargement_cache", "referentiel", "requete", "generation", "generation_parallele",
+    "export_xlsx",
+]
+
+NB_PROCESSUS = [1, 2, 4]
+
+POIDS = {"Savoir-faire": 50, "Savoir-être professionnels": 20, "Savoirs": 30}
+
+
+_STATUT = Path("/proc/self/status")
+_REMISE_A_ZERO = Path("/proc/self/clear_refs")
+
+
+def _memoire_processus(champ):
+    """Valeur (octets) d'un champ ``Vm*`` de ``/proc/self/status``."""
+    for ligne in _STATUT.read_text().splitlines():
+        if ligne.startswith(f"{champ}:"):
+            return int(ligne.split()[1]) * 1024
+    raise OSError(champ)
+
+
+def _remettre_pic_a_zero():
+    """Remet à zéro le pic de mémoire résidente (Linux) ; faux si impossible."""
+    try:
+        _REMISE_A_ZERO.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _pic_tracemalloc(fonction):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fonction()
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pic
+
+
+def mesurer(fonction, repetitions=1, memoire=True):
+    """Mesure de ``fonction`` : durées (min, médiane) et pic mémoire, plus son résultat.
+
+    Le pic est l'augmentation de la mémoire résidente pendant l'appel, relevée
+    sans surcoût sous Linux ; ailleurs, la fonction est rejouée une fois sous
+    ``tracemalloc``.
+    """
+    durees, pics = [], []
+    resultat = None
+    for _ in range(repetitions):
+        gc.collect()
+        suivi = memoire and _remettre_pic_a_zero()
+        base = _memoire_processus("VmRSS") if suivi else 0
+        debut = time.perf_counter()
+        resultat = fonction()
+        durees.append(time.perf_counter() - debut)
+        if suivi:
+            pics.append(_memoire_processus("VmHWM") - base)
+
+    mesure = {
+        "secondes": min(durees),
+        "secondes_mediane": float(np.median(durees)),
+        "repetitions": repetitions,
+    }
+    if memoire:
+        mesure["pic_memoire_mo"] = (max(pics) if pics else _pic_tracemalloc(fonction)) / 1024 ** 2
+        mesure["methode_memoire"] = "rss" if pics else "tracemalloc"
+    return mesure, resultat
+
+
+def mesurer_configuration(echelle, etapes=ETAPES, graine=0, nb_requetes=20, repetitions=3,
+                          memoire=True, processus=NB_PROCESSUS, **options):
+    """Mesures de toutes les ``etapes`` pour un référentiel synthétique à ``echelle``."""
+    donnees, donnees_client = fichiers_synthetiques(echelle, graine=graine, **options)
+    cle = empreinte(donnees)
+    dossier = Path(tempfile.mkdtemp(prefix="passerelles_banc_"))
+    mesures = {}
+    try:
+        def charger_froid():
+            cache = tempfile.mkdtemp(dir=dossier)
+            try:
+                return charger_competences(donnees, cle=cle, dossier=cache)
+            finally:
+                shutil.rmtree(cache, ignore_errors=True)
+
+        # Les étapes suivantes ont besoin du référentiel : il est chargé même si non mesuré
+        if "chargement_excel" in etapes:
+            mesures["chargement_excel"], df = mesurer(charger_froid, 1, memoire)
+        else:
+            df = charger_froid()
+        charger_competences(donnees, cle=cle, dossier=dossier)
+        if "chargement_cache" in etapes:
+            mesures["chargement_cache"], _ = mesurer(
+                lambda: charger_competences(donnees, cle=cle, dossier=dossier), repetitions, memoire
+            )
+
+        if "referentiel" in etapes:
+            mesures["referentiel"], referentiel = mesurer(
+                lambda: construire_referentiel(df, cle), repetitions, memoire
+            )
+        else:
+            referentiel = construire_referentiel(df, cle)
+
+        codes_client = charger_codes_client(donnees_client, dossier=dossier)
+        est_client = referentiel.masque(codes_client)
+        sens = sens_bruts(est_client)
+
+        if "requete" in etapes:
+            rng = np.random.default_rng(graine)
+            codes = rng.choice(
+                referentiel.encode.codes, size=min(nb_requetes, referentiel.nb_metiers), replace=False
+            )
+            memoire_requete = 0
+            durees = []
+            for code in codes:
+                mesure, _ = mesurer(
+                    lambda: referentiel.index.rechercher(code, est_client, POIDS), repetitions, memoire
+                )
+                durees.append(mesure["secondes"])
+                memoire_requete = max(memoire_requete, mesure.get("pic_memoire_mo", 0))
+            mesures["requete"] = {
+                "secondes": float(np.median(durees)),
+                "secondes_p95": float(np.percentile(durees, 95)),
+                "nb_requetes": len(codes),
+            }
+            if memoire:
+                mesures["requete"]["pic_memoire_mo"] = memoire_requete
+
+        if "generation" in etapes:
+            def generer():
+                return sum(
+                    len(lignes["depart"])
+                    for depart, arrivee in sens.values()
+                    for _, lignes in iterer_passerelles(referentiel.encode, depart, arrivee)
+                )
+            mesures["generation"], nb_lignes = mesurer(generer, 1, memoire)
+            mesures["generation"]["nb_lignes"] = int(nb_lignes)
+
+        if "generation_parallele" in etapes:
+            par_processus = {}
+            for nb_processus in processus:
+                def generer_en_parallele():
+                    return sum(
+                        len(lignes["depart"])
+                        for _, _, lignes in iterer_passerelles_paralleles(
+                            referentiel.encode, sens, nb_processus=nb_processus
+                        )
+                    )
+                par_processus[nb_processus], nb_lignes = mesurer(generer_en_parallele, 1, memoire)
+            # Étape résumée par le plus grand nombre de processus, détail par nombre de processus
+            mesures["generation_parallele"] = {
+                **par_processus[max(processus)],
+                "nb_processus": max(processus),
+                "nb_lignes": int(nb_lignes),
+                "secondes_par_nb_processus": {str(n): mesure["secondes"] for n, mesure in par_processus.items()},
+            }
+            if "generation" in mesures:
+                mesures["generation_parallele"]["acceleration_par_nb_processus"] = {
+                    str(n): mesures["generation"]["secondes"] / mesure["secondes"]
+                    for n, mesure in par_processus.items()
+                }
+
+        if "export_xlsx" in etapes:
+            def exporter():
+                feuilles = {
+                    nom: morceaux_passerelles(referentiel.encode, depart, arrivee)
+                    for nom, (depart, arrivee) in sens.items()
+                }
+                chemin = exporter_passerelles(feuilles, "xlsx")
+                taille = os.path.getsize(chemin)
+                os.unlink(chemin)
+                return taille
+            mesures["export_xlsx"], taille = mesurer(exporter, 1, memoire)
+            mesures["export_xlsx"]["taille_mo"] = taille / 1024 ** 2
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+
+    return {
+        "echelle": echelle,
+        "parametres": {"graine": graine, **options},
+        "taille": {
+            "lignes_referentiel": len(df),
+            "nb_metiers": referentiel.nb_metiers,
+            "nb_competences": len(referentiel.encode.competences),
+            "nb_metiers_client": int(est_client.sum()),
+            "octets_excel": len(donnees),
+        },
+        "etapes": mesures,
+    }
+
+
+def _version_code():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environnement():
+    """Version du code et de l'environnement, pour comparer des mesures entre elles."""
+    return {
+        "version": _version_code(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plateforme": platform.platform(),
+        "processeurs": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def comparer(avant, apres):
+    """Lignes texte comparant deux fichiers de mesures, étape par étape."""
+    lignes = [f"{avant['environnement']['version']} → {apres['environnement']['version']}"]
+    anciennes = {mesure["echelle"]: mesure for mesure in avant["mesures"]}
+    for mesure in apres["mesures"]:
+        ancienne = anciennes.get(mesure["echelle"])
+        if ancienne is None:
+            continue
+        lignes.append(f"Échelle {mesure['echelle']} :")
+        for etape, valeurs in mesure["etapes"].items():
+            reference = ancienne["etapes"].get(etape)
+            if reference is None:
+                continue
+            texte = f"  {etape:<18} {reference['secondes']:9.3f} s → {valeurs['secondes']:9.3f} s"
+            texte += f" (×{valeurs['secondes'] / max(reference['secondes'], 1e-9):.2f})"
+            if "pic_memoire_mo" in valeurs and "pic_memoire_mo" in reference:
+                texte += f"   {reference['pic_memoire_mo']:8.1f} Mo → {valeurs['pic_memoire_mo']:8.1f} Mo"
+            lignes.append(texte)
+    return lignes
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(prog="python -m benchmarks.mesurer", description=__doc__.splitlines()[0])
+    parseur.add_argument("--echelles", type=float, nargs="+", default=[1.0],
+                         help="tailles du référentiel, en multiples du ROME (~1 500 métiers)")
+    parseur.add_argument("--etapes", nargs="+", choices=ETAPES, default=ETAPES)
+    parseur.add_argument("--competences-par-metier", type=int, default=30)
+    parseur.add_argument("--recouvrement", type=float, default=0.5,
+                         help="part des compétences tirées dans le secteur du métier (0 à 1)")
+    parseur.add_argument("--melange", type=float, nargs=3, default=[0.5, 0.2, 0.3],
+                         metavar=("SAVOIR_FAIRE", "SAVOIR_ETRE", "SAVOIRS"))
+    parseur.add_argument("--part-client", type=float, default=0.3)
+    parseur.add_argument("--repetitions", type=int, default=3)
+    parseur.add_argument("--processus", type=int, nargs="+", default=NB_PROCESSUS,
+                         help="nombres de processus de l'étape generation_parallele")
+    parseur.add_argument("--sans-memoire", action="store_true", help="ne pas mesurer les pics mémoire")
+    parseur.add_argument("--graine", type=int, default=0)
+    parseur.add_argument("--sortie", type=Path, help="fichier JSON des résultats (sinon sortie standard)")
+    parseur.add_argument("--comparer", type=Path, nargs=2, metavar=("AVANT", "APRES"),
+                         help="compare deux fichiers de résultats au lieu de mesurer")
+    arguments = parseur.parse_args(arguments)
+
+    if arguments.comparer:
+        avant, apres = (json.loads(chemin.read_text(encoding="utf-8")) for chemin in arguments.comparer)
+        print("\n".join(comparer(avant, apres)))
+        return
+
+    resultats = {"environnement": environnement(), "mesures": []}
+    for echelle in arguments.echelles:
+        print(f"Échelle {echelle:g}…", file=sys.stderr)
+        resultats["mesures"].append(mesurer_configuration(
+            echelle,
+            etapes=arguments.etapes,
+            graine=arguments.graine,
+            repetitions=arguments.repetitions,
+            memoire=not arguments.sans_memoire,
+            processus=arguments.processus,
+            competences_par_metier=arguments.competences_par_metier,
+            recouvrement=arguments.recouvrement,
+            melange=tuple(arguments.melange),
+            part_client=arguments.part_client,
+        ))
+    resultats["rss_max_mo"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    texte = json.dumps(resultats, ensure_ascii=False, indent=2)
+    if arguments.sortie:
+        arguments.sortie.write_text(texte, encoding="utf-8")
+    else:
+        print(texte)
+
+
+if __name__ == "__main__":
+    main()
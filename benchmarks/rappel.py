@@ -0,0 +1,136 @@
+"""Banc d'essai de la recherche approchée (MinHash/LSH) : rappel et durée par requête.
+
+Pour chaque réglage ``BANDESxLIGNES`` (voir :mod:`passerelles.approximation`)
+et un échantillon de métiers de départ, le Top N approché est comparé au Top N
+exact de l'index inversé. Le rappel est la part du Top N exact retrouvée :
+un métier proposé compte comme retrouvé si son score atteint celui du N-ième
+exact (les ex aequo en limite de classement ne sont pas des erreurs). Exemple,
+à la taille d'un catalogue ESCO (~3 000 métiers, ~13 000 compétences) ::
+
+    python -m benchmarks.rappel --metiers 3000 --competences 13000 \\
+        --reglages 32x2 64x2 128x2 --sortie rappel.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.mesurer import POIDS, environnement
+from benchmarks.synthetique import NB_COMPETENCES_ROME, NB_METIERS_ROME, generer_referentiel
+from passerelles.approximation import IndexLSH, seuil_lsh
+from passerelles.referentiel import construire_referentiel
+
+REGLAGES = ["16x1", "32x2", "64x2", "128x2"]
+
+
+def _reglage(texte):
+    nb_bandes, lignes_par_bande = (int(valeur) for valeur in texte.lower().split("x"))
+    return nb_bandes, lignes_par_bande
+
+
+def _chronometrer(fonction):
+    debut = time.perf_counter()
+    resultat = fonction()
+    return time.perf_counter() - debut, resultat
+
+
+def rappel(exact, approche, n):
+    """Part du Top ``n`` exact retrouvée par le Top ``n`` approché (ex aequo compris)."""
+    if exact.empty:
+        return 1.0
+    seuil = exact["Score pondéré total"].iloc[min(n, len(exact)) - 1]
+    return min(int((approche["Score pondéré total"] >= seuil).sum()) / len(exact), 1.0)
+
+
+def mesurer_reglages(referentiel, reglages=REGLAGES, poids=POIDS, n=20, nb_requetes=200, graine=0):
+    """Rappel, candidats et durées de chaque réglage sur ``nb_requetes`` métiers de départ."""
+    rng = np.random.default_rng(graine)
+    codes = rng.choice(referentiel.encode.codes, size=min(nb_requetes, referentiel.nb_metiers), replace=False)
+    arrivee = np.ones(referentiel.nb_metiers, dtype=bool)
+    index = referentiel.index
+
+    durees_exactes, exacts, metiers_exacts = [], [], []
+    for code in codes:
+        duree, partages = _chronometrer(lambda: index.partages(code, arrivee))
+        durees_exactes.append(duree)
+        exacts.append(index.classer(partages, poids, n=n).top)
+        metiers_exacts.append(len(partages.metiers))
+
+    mesures = []
+    for nb_bandes, lignes_par_bande in reglages:
+        construction, lsh = _chronometrer(lambda: IndexLSH(referentiel.encode, nb_bandes, lignes_par_bande))
+        durees, rappels, candidats = [], [], []
+        for code, exact in zip(codes, exacts):
+            duree, partages = _chronometrer(lambda: lsh.partages(code, arrivee, categories=poids))
+            durees.append(duree)
+            rappels.append(rappel(exact, index.classer(partages, poids, n=n).top, n))
+            candidats.append(len(partages.metiers))
+        mesures.append({
+            "reglage": f"{nb_bandes}x{lignes_par_bande}",
+            "seuil_jaccard": seuil_lsh(nb_bandes, lignes_par_bande),
+            "construction_s": construction,
+            "rappel_moyen": float(np.mean(rappels)),
+            "rappel_p10": float(np.percentile(rappels, 10)),
+            "metiers_scores_moyens": float(np.mean(candidats)),
+            "requete_s": float(np.median(durees)),
+            "acceleration": float(np.median(durees_exactes) / max(np.median(durees), 1e-9)),
+        })
+    return {
+        "exact": {
+            "requete_s": float(np.median(durees_exactes)),
+            "metiers_scores_moyens": float(np.mean(metiers_exacts)),
+        },
+        "reglages": mesures,
+    }
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(prog="python -m benchmarks.rappel", description=__doc__.splitlines()[0])
+    parseur.add_argument("--metiers", type=int, default=NB_METIERS_ROME)
+    parseur.add_argument("--competences", type=int, default=NB_COMPETENCES_ROME)
+    parseur.add_argument("--competences-par-metier", type=int, default=30)
+    parseur.add_argument("--recouvrement", type=float, default=0.5,
+                         help="part des compétences tirées dans le secteur du métier (0 à 1)")
+    parseur.add_argument("--asymetrie", type=float, default=0.8,
+                         help="exposant de popularité des compétences hors secteur")
+    parseur.add_argument("--reglages", type=_reglage, nargs="+", default=[_reglage(r) for r in REGLAGES],
+                         metavar="BANDESxLIGNES")
+    parseur.add_argument("--n", type=int, default=20)
+    parseur.add_argument("--requetes", type=int, default=200)
+    parseur.add_argument("--graine", type=int, default=0)
+    parseur.add_argument("--sortie", type=Path, help="fichier JSON des résultats (sinon sortie standard)")
+    arguments = parseur.parse_args(arguments)
+
+    df = generer_referentiel(
+        arguments.metiers, arguments.competences, competences_par_metier=arguments.competences_par_metier,
+        recouvrement=arguments.recouvrement, asymetrie=arguments.asymetrie, graine=arguments.graine,
+    )
+    referentiel = construire_referentiel(df, "synthetique")
+    resultats = {
+        "environnement": environnement(),
+        "parametres": {nom: valeur for nom, valeur in vars(arguments).items() if nom not in ("sortie", "reglages")},
+        **mesurer_reglages(referentiel, arguments.reglages, n=arguments.n,
+                           nb_requetes=arguments.requetes, graine=arguments.graine),
+    }
+
+    exact = resultats["exact"]
+    print(f"exact      {exact['requete_s'] * 1e3:7.2f} ms  {exact['metiers_scores_moyens']:8.0f} métiers",
+          file=sys.stderr)
+    for mesure in resultats["reglages"]:
+        print(f"{mesure['reglage']:<10} {mesure['requete_s'] * 1e3:7.2f} ms  {mesure['metiers_scores_moyens']:8.0f} "
+              f"métiers  rappel {mesure['rappel_moyen']:.3f} (p10 {mesure['rappel_p10']:.2f})  "
+              f"×{mesure['acceleration']:.1f}", file=sys.stderr)
+
+    texte = json.dumps(resultats, ensure_ascii=False, indent=2)
+    if arguments.sortie:
+        arguments.sortie.write_text(texte, encoding="utf-8")
+    else:
+        print(texte)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Générateur de référentiels ``Macro-Compétences`` et de fichiers client synthétiques.
+
+Chaque macro-compétence appartient à une catégorie tirée selon ``melange`` et
+à un secteur (lettre ROME). Un métier tire ses compétences soit dans le vivier
+de son secteur (avec la probabilité ``recouvrement``), soit dans l'ensemble du
+référentiel avec une popularité décroissante (loi de Zipf) : plus le
+recouvrement est élevé, plus les métiers d'un même secteur partagent de
+compétences.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from passerelles.chargement import COLONNE_CODE_CLIENT, ONGLET_COMPETENCES
+from passerelles.export import ecrire_xlsx
+from passerelles.moteur import CATEGORIES, COLONNES_REFERENTIEL
+from passerelles.referentiel import SECTEURS
+
+# Taille du référentiel ROME réel, à l'échelle 1
+NB_METIERS_ROME = 1500
+NB_COMPETENCES_ROME = 2000
+
+_VOCABULAIRE = (
+    "gérer organiser contrôler réaliser concevoir accompagner analyser suivre "
+    "préparer entretenir conseiller former coordonner vérifier installer piloter "
+    "les opérations un projet une équipe la clientèle des équipements la qualité "
+    "un budget la sécurité les stocks un chantier la production un dossier"
+).split()
+
+
+def _libelles(rng, prefixe, nombre, nb_mots=6):
+    mots = rng.choice(_VOCABULAIRE, size=(nombre, nb_mots))
+    return [f"{prefixe} {rang} : {' '.join(ligne)}" for rang, ligne in enumerate(mots)]
+
+
+def generer_referentiel(nb_metiers=NB_METIERS_ROME, nb_competences=NB_COMPETENCES_ROME,
+                        competences_par_metier=30, melange=(0.5, 0.2, 0.3), recouvrement=0.5,
+                        asymetrie=0.8, graine=0):
+    """Table aux colonnes ``Code Métier``, ``Intitulé``, ``Macro Compétence``, ``Catégorie``.
+
+    ``melange`` donne la proportion de chaque catégorie de :data:`CATEGORIES`,
+    ``recouvrement`` la part des compétences tirées dans le vivier du secteur,
+    ``asymetrie`` l'exposant de popularité des tirages hors secteur.
+    """
+    rng = np.random.default_rng(graine)
+    lettres = np.array(sorted(SECTEURS))
+
+    # Métiers répartis par secteur, codes au format ROME (lettre + 4 chiffres)
+    secteur_metier = np.arange(nb_metiers) % len(lettres)
+    rang_secteur = np.arange(nb_metiers) // len(lettres)
+    codes = np.array([
+        f"{lettres[secteur]}{1100 + rang:04d}" for secteur, rang in zip(secteur_metier, rang_secteur)
+    ], dtype=object)
+    intitules = np.array(_libelles(rng, "Métier", nb_metiers, nb_mots=4), dtype=object)
+
+    # Compétences : catégorie, secteur et popularité
+    melange = np.asarray(melange, dtype=float)
+    categorie_competence = rng.choice(len(CATEGORIES), size=nb_competences, p=melange / melange.sum())
+    secteur_competence = rng.integers(len(lettres), size=nb_competences)
+    popularite = 1 / np.arange(1, nb_competences + 1) ** asymetrie
+    popularite = rng.permutation(popularite / popularite.sum())
+    competences = np.array(_libelles(rng, "Macro-compétence", nb_competences), dtype=object)
+    viviers = [np.flatnonzero(secteur_competence == secteur) for secteur in range(len(lettres))]
+
+    # Tirages avec remise, doublons (métier, compétence) éliminés ensuite
+    nb_tirages = np.maximum(rng.poisson(competences_par_metier, size=nb_metiers), 1)
+    metier = np.repeat(np.arange(nb_metiers), nb_tirages)
+    competence = rng.choice(nb_competences, size=len(metier), p=popularite)
+    dans_secteur = rng.random(len(metier)) < recouvrement
+    for secteur, vivier in enumerate(viviers):
+        tirages = dans_secteur & (secteur_metier[metier] == secteur)
+        if len(vivier) and tirages.any():
+            competence[tirages] = rng.choice(vivier, size=int(tirages.sum()))
+
+    df = pd.DataFrame({
+        "Code Métier": codes[metier],
+        "Intitulé": intitules[metier],
+        "Macro Compétence": competences[competence],
+        "Catégorie": np.array(CATEGORIES, dtype=object)[categorie_competence[competence]],
+    }, columns=COLONNES_REFERENTIEL)
+    return df.drop_duplicates(["Code Métier", "Macro Compétence"]).reset_index(drop=True)
+
+
+def generer_codes_client(referentiel, part=0.3, graine=0):
+    """Codes ROME d'un portefeuille client : une part ``part`` des métiers du référentiel."""
+    rng = np.random.default_rng(graine)
+    codes = referentiel["Code Métier"].unique()
+    retenus = rng.choice(len(codes), size=max(1, round(part * len(codes))), replace=False)
+    return pd.DataFrame({COLONNE_CODE_CLIENT: np.sort(codes[retenus])})
+
+
+def en_excel(df, onglet):
+    """Octets d'un classeur xlsx d'un seul onglet, comme un fichier déposé."""
+    buffer = io.BytesIO()
+    ecrire_xlsx({onglet: [df]}, buffer)
+    return buffer.getvalue()
+
+
+def fichiers_synthetiques(echelle=1, graine=0, part_client=0.3, **options):
+    """Octets des fichiers référentiel et client à ``echelle`` fois la taille du ROME."""
+    options.setdefault("nb_metiers", round(NB_METIERS_ROME * echelle))
+    options.setdefault("nb_competences", round(NB_COMPETENCES_ROME * echelle))
+    referentiel = generer_referentiel(graine=graine, **options)
+    client = generer_codes_client(referentiel, part=part_client, graine=graine)
+    return en_excel(referentiel, ONGLET_COMPETENCES), en_excel(client, "Métiers client")
@@ -0,0 +1,45 @@
+"""Calcul des passerelles métiers à partir du référentiel des macro-compétences ROME."""
+
+from passerelles.actualisation import Differences, actualiser, lire_resultats
+from passerelles.approximation import IndexLSH
+from passerelles.index import IndexInverse, Partages, ResultatRecherche
+from passerelles.moteur import (
+    CATEGORIES,
+    COLONNES_BRUTES,
+    ReferentielEncode,
+    calculer_passerelles,
+    encoder_referentiel,
+    iterer_passerelles,
+    morceaux_passerelles,
+    passerelles_entre,
+)
+from passerelles.parcours import GraphePasserelles, graphe_passerelles
+from passerelles.recherche import MODES, charger_referentiel, rechercher, top_passerelles_clients
+from passerelles.referentiel import SECTEURS, Referentiel, construire_referentiel
+
+__all__ = [
+    "CATEGORIES",
+    "COLONNES_BRUTES",
+    "Differences",
+    "GraphePasserelles",
+    "IndexInverse",
+    "IndexLSH",
+    "MODES",
+    "Partages",
+    "Referentiel",
+    "ReferentielEncode",
+    "ResultatRecherche",
+    "SECTEURS",
+    "actualiser",
+    "calculer_passerelles",
+    "charger_referentiel",
+    "construire_referentiel",
+    "encoder_referentiel",
+    "graphe_passerelles",
+    "iterer_passerelles",
+    "lire_resultats",
+    "morceaux_passerelles",
+    "passerelles_entre",
+    "rechercher",
+    "top_passerelles_clients",
+]
@@ -0,0 +1,186 @@
+"""Ligne de commande des passerelles métiers, sans interface.
+
+Top N de chaque métier de départ pour plusieurs fichiers client, dans un
+seul fichier consolidé ::
+
+    python -m passerelles top --referentiel "MACRO-COMPETENCES ROME.xlsx" \\
+        --clients client_a.xlsx client_b.xlsx --sortie top.xlsx
+
+Passerelles brutes (sans filtre) d'un fichier client ::
+
+    python -m passerelles brut --referentiel "MACRO-COMPETENCES ROME.xlsx" \\
+        --client client_a.xlsx --sortie passerelles.parquet
+
+Meilleurs parcours en plusieurs étapes entre deux métiers ::
+
+    python -m passerelles parcours --referentiel "MACRO-COMPETENCES ROME.xlsx" \\
+        --depart M1805 --arrivee H1206 --etapes 3
+
+Actualisation hebdomadaire des passerelles brutes d'un client : seules celles
+des métiers ou codes client qui ont changé depuis la dernière fois sont
+recalculées dans le dossier de résultats ::
+
+    python -m passerelles actualiser --referentiel "MACRO-COMPETENCES ROME.xlsx" \\
+        --client client_a.xlsx --resultats passerelles_client_a/ --sortie passerelles.xlsx
+
+Le format de sortie (xlsx, csv.gz ou parquet) est déduit de l'extension.
+"""
+
+import argparse
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from passerelles.actualisation import actualiser, lire_resultats
+from passerelles.chargement import charger_codes_client
+from passerelles.export import FORMATS, exporter_passerelles
+from passerelles.magasin import ouvrir_magasin
+from passerelles.moteur import CATEGORIES, morceaux_passerelles
+from passerelles.parallele import morceaux_paralleles
+from passerelles.parcours import NB_ETAPES_MAX, SEUIL_SCORE, graphe_passerelles
+from passerelles.recherche import (
+    ENTRANTE,
+    SORTANTE,
+    charger_clients,
+    charger_referentiel,
+    sens_bruts,
+    top_passerelles_clients,
+    verifier_poids,
+)
+
+MODES_COURTS = {"entrante": ENTRANTE, "sortante": SORTANTE}
+
+
+def _format(chemin):
+    for format_export, (extension, _) in FORMATS.items():
+        if chemin.name.endswith(f".{extension}"):
+            return format_export
+    raise ValueError(f"Extension non reconnue ({', '.join(FORMATS)}) : {chemin.name}")
+
+
+def _ecrire(feuilles, sortie):
+    shutil.move(exporter_passerelles(feuilles, _format(sortie)), sortie)
+
+
+def _progression(fraction):
+    print(f"\r{fraction:6.1%}", end="", file=sys.stderr, flush=True)
+
+
+def commande_top(arguments):
+    referentiel = charger_referentiel(arguments.referentiel.read_bytes())
+    clients = charger_clients(arguments.clients)
+    resultats = top_passerelles_clients(
+        referentiel, clients, arguments.poids, n=arguments.n,
+        modes=[MODES_COURTS[mode] for mode in arguments.modes], progression=_progression,
+    )
+    _ecrire({mode: [df] for mode, df in resultats.items()}, arguments.sortie)
+    lignes = sum(len(df) for df in resultats.values())
+    print(f"\n{lignes} passerelles, {len(clients)} fichier(s) client → {arguments.sortie}", file=sys.stderr)
+
+
+def commande_brut(arguments):
+    referentiel = charger_referentiel(arguments.referentiel.read_bytes())
+    est_client = referentiel.masque(charger_codes_client(arguments.client.read_bytes()))
+    sens = sens_bruts(est_client)
+    magasin = ouvrir_magasin(referentiel.empreinte)
+    if arguments.parallele and magasin is None:
+        feuilles = morceaux_paralleles(referentiel.encode, sens)
+    else:
+        feuilles = {
+            nom: morceaux_passerelles(referentiel.encode, depart, arrivee, magasin=magasin)
+            for nom, (depart, arrivee) in sens.items()
+        }
+    _ecrire(feuilles, arguments.sortie)
+    print(f"Passerelles brutes → {arguments.sortie}", file=sys.stderr)
+
+
+def commande_parcours(arguments):
+    referentiel = charger_referentiel(arguments.referentiel.read_bytes())
+    graphe = graphe_passerelles(referentiel, arguments.poids, seuil=arguments.seuil)
+    try:
+        parcours = graphe.chemins(arguments.depart, arguments.arrivee, k=arguments.k, nb_etapes_max=arguments.etapes)
+    except ValueError as erreur:
+        sys.exit(str(erreur))
+    if arguments.sortie:
+        _ecrire({"Parcours": [parcours]}, arguments.sortie)
+        print(f"{len(parcours)} parcours → {arguments.sortie}", file=sys.stderr)
+    else:
+        print(parcours.to_string(index=False) if len(parcours) else "Aucun parcours trouvé.")
+
+
+def commande_actualiser(arguments):
+    debut = time.perf_counter()
+    referentiel = charger_referentiel(arguments.referentiel.read_bytes())
+    codes_client = charger_codes_client(arguments.client.read_bytes())
+    differences = actualiser(
+        referentiel, codes_client, arguments.resultats, complet=arguments.complet, progression=_progression,
+    )
+    print(f"\n{differences.resume()} → {arguments.resultats} ({time.perf_counter() - debut:.1f} s)", file=sys.stderr)
+    if arguments.sortie:
+        _ecrire({nom: [df] for nom, df in lire_resultats(arguments.resultats).items()}, arguments.sortie)
+        print(f"Passerelles brutes → {arguments.sortie}", file=sys.stderr)
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(prog="python -m passerelles", description="Passerelles métiers en ligne de commande.")
+    commandes = parseur.add_subparsers(dest="commande", required=True)
+
+    top = commandes.add_parser("top", help="Top N de chaque métier de départ, pour plusieurs fichiers client")
+    top.add_argument("--clients", type=Path, nargs="+", required=True, help="fichiers métiers client (colonne Code ROME)")
+    top.add_argument("--n", type=int, default=20, help="nombre de passerelles par métier de départ")
+    top.add_argument("--modes", nargs="+", choices=list(MODES_COURTS), default=list(MODES_COURTS))
+    top.set_defaults(executer=commande_top)
+
+    brut = commandes.add_parser("brut", help="toutes les passerelles d'un fichier client, sans filtre")
+    brut.add_argument("--client", type=Path, required=True, help="fichier métiers client (colonne Code ROME)")
+    brut.add_argument("--parallele", action="store_true", help="répartir le calcul sur tous les cœurs")
+    brut.set_defaults(executer=commande_brut)
+
+    parcours = commandes.add_parser("parcours", help="meilleurs parcours en plusieurs étapes entre deux métiers")
+    parcours.add_argument("--depart", required=True, help="code ROME du métier de départ")
+    parcours.add_argument("--arrivee", required=True, help="code ROME du métier cible")
+    parcours.add_argument("--k", type=int, default=5, help="nombre de parcours proposés")
+    parcours.add_argument("--etapes", type=int, default=NB_ETAPES_MAX, help="nombre d'étapes maximum")
+    parcours.add_argument("--seuil", type=float, default=SEUIL_SCORE,
+                          help="score minimal d'une étape (bonus secteur compris)")
+    parcours.set_defaults(executer=commande_parcours)
+
+    mise_a_jour = commandes.add_parser(
+        "actualiser", help="recalcule seulement les passerelles brutes touchées par les changements"
+    )
+    mise_a_jour.add_argument("--client", type=Path, required=True, help="fichier métiers client (colonne Code ROME)")
+    mise_a_jour.add_argument("--resultats", type=Path, required=True,
+                             help="dossier des résultats conservés d'une actualisation à l'autre")
+    mise_a_jour.add_argument("--complet", action="store_true", help="tout recalculer, sans comparer")
+    mise_a_jour.set_defaults(executer=commande_actualiser)
+
+    for commande in (top, parcours):
+        commande.add_argument("--categories", nargs="+", choices=CATEGORIES, default=CATEGORIES,
+                              help="catégories de compétences prises en compte")
+        commande.add_argument("--poids", type=int, nargs=3, default=[20, 20, 60],
+                              metavar=("SAVOIR_FAIRE", "SAVOIR_ETRE", "SAVOIRS"),
+                              help="pondérations en %% (seules celles des catégories retenues comptent, total 100)")
+
+    for commande in (top, brut, parcours, mise_a_jour):
+        commande.add_argument("--referentiel", type=Path, required=True, help="fichier Excel Macro-Compétences")
+        commande.add_argument("--sortie", type=Path, required=commande in (top, brut),
+                              help="fichier produit (.xlsx, .csv.gz ou .parquet)")
+
+    arguments = parseur.parse_args(arguments)
+    try:
+        if arguments.sortie:
+            _format(arguments.sortie)
+        if arguments.commande in ("top", "parcours"):
+            arguments.poids = {
+                categorie: poids for categorie, poids in zip(CATEGORIES, arguments.poids)
+                if categorie in arguments.categories
+            }
+            verifier_poids(arguments.poids)
+    except ValueError as erreur:
+        parseur.error(str(erreur))
+    arguments.executer(arguments)
+
+
+if __name__ == "__main__":
+    main()
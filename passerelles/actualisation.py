@@ -0,0 +1,274 @@
+"""Actualisation incrémentale des passerelles brutes quand le client ou le référentiel change.
+
+Une passerelle entre deux métiers ne dépend que de leurs lignes
+(Code Métier, Macro Compétence, Catégorie) et de leurs intitulés. Le
+dossier de résultats conserve donc, avec les passerelles, une empreinte par
+métier et la liste des codes client déjà traités (``etat.json``). À chaque
+actualisation, les métiers ajoutés, supprimés ou modifiés et les codes client
+ajoutés ou retirés sont *touchés* : seules les passerelles qui en partent ou
+y arrivent sont recalculées.
+
+Les résultats sont rangés en segments Parquet successifs : un segment
+remplace, dans les segments précédents, toutes les lignes des métiers qu'il
+déclare retirés. Une actualisation n'écrit donc que les lignes recalculées ;
+au-delà de :data:`SEGMENTS_MAX` segments, ils sont fusionnés en un seul. En
+ligne de commande ::
+
+    python -m passerelles actualiser --referentiel "MACRO-COMPETENCES ROME.xlsx" \\
+        --client client.xlsx --resultats passerelles_client/ --sortie passerelles.xlsx
+"""
+
+import itertools
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from passerelles.export import COLONNE_SENS, exporter_passerelles
+from passerelles.moteur import COLONNES_BRUTES, morceaux_passerelles
+from passerelles.recherche import sens_bruts
+
+# Version du format du dossier : un changement impose un recalcul complet
+FORMAT_RESULTATS = 1
+
+ETAT = "etat.json"
+
+# Au-delà, les segments sont fusionnés lors de l'actualisation suivante
+SEGMENTS_MAX = 8
+
+_COLONNES_TEXTE = [colonne for colonne in COLONNES_BRUTES if colonne != "Nombre de compétences partagées"]
+
+
+@dataclass(frozen=True)
+class Differences:
+    """Changements entre la version traitée et la nouvelle (codes métiers triés)."""
+
+    metiers_ajoutes: list = field(default_factory=list)
+    metiers_supprimes: list = field(default_factory=list)
+    metiers_modifies: list = field(default_factory=list)
+    clients_ajoutes: list = field(default_factory=list)
+    clients_retires: list = field(default_factory=list)
+    complet: bool = False
+
+    @property
+    def touches(self):
+        """Codes dont toutes les passerelles, au départ comme à l'arrivée, sont à recalculer."""
+        return sorted(set(itertools.chain(
+            self.metiers_ajoutes, self.metiers_supprimes, self.metiers_modifies,
+            self.clients_ajoutes, self.clients_retires,
+        )))
+
+    @property
+    def vide(self):
+        return not self.complet and not self.touches
+
+    def resume(self):
+        if self.complet:
+            return "calcul complet"
+        return (
+            f"{len(self.metiers_ajoutes)} métier(s) ajouté(s), {len(self.metiers_supprimes)} supprimé(s), "
+            f"{len(self.metiers_modifies)} modifié(s) ; {len(self.clients_ajoutes)} code(s) client ajouté(s), "
+            f"{len(self.clients_retires)} retiré(s)"
+        )
+
+
+def empreintes_metiers(ref):
+    """Empreinte de chaque métier : intitulé et ensemble des couples (compétence, catégorie).
+
+    Indépendante de l'ordre des lignes et des identifiants internes, qui
+    changent d'une version du référentiel à l'autre.
+    """
+    lignes = pd.DataFrame({
+        "competence": ref.competences[ref.competence],
+        "categorie": ref.categories[ref.categorie],
+    })
+    hachages = pd.util.hash_pandas_object(lignes, index=False).to_numpy()
+    sommes = np.zeros(ref.nb_metiers, dtype=np.uint64)
+    np.add.at(sommes, ref.metier, hachages)  # somme modulo 2**64 : l'ordre des lignes est indifférent
+    sommes ^= pd.util.hash_pandas_object(pd.Series(ref.intitules, dtype=object), index=False).to_numpy()
+    return {code: f"{valeur:016x}" for code, valeur in zip(ref.codes, sommes)}
+
+
+def comparer_versions(etat, empreintes, codes_client):
+    """:class:`Differences` entre l'``etat`` d'un dossier et la nouvelle version."""
+    anciennes = etat["metiers"]
+    anciens_clients, clients = set(etat["clients"]), set(codes_client)
+    return Differences(
+        metiers_ajoutes=sorted(empreintes.keys() - anciennes.keys()),
+        metiers_supprimes=sorted(anciennes.keys() - empreintes.keys()),
+        metiers_modifies=sorted(
+            code for code in empreintes.keys() & anciennes.keys() if empreintes[code] != anciennes[code]
+        ),
+        clients_ajoutes=sorted(clients - anciens_clients),
+        clients_retires=sorted(anciens_clients - clients),
+    )
+
+
+def lire_etat(dossier):
+    """État d'un dossier de résultats, ou ``None`` s'il est absent ou d'un autre format."""
+    chemin = Path(dossier) / ETAT
+    if not chemin.exists():
+        return None
+    etat = json.loads(chemin.read_text(encoding="utf-8"))
+    return etat if etat.get("format") == FORMAT_RESULTATS else None
+
+
+def _segment(dossier, feuilles, numero):
+    """Écrit ``nom → morceaux`` dans un nouveau segment ; ``None`` s'il n'a aucune ligne."""
+    chemin = exporter_passerelles(feuilles, "parquet")
+    if not os.path.getsize(chemin):
+        os.unlink(chemin)
+        return None
+    nom = f"segment-{numero:05d}.parquet"
+    shutil.move(chemin, Path(dossier) / nom)
+    return nom
+
+
+def _uniformiser(table):
+    """Colonnes textuelles en dictionnaires à index 32 bits, pour concaténer des segments."""
+    type_texte = pa.dictionary(pa.int32(), pa.string())
+    return table.cast(pa.schema([
+        pa.field(champ.name, type_texte) if pa.types.is_dictionary(champ.type) or pa.types.is_string(champ.type)
+        else champ
+        for champ in table.schema
+    ]))
+
+
+def _tables_valides(dossier, segments):
+    """Lignes encore valides de chaque segment : celles qu'aucun segment ultérieur ne remplace."""
+    retires = set()
+    tables = []
+    for segment in reversed(segments):
+        if segment["fichier"] is not None:
+            table = _uniformiser(pq.read_table(Path(dossier) / segment["fichier"]))
+            if retires:
+                codes = pa.array(sorted(retires), type=pa.string())
+                remplacees = pc.or_(
+                    pc.is_in(table["Code Métier Départ"], value_set=codes),
+                    pc.is_in(table["Code Métier Arrivée"], value_set=codes),
+                )
+                table = table.filter(pc.invert(remplacees))
+            tables.append(table)
+        retires.update(segment["retires"])
+    return tables[::-1]
+
+
+def lire_resultats(dossier):
+    """Passerelles brutes d'un dossier de résultats : sens → DataFrame aux colonnes :data:`COLONNES_BRUTES`.
+
+    Les lignes sont triées comme un calcul complet (métier de départ, métier
+    d'arrivée, compétence) ; les colonnes textuelles sont catégorielles.
+    """
+    etat = lire_etat(dossier)
+    if etat is None:
+        raise FileNotFoundError(f"Aucun résultat actualisé dans {dossier}")
+    tables = _tables_valides(dossier, etat["segments"])
+    if not tables:
+        return {}
+    df = pa.concat_tables(tables).unify_dictionaries().to_pandas()
+    for colonne in _COLONNES_TEXTE + [COLONNE_SENS]:
+        df[colonne] = df[colonne].astype("category")
+        df[colonne] = df[colonne].cat.reorder_categories(sorted(df[colonne].cat.categories))
+
+    resultats = {}
+    for nom in etat["sens"]:
+        partie = df[df[COLONNE_SENS] == nom]
+        ordre = np.lexsort((
+            partie["Compétence commune"].cat.codes,
+            partie["Code Métier Arrivée"].cat.codes,
+            partie["Code Métier Départ"].cat.codes,
+        ))
+        partie = partie.iloc[ordre][COLONNES_BRUTES].reset_index(drop=True)
+        for colonne in _COLONNES_TEXTE:
+            partie[colonne] = partie[colonne].cat.remove_unused_categories()
+        resultats[nom] = partie
+    return resultats
+
+
+def _ecrire_etat(dossier, etat):
+    temporaire = Path(dossier) / f"{ETAT}.{os.getpid()}.tmp"
+    temporaire.write_text(json.dumps(etat, ensure_ascii=False), encoding="utf-8")
+    os.replace(temporaire, Path(dossier) / ETAT)
+
+
+def actualiser(referentiel, codes_client, dossier, complet=False, progression=None):
+    """Met à jour les passerelles brutes du dossier ``dossier`` ; renvoie les :class:`Differences`.
+
+    Sans état antérieur (ou avec ``complet``), toutes les passerelles sont
+    calculées. Sinon, seules celles des métiers touchés le sont, dans un
+    nouveau segment. ``progression(fraction)`` est appelée après chaque lot.
+    """
+    dossier = Path(dossier)
+    dossier.mkdir(parents=True, exist_ok=True)
+    ref = referentiel.encode
+    empreintes = empreintes_metiers(ref)
+    clients = sorted({str(code) for code in codes_client})
+    etat = None if complet else lire_etat(dossier)
+
+    if etat is None:
+        differences = Differences(complet=True)
+        segments = []
+    else:
+        differences = comparer_versions(etat, empreintes, clients)
+        segments = etat["segments"]
+    sens = sens_bruts(referentiel.masque(clients))
+
+    if not differences.vide:
+        if differences.complet:
+            travaux = {nom: [(depart, arrivee)] for nom, (depart, arrivee) in sens.items()}
+        else:
+            # Couples partant d'un métier touché, puis couples arrivant sur un métier touché
+            touche = referentiel.masque(differences.touches)
+            travaux = {
+                nom: [(depart[touche[depart]], arrivee), (depart[~touche[depart]], arrivee[touche[arrivee]])]
+                for nom, (depart, arrivee) in sens.items()
+            }
+        total = sum(len(depart) for couples in travaux.values() for depart, _ in couples) or 1
+        traites = [0]
+
+        def morceaux(couples):
+            for depart, arrivee in couples:
+                for morceau in morceaux_passerelles(ref, depart, arrivee):
+                    yield morceau
+                traites[0] += len(depart)
+                if progression:
+                    progression(traites[0] / total)
+
+        numero = max((int(s["numero"]) for s in segments), default=0) + 1
+        fichier = _segment(dossier, {nom: morceaux(couples) for nom, couples in travaux.items()}, numero)
+        segments = segments + [{"numero": numero, "fichier": fichier, "retires": differences.touches}]
+
+        # Fusion des segments : les lignes valides sont réécrites dans un seul
+        if len(segments) > SEGMENTS_MAX:
+            tables = _tables_valides(dossier, segments)
+            numero += 1
+            fichier = None
+            if tables:
+                fichier = f"segment-{numero:05d}.parquet"
+                temporaire = dossier / f"{fichier}.{os.getpid()}.tmp"
+                pq.write_table(pa.concat_tables(tables).unify_dictionaries(), temporaire)
+                os.replace(temporaire, dossier / fichier)
+            segments = [{"numero": numero, "fichier": fichier, "retires": []}]
+
+    _ecrire_etat(dossier, {
+        "format": FORMAT_RESULTATS,
+        "referentiel": referentiel.empreinte,
+        "sens": list(sens),
+        "metiers": empreintes,
+        "clients": clients,
+        "segments": segments,
+    })
+
+    # Segments qui ne sont plus référencés (fusionnés, ou d'une actualisation interrompue)
+    utilises = {segment["fichier"] for segment in segments}
+    for chemin in dossier.glob("segment-*.parquet"):
+        if chemin.name not in utilises:
+            chemin.unlink(missing_ok=True)
+    return differences
@@ -0,0 +1,148 @@
+"""Recherche approchée des passerelles par MinHash et LSH, pour les grands référentiels.
+
+Sur un catalogue de plusieurs milliers de métiers et de compétences (ROME
+fusionné avec ESCO…), les compétences les plus répandues font parcourir à
+l'index inversé une grande partie du référentiel pour chaque recherche. Ici,
+chaque métier reçoit, pour chaque catégorie, une signature MinHash de ses
+compétences ; les signatures sont découpées en bandes, et deux métiers dont
+une bande coïncide sont *candidats* l'un pour l'autre (LSH). Le score pondéré
+exact n'est ensuite calculé que sur ces candidats.
+
+Plus les bandes sont nombreuses et courtes, plus le rappel est élevé et plus
+les candidats sont nombreux : deux métiers de similarité de Jaccard ``s``
+sont candidats avec la probabilité ``1 - (1 - s ** lignes) ** bandes`` (voir
+:func:`seuil_lsh`). Le rappel mesuré par rapport au calcul exact est donné
+par ``python -m benchmarks.rappel``.
+"""
+
+import numpy as np
+
+from passerelles.index import accumuler_partages
+from passerelles.moteur import _plages
+
+# Réglage par défaut : rappel de 0,8 à 0,95 sur les référentiels synthétiques
+NB_BANDES = 128
+LIGNES_PAR_BANDE = 2
+
+# Fonctions de hachage universelles (a·x + b) mod p, p premier de Mersenne
+_PREMIER = 2 ** 31 - 1
+
+
+def seuil_lsh(nb_bandes=NB_BANDES, lignes_par_bande=LIGNES_PAR_BANDE):
+    """Similarité de Jaccard à partir de laquelle un couple a plus d'une chance sur deux d'être candidat."""
+    return (1 / nb_bandes) ** (1 / lignes_par_bande)
+
+
+def signatures_minhash(incidence, nb_permutations, graine=0, taille_bloc=16):
+    """Signature MinHash de chaque ligne d'une matrice CSR (``_PREMIER`` pour une ligne vide)."""
+    rng = np.random.default_rng(graine)
+    a = rng.integers(1, _PREMIER, size=nb_permutations, dtype=np.int64)
+    b = rng.integers(0, _PREMIER, size=nb_permutations, dtype=np.int64)
+
+    nb_lignes = incidence.shape[0]
+    signatures = np.full((nb_lignes, nb_permutations), _PREMIER, dtype=np.uint32)
+    longueurs = np.diff(incidence.indptr)
+    non_vides = np.flatnonzero(longueurs)
+    if not len(non_vides):
+        return signatures
+    colonnes = incidence.indices.astype(np.int64)[:, None]
+    # Par blocs de permutations, pour borner le tableau intermédiaire (nnz × bloc)
+    for debut in range(0, nb_permutations, taille_bloc):
+        bloc = slice(debut, debut + taille_bloc)
+        hachages = (colonnes * a[bloc] + b[bloc]) % _PREMIER
+        signatures[non_vides, bloc] = np.minimum.reduceat(hachages, incidence.indptr[non_vides], axis=0)
+    return signatures
+
+
+class IndexLSH:
+    """Index LSH des signatures MinHash d'un :class:`~passerelles.moteur.ReferentielEncode`.
+
+    Une signature de ``nb_bandes × lignes_par_bande`` valeurs est calculée par
+    métier et par catégorie ; chaque bande répartit les métiers dans des
+    seaux. ``seaux[c][m, j]`` est le seau du métier ``m`` dans la bande ``j``
+    de la catégorie ``c`` (-1 sans compétence de cette catégorie) ; les
+    membres des seaux sont rangés dans ``membres[c]`` à la manière d'une CSR.
+    """
+
+    def __init__(self, ref, nb_bandes=NB_BANDES, lignes_par_bande=LIGNES_PAR_BANDE, graine=0):
+        self.ref = ref
+        self.nb_bandes = nb_bandes
+        self.lignes_par_bande = lignes_par_bande
+        self.seaux = []
+        self.membres = []
+        for tranche in ref.incidence_par_categorie:
+            signatures = signatures_minhash(tranche, nb_bandes * lignes_par_bande, graine=graine)
+            non_vides = np.flatnonzero(np.diff(tranche.indptr))
+            seaux = np.full((ref.nb_metiers, nb_bandes), -1, dtype=np.int32)
+            decalage = 0
+            for bande in range(nb_bandes):
+                valeurs = signatures[non_vides, bande * lignes_par_bande:(bande + 1) * lignes_par_bande]
+                uniques, inverse = np.unique(valeurs, axis=0, return_inverse=True)
+                seaux[non_vides, bande] = inverse.ravel() + decalage
+                decalage += len(uniques)
+            # Membres de chaque seau, les seaux étant numérotés à la suite d'une bande à l'autre
+            valides = seaux.ravel() >= 0
+            metiers = np.repeat(np.arange(ref.nb_metiers, dtype=np.int32), nb_bandes)[valides]
+            numeros = seaux.ravel()[valides]
+            ordre = np.argsort(numeros, kind="stable")
+            indptr = np.zeros(decalage + 1, dtype=np.int64)
+            np.cumsum(np.bincount(numeros, minlength=decalage), out=indptr[1:])
+            self.seaux.append(seaux)
+            self.membres.append((indptr, metiers[ordre]))
+
+    @property
+    def seuil(self):
+        return seuil_lsh(self.nb_bandes, self.lignes_par_bande)
+
+    def candidats(self, identifiant, categories=None):
+        """Masque des métiers partageant un seau avec le métier ``identifiant``.
+
+        Seules les signatures des ``categories`` fournies (toutes par défaut)
+        sont consultées.
+        """
+        masque = np.zeros(self.ref.nb_metiers, dtype=bool)
+        for rang, categorie in enumerate(self.ref.categories):
+            if categories is not None and categorie not in categories:
+                continue
+            seaux = self.seaux[rang][identifiant]
+            seaux = seaux[seaux >= 0]
+            indptr, metiers = self.membres[rang]
+            masque[metiers[_plages(indptr[seaux], indptr[seaux + 1] - indptr[seaux])]] = True
+        masque[identifiant] = False
+        return masque
+
+    def partages(self, code, arrivee, categories=None):
+        """Compétences partagées avec les seuls métiers d'arrivée candidats.
+
+        Même résultat que :meth:`~passerelles.index.IndexInverse.partages`,
+        restreint aux métiers de :meth:`candidats` : le coût dépend du nombre
+        de candidats et non de la longueur des listes de l'index inversé.
+        """
+        ref = self.ref
+        incidence = ref.incidence_profils
+        identifiant = ref.identifiants([code])
+        if len(identifiant):
+            identifiant = identifiant[0]
+            candidats = np.flatnonzero(self.candidats(identifiant, categories) & arrivee)
+            debut, fin = incidence.indptr[identifiant:identifiant + 2]
+        else:
+            candidats = np.empty(0, dtype=np.int64)
+            debut = fin = 0
+        # Profil côté départ de chaque compétence du départ (0 : compétence absente)
+        categorie_depart = np.zeros(incidence.shape[1], dtype=np.int16)
+        categorie_depart[incidence.indices[debut:fin]] = incidence.data[debut:fin]
+
+        # Compétences des candidats, restreintes à celles du départ
+        longueurs = incidence.indptr[candidats + 1] - incidence.indptr[candidats]
+        positions = _plages(incidence.indptr[candidats], longueurs)
+        competences = incidence.indices[positions]
+        categories_depart = categorie_depart[competences]
+        communes = categories_depart > 0
+
+        return accumuler_partages(
+            ref,
+            np.repeat(candidats, longueurs)[communes],
+            incidence.data[positions[communes]] - 1,
+            categories_depart[communes] - 1,
+            competences[communes],
+        )
@@ -0,0 +1,119 @@
+"""Chargement des fichiers Excel avec cache disque indexé par contenu.
+
+Chaque fichier déposé est identifié par l'empreinte SHA-256 de ses octets.
+Le premier chargement lit uniquement les colonnes utiles en mode lecture
+seule (streaming openpyxl), puis écrit un fichier Parquet à côté du cache :
+les relances Streamlit et les autres sessions lisent directement ce Parquet.
+Le cache est borné en taille et purgé du moins récemment utilisé au plus ancien.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from passerelles.moteur import COLONNES_REFERENTIEL
+
+ONGLET_COMPETENCES = "Macro-Compétences"
+COLONNE_CODE_CLIENT = "Code ROME"
+
+DOSSIER_CACHE = Path(os.environ.get(
+    "PASSERELLES_CACHE", Path.home() / ".cache" / "passerelles-metiers"
+))
+
+# Version du contenu des fichiers Parquet : un changement invalide le cache existant
+FORMAT_CACHE = 2
+
+# Taille maximale du cache disque (octets) avant purge LRU
+TAILLE_MAX_CACHE = int(os.environ.get("PASSERELLES_CACHE_MAX", 512 * 1024 * 1024))
+
+
+def empreinte(donnees):
+    """Empreinte SHA-256 (hexadécimale) des octets d'un fichier déposé."""
+    return hashlib.sha256(donnees).hexdigest()
+
+
+def _lire_colonnes(donnees, colonnes, onglet=None):
+    """Lit uniquement ``colonnes`` d'un onglet Excel, ligne à ligne.
+
+    Toutes les colonnes lues sont textuelles : une cellule numérique (code
+    saisi comme nombre…) est convertie en texte, les cellules vides restent vides.
+    """
+    classeur = load_workbook(io.BytesIO(donnees), read_only=True, data_only=True)
+    try:
+        feuille = classeur[onglet] if onglet else classeur.worksheets[0]
+        lignes = feuille.iter_rows(values_only=True)
+        entete = list(next(lignes, ()))
+        manquantes = [colonne for colonne in colonnes if colonne not in entete]
+        if manquantes:
+            raise ValueError(
+                f"Colonnes manquantes dans le fichier Excel : {', '.join(manquantes)}"
+            )
+        positions = [entete.index(colonne) for colonne in colonnes]
+        valeurs = {colonne: [] for colonne in colonnes}
+        for ligne in lignes:
+            for colonne, position in zip(colonnes, positions):
+                valeur = ligne[position] if position < len(ligne) else None
+                valeurs[colonne].append(None if valeur is None else str(valeur))
+    finally:
+        classeur.close()
+    return pd.DataFrame(valeurs, columns=colonnes)
+
+
+def _purger(dossier, taille_max):
+    """Supprime les fichiers les moins récemment utilisés au-delà de ``taille_max``."""
+    fichiers = sorted(dossier.glob("*.parquet"), key=lambda f: f.stat().st_mtime, reverse=True)
+    total = 0
+    for rang, fichier in enumerate(fichiers):
+        total += fichier.stat().st_size
+        if rang and total > taille_max:  # l'entrée la plus récente est toujours conservée
+            fichier.unlink(missing_ok=True)
+
+
+def _charger(donnees, suffixe, lire, cle=None, dossier=None, taille_max=None):
+    dossier = Path(dossier or DOSSIER_CACHE)
+    dossier.mkdir(parents=True, exist_ok=True)
+    chemin = dossier / f"{cle or empreinte(donnees)}-{suffixe}.v{FORMAT_CACHE}.parquet"
+
+    if chemin.exists():
+        os.utime(chemin)  # marque l'entrée comme récemment utilisée
+        return pd.read_parquet(chemin)
+
+    df = lire(donnees)
+    # Fichier temporaire propre à cet appel : les sessions Streamlit sont des fils d'un même processus
+    descripteur, temporaire = tempfile.mkstemp(prefix=f"{chemin.name}.", suffix=".tmp", dir=dossier)
+    os.close(descripteur)
+    try:
+        df.to_parquet(temporaire, index=False)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        Path(temporaire).unlink(missing_ok=True)
+        raise
+    _purger(dossier, TAILLE_MAX_CACHE if taille_max is None else taille_max)
+    return df
+
+
+def charger_competences(donnees, cle=None, dossier=None, taille_max=None):
+    """Onglet ``Macro-Compétences`` (colonnes utiles seulement) d'un fichier déposé.
+
+    ``cle`` permet de réutiliser une empreinte déjà calculée.
+    """
+    return _charger(
+        donnees, "competences",
+        lambda octets: _lire_colonnes(octets, COLONNES_REFERENTIEL, ONGLET_COMPETENCES),
+        cle=cle, dossier=dossier, taille_max=taille_max,
+    )
+
+
+def charger_codes_client(donnees, cle=None, dossier=None, taille_max=None):
+    """Codes ROME distincts de la colonne ``Code ROME`` du fichier métiers client."""
+    df = _charger(
+        donnees, "client",
+        lambda octets: _lire_colonnes(octets, [COLONNE_CODE_CLIENT]),
+        cle=cle, dossier=dossier, taille_max=taille_max,
+    )
+    return df[COLONNE_CODE_CLIENT].dropna().unique()
@@ -0,0 +1,147 @@
+"""Instrumentation légère des étapes du calcul : durée, CPU, mémoire, lignes.
+
+Chaque étape est encadrée par :meth:`Diagnostic.etape`, qui relève la durée
+écoulée, le temps CPU du fil d'exécution, le pic d'allocation Python
+(``tracemalloc``, tableaux numpy compris) et les attributs ajoutés par
+l'appelant (nombre de lignes…). Chaque mesure est écrite comme une ligne JSON
+dans le journal ``passerelles.diagnostic``.
+
+L'instrumentation est désactivée par défaut et ne coûte alors qu'un appel de
+fonction par étape ; elle s'active avec la variable d'environnement
+``PASSERELLES_DIAGNOSTIC=1`` (journal sur la sortie d'erreur, ou dans le
+fichier désigné par ``PASSERELLES_DIAGNOSTIC_JOURNAL``). Le pic mémoire est
+global au processus : avec plusieurs sessions simultanées, il est approximatif.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    from pyinstrument import Profiler as _Pyinstrument
+except ImportError:  # dépendance facultative
+    _Pyinstrument = None
+
+ACTIF = os.environ.get("PASSERELLES_DIAGNOSTIC", "").lower() not in ("", "0", "false", "non")
+
+FICHIER_JOURNAL = os.environ.get("PASSERELLES_DIAGNOSTIC_JOURNAL")
+
+journal = logging.getLogger("passerelles.diagnostic")
+
+_verrou = threading.Lock()
+
+
+def configurer_journal(chemin=FICHIER_JOURNAL):
+    """Écrit le journal de diagnostic (une ligne JSON par étape) sur stderr ou dans ``chemin``."""
+    with _verrou:
+        if journal.handlers:
+            return
+        gestionnaire = logging.FileHandler(chemin, encoding="utf-8") if chemin else logging.StreamHandler()
+        gestionnaire.setFormatter(logging.Formatter("%(message)s"))
+        journal.addHandler(gestionnaire)
+        journal.setLevel(logging.INFO)
+        journal.propagate = False
+
+
+def outils_profil():
+    """Profileurs disponibles : cProfile, et pyinstrument s'il est installé."""
+    return ["cProfile"] + (["pyinstrument"] if _Pyinstrument is not None else [])
+
+
+class Diagnostic:
+    """Mesures des étapes d'une exécution (une relance Streamlit, un traitement…).
+
+    ``contexte`` est ajouté à chaque ligne du journal (identifiant de session…).
+    """
+
+    def __init__(self, actif=ACTIF, contexte=None):
+        self.actif = actif
+        self.contexte = contexte or {}
+        self.etapes = []
+        self.profil = None
+        self._pics = []
+        self._profileur = None
+        self._debut, self._debut_cpu = time.perf_counter(), time.thread_time()
+        if actif:
+            configurer_journal()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextmanager
+    def etape(self, nom, **attributs):
+        """Mesure le bloc ``with`` ; le dictionnaire produit accepte des attributs (``lignes``…)."""
+        if not self.actif:
+            yield {}
+            return
+
+        mesure = {"etape": nom, "niveau": len(self._pics), **attributs}
+        # Le pic du parent est conservé avant la remise à zéro pour l'étape imbriquée
+        if self._pics:
+            self._pics[-1] = max(self._pics[-1], tracemalloc.get_traced_memory()[1])
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self._pics.append(0)
+        debut, debut_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield mesure
+        finally:
+            pic = max(self._pics.pop(), tracemalloc.get_traced_memory()[1])
+            if self._pics:
+                self._pics[-1] = max(self._pics[-1], pic)
+            mesure.update(
+                duree_s=round(time.perf_counter() - debut, 6),
+                cpu_s=round(time.thread_time() - debut_cpu, 6),
+                pic_memoire_mo=round(max(pic - base, 0) / 1024 ** 2, 3),
+            )
+            self.etapes.append(mesure)
+            journal.info(json.dumps({**self.contexte, **mesure}, ensure_ascii=False, default=str))
+
+    def terminer(self):
+        """Mesure ``execution`` : durée et CPU de bout en bout depuis la création du diagnostic."""
+        if not self.actif:
+            return
+        mesure = {
+            "etape": "execution",
+            "niveau": 0,
+            "duree_s": round(time.perf_counter() - self._debut, 6),
+            "cpu_s": round(time.thread_time() - self._debut_cpu, 6),
+        }
+        self.etapes.append(mesure)
+        journal.info(json.dumps({**self.contexte, **mesure}, ensure_ascii=False, default=str))
+
+    def tableau(self):
+        """Une ligne par étape terminée, dans l'ordre de fin."""
+        return pd.DataFrame(self.etapes)
+
+    def demarrer_profil(self, outil="cProfile"):
+        """Démarre la capture d'un profil du fil courant (voir :func:`outils_profil`)."""
+        if outil == "pyinstrument" and _Pyinstrument is not None:
+            self._profileur = _Pyinstrument()
+            self._profileur.start()
+        else:
+            self._profileur = cProfile.Profile()
+            self._profileur.enable()
+
+    def arreter_profil(self, nb_lignes=40):
+        """Arrête la capture en cours et range le rapport texte dans :attr:`profil`."""
+        profileur, self._profileur = self._profileur, None
+        if profileur is None:
+            return self.profil
+        if isinstance(profileur, cProfile.Profile):
+            profileur.disable()
+            sortie = io.StringIO()
+            pstats.Stats(profileur, stream=sortie).sort_stats("cumulative").print_stats(nb_lignes)
+            self.profil = sortie.getvalue()
+        else:
+            profileur.stop()
+            self.profil = profileur.output_text(unicode=True, color=False)
+        return self.profil
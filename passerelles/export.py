@@ -0,0 +1,169 @@
+"""Export des passerelles en flux : Excel, CSV compressé et Parquet.
+
+Les écrivains consomment des générateurs de DataFrames (un morceau par lot de
+métiers de départ) sans jamais assembler le résultat complet en mémoire.
+L'Excel est écrit par xlsxwriter en mode ``constant_memory`` et bascule sur
+des feuilles de continuation au-delà de la limite de lignes d'Excel.
+"""
+
+import gzip
+import io
+import itertools
+import tempfile
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+# Limite de lignes d'une feuille Excel (en-tête compris)
+LIGNES_MAX_EXCEL = 1_048_576
+
+# Nombre de lignes examinées pour estimer la largeur des colonnes
+TAILLE_ECHANTILLON = 1000
+
+COLONNE_SENS = "Sens"
+
+FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def largeurs_colonnes(echantillon):
+    """Largeur de chaque colonne, estimée sur un échantillon de lignes."""
+    echantillon = echantillon.head(TAILLE_ECHANTILLON)
+    largeurs = []
+    for colonne in echantillon.columns:
+        longueur = max((len(str(valeur)) for valeur in echantillon[colonne]), default=0)
+        largeurs.append(max(longueur, len(str(colonne))) + 2)
+    return largeurs
+
+
+def _lignes(morceau):
+    """Valeurs Python d'un morceau, cellules manquantes remplacées par None."""
+    morceau = morceau.astype(object).where(morceau.notna(), None)
+    return morceau.itertuples(index=False, name=None)
+
+
+def _nom_feuille(nom, numero):
+    if numero == 1:
+        return nom[:31]
+    suffixe = f" ({numero})"
+    return nom[:31 - len(suffixe)].rstrip() + suffixe
+
+
+def ecrire_xlsx(feuilles, destination, titres=(), lignes_max=LIGNES_MAX_EXCEL):
+    """Écrit chaque feuille ``nom → morceaux`` dans un classeur xlsx.
+
+    ``titres`` est une liste de couples ``(texte, format xlsxwriter)`` écrits en
+    tête de chaque feuille, suivis d'une ligne vide. Au-delà de ``lignes_max``
+    lignes, les données continuent sur une feuille « nom (2) », « nom (3) »…
+    """
+    classeur = xlsxwriter.Workbook(destination, {"constant_memory": True})
+    format_entete = classeur.add_format({"bold": True, "border": 1})
+    formats_titres = [classeur.add_format(style) for _, style in titres]
+    debut_donnees = len(titres) + 1 if titres else 0
+
+    def nouvelle_feuille(nom, numero, colonnes, largeurs):
+        feuille = classeur.add_worksheet(_nom_feuille(nom, numero))
+        for position, largeur in enumerate(largeurs):
+            feuille.set_column(position, position, largeur)
+        for position, ((texte, _), style) in enumerate(zip(titres, formats_titres)):
+            feuille.write(position, 0, texte, style)
+        feuille.write_row(debut_donnees, 0, colonnes, format_entete)
+        return feuille
+
+    for nom, morceaux in feuilles.items():
+        morceaux = iter(morceaux)
+        premier = next(morceaux, None)
+        if premier is None:
+            continue
+        colonnes = list(premier.columns)
+        largeurs = largeurs_colonnes(premier)
+
+        numero = 1
+        feuille = nouvelle_feuille(nom, numero, colonnes, largeurs)
+        ligne = debut_donnees + 1
+        for morceau in itertools.chain([premier], morceaux):
+            for valeurs in _lignes(morceau):
+                if ligne >= lignes_max:
+                    numero += 1
+                    feuille = nouvelle_feuille(nom, numero, colonnes, largeurs)
+                    ligne = debut_donnees + 1
+                feuille.write_row(ligne, 0, valeurs)
+                ligne += 1
+
+    if not classeur.worksheets():
+        classeur.add_worksheet()
+    classeur.close()
+
+
+def ecrire_csv_gz(morceaux, destination):
+    """Écrit les morceaux dans un CSV compressé gzip (séparateur « ; », UTF-8)."""
+    with gzip.open(destination, "wt", encoding="utf-8", newline="") as flux:
+        for rang, morceau in enumerate(morceaux):
+            morceau.to_csv(flux, sep=";", index=False, header=rang == 0)
+
+
+def ecrire_parquet(morceaux, destination):
+    """Écrit les morceaux dans un fichier Parquet, un groupe de lignes par morceau."""
+    ecrivain = None
+    try:
+        for morceau in morceaux:
+            if ecrivain is None:
+                table = pa.Table.from_pandas(morceau, preserve_index=False)
+                ecrivain = pq.ParquetWriter(destination, table.schema)
+            else:
+                table = pa.Table.from_pandas(morceau, schema=ecrivain.schema, preserve_index=False)
+            ecrivain.write_table(table)
+    finally:
+        if ecrivain is not None:
+            ecrivain.close()
+
+
+def _avec_sens(feuilles):
+    """Aplatit ``nom → morceaux`` en un seul flux avec une colonne :data:`COLONNE_SENS`."""
+    for nom, morceaux in feuilles.items():
+        for morceau in morceaux:
+            yield morceau.assign(**{COLONNE_SENS: nom})
+
+
+def exporter_passerelles(feuilles, format_export="xlsx", titres=()):
+    """Exporte ``nom → morceaux`` dans un fichier temporaire et renvoie son chemin.
+
+    Le fichier est écrit sur disque au fil de l'eau plutôt qu'en mémoire ; pour
+    les formats à une seule table, les feuilles sont distinguées par la colonne
+    :data:`COLONNE_SENS`.
+    """
+    extension, _ = FORMATS[format_export]
+    with tempfile.NamedTemporaryFile(prefix="passerelles_", suffix=f".{extension}", delete=False) as fichier:
+        chemin = fichier.name
+
+    if format_export == "xlsx":
+        ecrire_xlsx(feuilles, chemin, titres=titres)
+    elif format_export == "csv.gz":
+        ecrire_csv_gz(_avec_sens(feuilles), chemin)
+    else:
+        ecrire_parquet(_avec_sens(feuilles), chemin)
+    return chemin
+
+
+def exporter_excel(df, titre_feuille, titres=()):
+    """Classeur xlsx (en octets) d'une seule feuille, précédée des ``titres``."""
+    buffer = io.BytesIO()
+    ecrire_xlsx({titre_feuille: [df]}, buffer, titres=titres)
+    return buffer.getvalue()
+
+
+def titres_export(choix_metier, categories, poids):
+    """Lignes d'en-tête de l'export filtré : métier, dimensions, pondérations et date."""
+    pond_str = " / ".join(f"{categorie} = {poids[categorie]}%" for categorie in categories)
+    date_export = datetime.now().strftime("%d/%m/%Y à %Hh%M")
+    return [
+        (f"Métier de départ : {choix_metier}", {"bold": True, "font_size": 14}),
+        (f"Dimensions sélectionnées : {', '.join(categories)}", {"italic": True}),
+        (f"Pondérations appliquées : {pond_str}", {"italic": True}),
+        (f"Date d’export : {date_export}", {"italic": True}),
+    ]
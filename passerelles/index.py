@@ -0,0 +1,216 @@
+"""Index inversé macro-compétence → métiers pour la recherche interactive.
+
+Une recherche ne parcourt que les métiers qui partagent au moins une
+macro-compétence avec le métier de départ : les scores pondérés par catégorie
+sont accumulés dans des tableaux, puis le Top N est extrait par sélection
+partielle plutôt que par un tri complet.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from passerelles.moteur import _plages
+
+COLONNES_DETAIL = [
+    "Code Métier",
+    "Intitulé",
+    "Score pondéré total",
+    "Nb de passerelles communes",
+    "Catégorie",
+    "Compétence commune",
+]
+
+
+@dataclass(frozen=True)
+class Partages:
+    """Compétences partagées d'un métier de départ, toutes catégories confondues.
+
+    ``comptes[i, c]`` est le nombre de compétences de catégorie ``c`` partagées
+    avec le métier d'arrivée ``metiers[i]`` ; les autres tableaux décrivent une
+    ligne par compétence commune. ``categorie`` et ``categorie_depart`` y sont
+    des profils de catégories (voir :class:`~passerelles.moteur.ReferentielEncode`),
+    qui se confondent avec les catégories quand ``homogene`` est vrai. Changer
+    les pondérations ou les catégories cochées ne fait que recombiner ces
+    tableaux (:meth:`IndexInverse.classer`).
+    """
+
+    metiers: np.ndarray
+    comptes: np.ndarray
+    ligne: np.ndarray
+    categorie: np.ndarray
+    categorie_depart: np.ndarray
+    competence: np.ndarray
+    homogene: bool
+
+
+@dataclass(frozen=True)
+class ResultatRecherche:
+    """Résultat d'une recherche de passerelles pour un métier de départ.
+
+    ``top`` : Top N (score total et nombre de compétences partagées),
+    ``repartition`` : même Top N avec le score pondéré de chaque catégorie,
+    ``detail`` : une ligne par compétence commune, pour l'export Excel.
+    """
+
+    top: pd.DataFrame
+    repartition: pd.DataFrame
+    detail: pd.DataFrame
+
+    @property
+    def vide(self):
+        return self.detail.empty
+
+
+def est_homogene(categories, categories_depart, nb_categories):
+    """Vrai si chaque compétence commune a une seule et même catégorie des deux côtés."""
+    return bool((categories == categories_depart).all() and (categories < nb_categories).all())
+
+
+def accumuler_partages(ref, metiers, categories, categories_depart, competences):
+    """:class:`Partages` d'une ligne par compétence commune (métier d'arrivée, profils…)."""
+    nb_categories = len(ref.categories)
+    uniques, inverse = np.unique(metiers, return_inverse=True)
+    comptes = np.bincount(
+        inverse * nb_categories + ref.profils[categories, 0],
+        minlength=len(uniques) * nb_categories,
+    ).reshape(len(uniques), nb_categories)
+
+    return Partages(
+        metiers=uniques,
+        comptes=comptes,
+        ligne=inverse.astype(np.int32),
+        categorie=categories.astype(np.int16),
+        categorie_depart=categories_depart.astype(np.int16),
+        competence=competences.astype(np.int32),
+        homogene=est_homogene(categories, categories_depart, nb_categories),
+    )
+
+
+def _meilleurs(scores, n):
+    """Indices des ``n`` meilleurs scores (décroissants, ex aequo par indice)."""
+    if len(scores) > n:
+        seuil = np.partition(scores, len(scores) - n)[len(scores) - n]
+        candidats = np.flatnonzero(scores >= seuil)
+    else:
+        candidats = np.arange(len(scores))
+    return candidats[np.lexsort((candidats, -scores[candidats]))][:n]
+
+
+class IndexInverse:
+    """Index inversé d'un :class:`~passerelles.moteur.ReferentielEncode`."""
+
+    def __init__(self, ref):
+        self.ref = ref
+        par_competence = ref.incidence_profils.T.tocsr()
+        par_competence.sort_indices()
+        self.par_competence = par_competence
+
+    def _selection(self, poids):
+        categories = list(self.ref.categories)
+        selection = np.zeros(len(categories), dtype=bool)
+        ponderation = np.zeros(len(categories))
+        for categorie, valeur in poids.items():
+            if categorie in categories:
+                selection[categories.index(categorie)] = True
+                ponderation[categories.index(categorie)] = valeur
+        return selection, ponderation
+
+    def partages(self, code, arrivee):
+        """Compétences partagées entre le métier ``code`` et les métiers d'arrivée.
+
+        ``arrivee`` est un masque booléen des métiers d'arrivée possibles. Le
+        résultat couvre toutes les catégories et ne dépend pas des pondérations.
+        """
+        ref = self.ref
+        incidence = ref.incidence_profils
+
+        identifiant = ref.identifiants([code])
+        identifiant = identifiant[0] if len(identifiant) else -1
+
+        # Macro-compétences du métier de départ
+        if identifiant >= 0:
+            debut, fin = incidence.indptr[identifiant:identifiant + 2]
+        else:
+            debut = fin = 0
+        competences = incidence.indices[debut:fin]
+        categories_depart = incidence.data[debut:fin] - 1
+
+        # Postings de ces compétences : seuls les métiers concernés sont touchés
+        index = self.par_competence
+        longueurs = np.diff(index.indptr)[competences]
+        positions = _plages(index.indptr[competences], longueurs)
+        metiers = index.indices[positions]
+        categories = index.data[positions] - 1
+        competences = np.repeat(competences, longueurs)
+        categories_depart = np.repeat(categories_depart, longueurs)
+
+        garde = arrivee[metiers] & (metiers != identifiant)
+        return accumuler_partages(
+            ref, metiers[garde], categories[garde], categories_depart[garde], competences[garde]
+        )
+
+    def classer(self, partages, poids, n=20):
+        """Top ``n`` pondéré à partir de comptes déjà calculés par :meth:`partages`.
+
+        ``poids`` associe chaque catégorie retenue à sa pondération (en %).
+        """
+        ref = self.ref
+        selection, ponderation = self._selection(poids)
+        nb_categories = len(ref.categories)
+
+        if partages.homogene:
+            comptes = partages.comptes * selection
+            categories = partages.categorie
+            garde = selection[categories]
+        else:
+            # Une compétence de catégories différentes selon le métier, ou citée
+            # sous plusieurs catégories : comme le calcul historique, qui filtrait
+            # les catégories d'abord, chaque côté garde sa première catégorie cochée
+            retenues = ref.categories_retenues(selection)
+            categories = retenues[partages.categorie]
+            garde = (categories >= 0) & (retenues[partages.categorie_depart] >= 0)
+            comptes = np.bincount(
+                partages.ligne[garde] * nb_categories + categories[garde],
+                minlength=len(partages.metiers) * nb_categories,
+            ).reshape(len(partages.metiers), nb_categories)
+
+        nb_partagees = comptes.sum(axis=1)
+        scores = nb_partagees[:, None] * comptes * ponderation / 100
+        totaux = scores.sum(axis=1)
+
+        retenus = np.flatnonzero(nb_partagees > 0)
+        meilleurs = retenus[_meilleurs(totaux[retenus], n)]
+        metiers = partages.metiers[meilleurs]
+        colonnes = [categorie for categorie in poids if categorie in list(ref.categories)]
+        top = pd.DataFrame({
+            "Code Métier": ref.colonne("code", metiers),
+            "Intitulé": ref.colonne("intitule", metiers),
+            "Score pondéré total": totaux[meilleurs],
+            "Nombre de compétences partagées": nb_partagees[meilleurs],
+        })
+        repartition = top[["Code Métier", "Intitulé"]].copy()
+        for categorie in colonnes:
+            repartition[categorie] = scores[meilleurs, list(ref.categories).index(categorie)]
+        repartition["Score total"] = totaux[meilleurs]
+
+        lignes = partages.ligne[garde]
+        competences = partages.competence[garde]
+        categories = categories[garde]
+        ordre = np.lexsort((competences, lignes, -totaux[lignes]))
+        lignes, competences, categories = lignes[ordre], competences[ordre], categories[ordre]
+        detail = pd.DataFrame({
+            "Code Métier": ref.colonne("code", partages.metiers[lignes]),
+            "Intitulé": ref.colonne("intitule", partages.metiers[lignes]),
+            "Score pondéré total": totaux[lignes],
+            "Nb de passerelles communes": nb_partagees[lignes],
+            "Catégorie": ref.colonne("categorie", categories),
+            "Compétence commune": ref.colonne("competence", competences),
+        }, columns=COLONNES_DETAIL)
+
+        return ResultatRecherche(top=top, repartition=repartition, detail=detail)
+
+    def rechercher(self, code, arrivee, poids, n=20):
+        """Top ``n`` des passerelles depuis le métier ``code`` (voir :meth:`partages`)."""
+        return self.classer(self.partages(code, arrivee), poids, n=n)
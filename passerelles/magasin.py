@@ -0,0 +1,303 @@
+"""Magasin sur disque des similarités précalculées d'un référentiel.
+
+Pour une version donnée du référentiel, tous les scores départ → arrivée sont
+déterministes : l'étape de matérialisation calcule une fois pour toutes, pour
+chaque couple de métiers partageant au moins une macro-compétence, les comptes
+par catégorie et la liste des compétences communes. Le résultat est écrit en
+tableaux ``.npy`` dans ``<cache>/similarites/<empreinte>.v<format>/`` :
+
+- ``paires_indptr`` / ``paires_arrivee`` / ``paires_comptes`` : couples
+  (départ, arrivée) au format CSR, avec les comptes par catégorie ;
+- ``lignes_indptr`` / ``lignes_competence`` / ``lignes_categorie`` /
+  ``lignes_categorie_depart`` : compétences communes de chaque couple, triées
+  par compétence, avec leur profil de catégories à l'arrivée et au départ ;
+- ``profils`` : catégories de chaque profil (voir
+  :class:`~passerelles.moteur.ReferentielEncode`).
+
+Le magasin est ouvert paresseusement : les tableaux ne sont projetés en
+mémoire (``mmap``) qu'au premier accès et sont partagés par le système entre
+les processus. Une recherche ou un lot d'export devient une simple lecture de
+tranches. En ligne de commande ::
+
+    python -m passerelles.magasin referentiel.xlsx
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from passerelles.chargement import DOSSIER_CACHE, charger_competences, empreinte
+from passerelles.index import Partages, est_homogene
+from passerelles.moteur import TAILLE_LOT, _plages, encoder_referentiel, iterer_passerelles
+
+DOSSIER_MAGASINS = DOSSIER_CACHE / "similarites"
+
+# Version du format sur disque : un changement invalide les magasins existants
+FORMAT_MAGASIN = 2
+
+DESCRIPTION = "magasin.json"
+
+
+def chemin_magasin(cle, dossier=None):
+    """Dossier du magasin d'un référentiel d'empreinte ``cle``."""
+    return Path(dossier or DOSSIER_MAGASINS) / f"{cle}.v{FORMAT_MAGASIN}"
+
+
+def magasin_disponible(cle, dossier=None):
+    """Vrai si le magasin du référentiel ``cle`` a été matérialisé."""
+    return (chemin_magasin(cle, dossier) / DESCRIPTION).exists()
+
+
+def _compact(valeurs):
+    """Plus petit type entier signé (au moins 16 bits) contenant ``valeurs``."""
+    maximum = int(valeurs.max()) if valeurs.size else 0
+    return np.int16 if maximum <= np.iinfo(np.int16).max else np.int32
+
+
+def _tailles_par_depart(binaire, taille_lot):
+    """Nombre de couples, de compétences communes et compte maximal de chaque métier de départ.
+
+    Calculés lot par lot (``binaire[lot] @ binaire.T``) : le produit complet
+    métier × métier n'est jamais construit.
+    """
+    nb_metiers = binaire.shape[0]
+    nb_paires = np.zeros(nb_metiers, dtype=np.int64)
+    nb_lignes = np.zeros(nb_metiers, dtype=np.int64)
+    maximum = 0
+    for debut in range(0, nb_metiers, taille_lot):
+        communes = binaire[debut:debut + taille_lot] @ binaire.T
+        communes.eliminate_zeros()
+        lot = slice(debut, debut + communes.shape[0])
+        nb_paires[lot] = np.diff(communes.indptr)
+        nb_lignes[lot] = np.asarray(communes.sum(axis=1)).ravel()
+        maximum = max(maximum, int(communes.data.max()) if communes.nnz else 0)
+    return nb_paires, nb_lignes, maximum
+
+
+def materialiser(ref, cle, dossier=None, taille_lot=TAILLE_LOT, progression=None):
+    """Calcule et écrit le magasin du référentiel encodé ``ref`` (empreinte ``cle``).
+
+    Une première passe compte, lot par lot, les couples et les compétences
+    communes de chaque métier de départ ; les tableaux ``.npy`` sont ensuite
+    remplis lot par lot directement dans les fichiers : la mémoire reste
+    bornée par la taille d'un lot (plus quelques tableaux d'un élément par
+    métier). L'écriture a lieu dans un dossier temporaire renommé à la fin,
+    si bien qu'un magasin présent est toujours complet.
+    ``progression(fraction)`` est appelée après chaque lot. Renvoie le chemin
+    du magasin.
+    """
+    destination = chemin_magasin(cle, dossier)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = Path(tempfile.mkdtemp(prefix=f"{destination.name}.", dir=destination.parent))
+    try:
+        paires_par_depart, lignes_par_depart, compte_max = _tailles_par_depart(ref.incidence_binaire, taille_lot)
+        nb_categories = len(ref.categories)
+        paires_indptr = np.concatenate([[0], np.cumsum(paires_par_depart)])
+        lignes_debut = np.concatenate([[0], np.cumsum(lignes_par_depart)])
+        nb_paires, nb_lignes = int(paires_indptr[-1]), int(lignes_debut[-1])
+        np.save(temporaire / "paires_indptr.npy", paires_indptr)
+        np.save(temporaire / "profils.npy", ref.profils)
+
+        def tableau(nom, type_, forme):
+            return open_memmap(temporaire / f"{nom}.npy", mode="w+", dtype=type_, shape=forme)
+
+        paires_arrivee = tableau("paires_arrivee", np.int32, (nb_paires,))
+        lignes_indptr = tableau("lignes_indptr", np.int64, (nb_paires + 1,))
+        lignes_indptr[0] = 0
+        type_comptes = _compact(np.array([compte_max]))
+        paires_comptes = tableau("paires_comptes", type_comptes, (nb_paires, nb_categories))
+        lignes = {
+            nom: tableau(f"lignes_{nom}", type_, (nb_lignes,))
+            for nom, type_ in (("competence", np.int32), ("categorie", np.int16), ("categorie_depart", np.int16))
+        }
+
+        # Lots de métiers de départ : lignes triées par départ, arrivée puis
+        # compétence, donc contiguës dans l'ordre CSR des couples
+        tous = np.arange(ref.nb_metiers, dtype=np.int32)
+        debut = 0
+        for nb_traites, lot in iterer_passerelles(ref, tous, tous, taille_lot=taille_lot):
+            premiere_paire, derniere_paire = paires_indptr[debut], paires_indptr[nb_traites]
+            premiere_ligne, derniere_ligne = lignes_debut[debut], lignes_debut[nb_traites]
+
+            # Première ligne de chaque couple (départ, arrivée) du lot
+            nouveaux = np.ones(len(lot["depart"]), dtype=bool)
+            nouveaux[1:] = (lot["depart"][1:] != lot["depart"][:-1]) | (lot["arrivee"][1:] != lot["arrivee"][:-1])
+            debuts = np.flatnonzero(nouveaux)
+            longueurs = np.diff(np.append(debuts, len(nouveaux)))
+            paires_arrivee[premiere_paire:derniere_paire] = lot["arrivee"][debuts]
+            lignes_indptr[premiere_paire + 1:derniere_paire + 1] = premiere_ligne + np.cumsum(longueurs)
+
+            paire = np.repeat(np.arange(derniere_paire - premiere_paire), longueurs)
+            paires_comptes[premiere_paire:derniere_paire] = np.bincount(
+                paire * nb_categories + lot["categorie"],
+                minlength=(derniere_paire - premiere_paire) * nb_categories,
+            ).reshape(-1, nb_categories)
+
+            tranche = slice(premiere_ligne, derniere_ligne)
+            lignes["competence"][tranche] = lot["competence"]
+            lignes["categorie"][tranche] = lot["categorie"] if not ref.categories_multiples else (
+                np.asarray(ref.incidence_profils[lot["arrivee"], lot["competence"]]).ravel() - 1
+            )
+            lignes["categorie_depart"][tranche] = (
+                np.asarray(ref.incidence_profils[lot["depart"], lot["competence"]]).ravel() - 1
+            )
+            debut = nb_traites
+            if progression:
+                progression(nb_traites / ref.nb_metiers)
+
+        for projete in (paires_arrivee, lignes_indptr, paires_comptes, *lignes.values()):
+            projete.flush()
+        del paires_arrivee, lignes_indptr, paires_comptes, lignes, projete
+
+        description = {
+            "format": FORMAT_MAGASIN,
+            "empreinte": cle,
+            "nb_metiers": ref.nb_metiers,
+            "nb_categories": nb_categories,
+            "nb_paires": nb_paires,
+            "nb_lignes": nb_lignes,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        (temporaire / DESCRIPTION).write_text(json.dumps(description), encoding="utf-8")
+        try:
+            os.replace(temporaire, destination)
+        except OSError:  # matérialisé entre-temps par un autre processus
+            if not magasin_disponible(cle, dossier):
+                raise
+    finally:
+        shutil.rmtree(temporaire, ignore_errors=True)
+    return destination
+
+
+class MagasinSimilarites:
+    """Lecture d'un magasin matérialisé par :func:`materialiser`.
+
+    Seule la description est lue à l'ouverture ; chaque tableau est projeté
+    en mémoire à son premier accès.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = Path(chemin)
+        self.description = json.loads((self.chemin / DESCRIPTION).read_text(encoding="utf-8"))
+        self._tableaux = {}
+        self._verrou = threading.Lock()
+
+    @property
+    def nb_metiers(self):
+        return self.description["nb_metiers"]
+
+    def _tableau(self, nom):
+        tableau = self._tableaux.get(nom)
+        if tableau is None:
+            with self._verrou:
+                tableau = self._tableaux.setdefault(
+                    nom, np.load(self.chemin / f"{nom}.npy", mmap_mode="r")
+                )
+        return tableau
+
+    def _paires(self, metiers):
+        """Indices des couples des métiers de départ ``metiers``, dans l'ordre."""
+        indptr = self._tableau("paires_indptr")
+        debuts = indptr[metiers]
+        longueurs = indptr[np.asarray(metiers) + 1] - debuts
+        return _plages(debuts, longueurs), longueurs
+
+    def _lignes(self, paires):
+        """Indices des compétences communes des ``paires`` et leur nombre par couple."""
+        indptr = self._tableau("lignes_indptr")
+        debuts = indptr[paires]
+        longueurs = indptr[paires + 1] - debuts
+        return _plages(debuts, longueurs), longueurs
+
+    def partages(self, ref, code, arrivee):
+        """Équivalent de :meth:`~passerelles.index.IndexInverse.partages`, par lecture."""
+        identifiant = ref.identifiants([code])
+        paires, _ = self._paires(identifiant)
+        metiers = self._tableau("paires_arrivee")[paires]
+        garde = arrivee[metiers] & (metiers != (identifiant[0] if len(identifiant) else -1))
+        paires, metiers = paires[garde], metiers[garde]
+
+        lignes, longueurs = self._lignes(paires)
+        categories = self._tableau("lignes_categorie")[lignes]
+        categories_depart = self._tableau("lignes_categorie_depart")[lignes]
+        return Partages(
+            metiers=metiers,
+            comptes=self._tableau("paires_comptes")[paires].astype(np.int64),
+            ligne=np.repeat(np.arange(len(paires), dtype=np.int32), longueurs),
+            categorie=categories,
+            categorie_depart=categories_depart,
+            competence=self._tableau("lignes_competence")[lignes],
+            homogene=est_homogene(categories, categories_depart, self.description["nb_categories"]),
+        )
+
+    def passerelles_lot(self, lot, arrivee):
+        """Équivalent de :func:`~passerelles.moteur.passerelles_lot`, par lecture.
+
+        ``lot`` et ``arrivee`` sont des identifiants de métiers.
+        """
+        masque = np.zeros(self.nb_metiers, dtype=bool)
+        masque[arrivee] = True
+        paires, longueurs = self._paires(lot)
+        departs = np.repeat(np.asarray(lot, dtype=np.int32), longueurs)
+        metiers = self._tableau("paires_arrivee")[paires]
+        garde = masque[metiers]
+        paires, departs, metiers = paires[garde], departs[garde], metiers[garde]
+
+        lignes, nb_partagees = self._lignes(paires)
+        # Export brut : catégorie de la première ligne, en tête du profil
+        profils = self._tableau("profils")
+        return {
+            "depart": np.repeat(departs, nb_partagees),
+            "arrivee": np.repeat(metiers, nb_partagees),
+            "nb_partagees": np.repeat(nb_partagees, nb_partagees).astype(np.int32),
+            "categorie": profils[self._tableau("lignes_categorie")[lignes], 0],
+            "competence": self._tableau("lignes_competence")[lignes],
+        }
+
+
+def ouvrir_magasin(cle, dossier=None):
+    """Magasin du référentiel ``cle``, ou ``None`` s'il n'a pas été matérialisé."""
+    if not magasin_disponible(cle, dossier):
+        return None
+    return MagasinSimilarites(chemin_magasin(cle, dossier))
+
+
+def main(arguments=None):
+    parseur = argparse.ArgumentParser(
+        prog="python -m passerelles.magasin",
+        description="Précalcule les similarités d'un référentiel Macro-Compétences.",
+    )
+    parseur.add_argument("referentiel", type=Path, help="fichier Excel du référentiel")
+    parseur.add_argument("--dossier", type=Path, default=None, help="dossier des magasins")
+    arguments = parseur.parse_args(arguments)
+
+    donnees = arguments.referentiel.read_bytes()
+    cle = empreinte(donnees)
+    if magasin_disponible(cle, arguments.dossier):
+        print(f"Magasin déjà présent : {chemin_magasin(cle, arguments.dossier)}")
+        return
+
+    debut = time.perf_counter()
+    ref = encoder_referentiel(charger_competences(donnees, cle=cle))
+    chemin = materialiser(
+        ref, cle, arguments.dossier,
+        progression=lambda fraction: print(f"\r{fraction:6.1%}", end="", flush=True),
+    )
+    description = MagasinSimilarites(chemin).description
+    taille = sum(fichier.stat().st_size for fichier in chemin.iterdir())
+    print(
+        f"\n{description['nb_paires']} couples, {description['nb_lignes']} compétences communes, "
+        f"{taille / 1024 ** 2:.1f} Mo en {time.perf_counter() - debut:.1f} s → {chemin}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Moteur vectorisé de calcul des passerelles métiers.
+
+Le référentiel est encodé une seule fois en identifiants entiers (métiers,
+macro-compétences, catégories). Chaque métier devient une ligne d'une matrice
+d'incidence creuse métier × macro-compétence : le nombre de compétences
+partagées entre deux métiers est alors un simple produit matriciel, et le
+détail des compétences communes s'obtient par jointure sur les identifiants.
+
+Comme dans le calcul historique, un couple (métier, macro-compétence) n'est
+compté qu'une fois et prend la catégorie de sa première ligne dans le fichier.
+La recherche interactive, elle, filtrait les catégories avant : les autres
+catégories d'un couple cité plusieurs fois sont gardées dans son *profil*.
+"""
+
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CATEGORIES = ["Savoir-faire", "Savoir-être professionnels", "Savoirs"]
+
+COLONNES_REFERENTIEL = ["Code Métier", "Intitulé", "Macro Compétence", "Catégorie"]
+
+COLONNES_BRUTES = [
+    "Code Métier Départ",
+    "Intitulé Départ",
+    "Code Métier Arrivée",
+    "Intitulé Arrivée",
+    "Nombre de compétences partagées",
+    "Catégorie",
+    "Compétence commune",
+]
+
+# Nombre de métiers de départ traités par lot : borne la mémoire de l'expansion
+TAILLE_LOT = 256
+
+
+@dataclass(frozen=True, eq=False)
+class ReferentielEncode:
+    """Référentiel de macro-compétences encodé en identifiants entiers.
+
+    Les tableaux ``metier``, ``competence`` et ``categorie`` décrivent une ligne
+    par couple distinct (métier, macro-compétence). ``profils[p]`` liste les
+    catégories distinctes d'un couple dans l'ordre du fichier (complétée par
+    -1) et ``profil`` désigne celui de chaque ligne : les premiers profils sont
+    les catégories seules, si bien que ``profil == categorie`` pour un couple
+    cité sous une seule catégorie.
+    """
+
+    codes: np.ndarray
+    intitules: np.ndarray
+    competences: np.ndarray
+    categories: np.ndarray
+    metier: np.ndarray
+    competence: np.ndarray
+    categorie: np.ndarray
+    profils: np.ndarray
+    profil: np.ndarray
+
+    @property
+    def nb_metiers(self):
+        return len(self.codes)
+
+    @property
+    def categories_multiples(self):
+        """Vrai si un métier cite une même compétence sous plusieurs catégories."""
+        return len(self.profils) > len(self.categories)
+
+    def categories_retenues(self, selection):
+        """Catégorie retenue pour chaque profil : sa première catégorie cochée dans ``selection``, sinon -1."""
+        cochees = (self.profils >= 0) & selection[self.profils]
+        premieres = self.profils[np.arange(len(self.profils)), cochees.argmax(axis=1)]
+        return np.where(cochees.any(axis=1), premieres, -1)
+
+    @cached_property
+    def incidence(self):
+        """Matrice CSR métier × compétence, valeur = identifiant de catégorie + 1."""
+        return sparse.csr_matrix(
+            (self.categorie.astype(np.int16) + 1, (self.metier, self.competence)),
+            shape=(len(self.codes), len(self.competences)),
+        )
+
+    @cached_property
+    def incidence_profils(self):
+        """Matrice CSR métier × compétence, valeur = identifiant de profil + 1."""
+        if not self.categories_multiples:
+            return self.incidence
+        return sparse.csr_matrix(
+            (self.profil.astype(np.int32) + 1, (self.metier, self.competence)),
+            shape=(len(self.codes), len(self.competences)),
+        )
+
+    @cached_property
+    def incidence_par_categorie(self):
+        """Une tranche binaire de la matrice d'incidence par catégorie."""
+        tranches = []
+        for identifiant in range(len(self.categories)):
+            tranche = self.incidence.copy()
+            tranche.data = (tranche.data == identifiant + 1).astype(np.int32)
+            tranche.eliminate_zeros()
+            tranches.append(tranche)
+        return tranches
+
+    @cached_property
+    def incidence_binaire(self):
+        binaire = self.incidence.copy()
+        binaire.data = np.ones_like(binaire.data, dtype=np.int32)
+        return binaire
+
+    @cached_property
+    def _index_codes(self):
+        return pd.Index(self.codes)
+
+    def identifiants(self, codes):
+        """Identifiants des codes métiers fournis (les codes inconnus sont ignorés)."""
+        positions = self._index_codes.get_indexer(pd.Index(codes).unique())
+        return np.unique(positions[positions >= 0]).astype(np.int32)
+
+    @cached_property
+    def _intitules_factorises(self):
+        return pd.factorize(self.intitules, sort=True)
+
+    @cached_property
+    def types(self):
+        """Types catégoriels partagés par toutes les tables de résultats.
+
+        Les résultats ne stockent que des codes entiers vers ces vocabulaires ;
+        les libellés ne sont matérialisés qu'à l'affichage ou à l'export.
+        """
+        return {
+            "code": pd.CategoricalDtype(self.codes),
+            "intitule": pd.CategoricalDtype(self._intitules_factorises[1]),
+            "competence": pd.CategoricalDtype(self.competences),
+            "categorie": pd.CategoricalDtype([c for c in self.categories if not pd.isna(c)]),
+        }
+
+    def colonne(self, nature, identifiants):
+        """Colonne catégorielle d'identifiants (``nature`` : une clé de :attr:`types`).
+
+        Pour ``"code"`` et ``"intitule"``, les identifiants sont des métiers.
+        """
+        identifiants = np.asarray(identifiants)
+        if nature == "intitule":
+            identifiants = self._intitules_factorises[0][identifiants]
+        elif nature == "categorie":
+            # Catégorie absente du fichier (NaN, dernière du vocabulaire) → code -1
+            identifiants = np.where(
+                identifiants < len(self.types["categorie"].categories), identifiants, -1
+            )
+        return pd.Categorical.from_codes(identifiants, dtype=self.types[nature])
+
+
+def encoder_referentiel(df):
+    """Encode une table ``Macro-Compétences`` en :class:`ReferentielEncode`."""
+    df = df.dropna(subset=["Code Métier", "Intitulé", "Macro Compétence"])
+    distinctes = df.drop_duplicates(subset=["Code Métier", "Macro Compétence", "Catégorie"])
+    premiers_couples = ~distinctes.duplicated(subset=["Code Métier", "Macro Compétence"]).to_numpy()
+    df = distinctes[premiers_couples]
+
+    metier, codes = pd.factorize(df["Code Métier"], sort=True)
+    competence, competences = pd.factorize(df["Macro Compétence"], sort=True)
+
+    # Catégories connues en tête, dans l'ordre de l'interface, puis les autres
+    valeurs = distinctes["Catégorie"]
+    categories = CATEGORIES + sorted(set(valeurs.dropna()) - set(CATEGORIES))
+    categorie_distincte = pd.Categorical(valeurs, categories=categories).codes.astype(np.int16)
+    categories = np.array(categories, dtype=object)
+    if (categorie_distincte < 0).any():
+        categories = np.append(categories, np.nan)
+        categorie_distincte[categorie_distincte < 0] = len(categories) - 1
+    categorie = categorie_distincte[premiers_couples]
+
+    profils, profil = _profils(df, distinctes, categorie_distincte, categorie, len(categories))
+
+    premieres = np.unique(metier, return_index=True)[1]
+    intitules = df["Intitulé"].to_numpy()[premieres]
+
+    return ReferentielEncode(
+        codes=np.asarray(codes, dtype=object),
+        intitules=np.asarray(intitules, dtype=object),
+        competences=np.asarray(competences, dtype=object),
+        categories=categories,
+        metier=metier.astype(np.int32),
+        competence=competence.astype(np.int32),
+        categorie=categorie,
+        profils=profils,
+        profil=profil,
+    )
+
+
+def _profils(df, distinctes, categorie_distincte, categorie, nb_categories):
+    """Profils de catégories (voir :class:`ReferentielEncode`) et profil de chaque ligne de ``df``."""
+    cles = ["Code Métier", "Macro Compétence"]
+    rang = distinctes.groupby(cles, sort=False).cumcount().to_numpy()
+    largeur = int(rang.max()) + 1 if len(rang) else 1
+    seules = np.full((nb_categories, largeur), -1, dtype=np.int16)
+    seules[:, 0] = np.arange(nb_categories)
+    if largeur == 1:
+        return seules, categorie.copy()
+
+    # Catégories de chaque couple, dans l'ordre du fichier
+    ligne = pd.MultiIndex.from_frame(df[cles]).get_indexer(pd.MultiIndex.from_frame(distinctes[cles]))
+    listes = np.full((len(df), largeur), -1, dtype=np.int16)
+    listes[ligne, rang] = categorie_distincte
+    multiples = listes[:, 1] >= 0
+    composes, inverse = np.unique(listes[multiples], axis=0, return_inverse=True)
+    profil = categorie.copy()
+    profil[multiples] = nb_categories + inverse.ravel()
+    return np.concatenate([seules, composes]), profil
+
+
+def _plages(debuts, longueurs):
+    """Concatène les plages [debut, debut + longueur[ sans boucle Python."""
+    total = int(longueurs.sum())
+    decalages = np.repeat(debuts - np.cumsum(longueurs) + longueurs, longueurs)
+    return decalages + np.arange(total)
+
+
+def postings_arrivee(ref, arrivee):
+    """Matrices compétence × métier d'arrivée : catégorisée (catégorie + 1) et binaire."""
+    arrivee_t = ref.incidence[arrivee].T.tocsr()
+    arrivee_t.sort_indices()
+    arrivee_binaire_t = arrivee_t.copy()
+    arrivee_binaire_t.data = np.ones_like(arrivee_t.data, dtype=np.int32)
+    return arrivee_t, arrivee_binaire_t
+
+
+def passerelles_lot(depart_lot, arrivee_t, arrivee_binaire_t, lot, arrivee):
+    """Passerelles encodées d'un lot de métiers de départ.
+
+    ``depart_lot`` contient les lignes binaires de la matrice d'incidence des
+    métiers ``lot`` ; ``arrivee_t`` et ``arrivee_binaire_t`` viennent de
+    :func:`postings_arrivee` pour les métiers ``arrivee``.
+    """
+    # Nombre de compétences partagées pour chaque couple (départ, arrivée)
+    communes = (depart_lot @ arrivee_binaire_t).tocsr()
+    communes.sort_indices()
+    communes.eliminate_zeros()
+
+    # Jointure vectorisée sur la compétence : (i, k) ⋈ (k, j)
+    depart_coo = depart_lot.tocoo()
+    k = depart_coo.col
+    longueurs = np.diff(arrivee_t.indptr)[k]
+    positions = _plages(arrivee_t.indptr[k], longueurs)
+    i = np.repeat(depart_coo.row, longueurs)
+    k = np.repeat(k, longueurs)
+    j = arrivee_t.indices[positions]
+    categorie = arrivee_t.data[positions] - 1
+
+    ordre = np.lexsort((k, j, i))
+    i, j, k, categorie = i[ordre], j[ordre], k[ordre], categorie[ordre]
+
+    # Les lignes triées par (i, j) forment des groupes dans l'ordre CSR
+    nb_partagees = np.repeat(communes.data, communes.data)
+
+    return {
+        "depart": lot[i],
+        "arrivee": arrivee[j],
+        "nb_partagees": nb_partagees.astype(np.int32),
+        "categorie": categorie.astype(np.int16),
+        "competence": k.astype(np.int32),
+    }
+
+
+def iterer_passerelles(ref, depart, arrivee, taille_lot=TAILLE_LOT, magasin=None):
+    """Produit les passerelles encodées, lot de métiers de départ par lot.
+
+    Chaque élément est un couple ``(nb_traites, lignes)`` où ``lignes`` est un
+    dictionnaire de tableaux d'identifiants (``depart``, ``arrivee``,
+    ``nb_partagees``, ``categorie``, ``competence``) trié par métier de départ,
+    métier d'arrivée puis compétence. Avec un ``magasin`` de similarités
+    précalculées (:mod:`passerelles.magasin`), les lots sont lus sur disque.
+    """
+    depart = np.asarray(depart, dtype=np.int32)
+    arrivee = np.asarray(arrivee, dtype=np.int32)
+
+    # Postings compétence → métiers d'arrivée (avec la catégorie côté arrivée)
+    if magasin is None:
+        arrivee_t, arrivee_binaire_t = postings_arrivee(ref, arrivee)
+
+    for debut in range(0, len(depart), taille_lot):
+        lot = depart[debut:debut + taille_lot]
+        if magasin is not None:
+            lignes = magasin.passerelles_lot(lot, arrivee)
+        else:
+            lignes = passerelles_lot(
+                ref.incidence_binaire[lot], arrivee_t, arrivee_binaire_t, lot, arrivee
+            )
+        yield debut + len(lot), lignes
+
+
+def decoder_passerelles(ref, lignes):
+    """DataFrame aux colonnes :data:`COLONNES_BRUTES` à partir de lignes encodées.
+
+    Les colonnes textuelles sont catégorielles : codes entiers et vocabulaires
+    du référentiel, sans copie des libellés par ligne.
+    """
+    return pd.DataFrame({
+        "Code Métier Départ": ref.colonne("code", lignes["depart"]),
+        "Intitulé Départ": ref.colonne("intitule", lignes["depart"]),
+        "Code Métier Arrivée": ref.colonne("code", lignes["arrivee"]),
+        "Intitulé Arrivée": ref.colonne("intitule", lignes["arrivee"]),
+        "Nombre de compétences partagées": lignes["nb_partagees"],
+        "Catégorie": ref.colonne("categorie", lignes["categorie"]),
+        "Compétence commune": ref.colonne("competence", lignes["competence"]),
+    }, columns=COLONNES_BRUTES)
+
+
+def morceaux_passerelles(ref, depart, arrivee, progress_bar=None, magasin=None):
+    """Passerelles décodées entre deux ensembles de métiers, un DataFrame par lot."""
+    for nb_traites, lignes in iterer_passerelles(ref, depart, arrivee, magasin=magasin):
+        yield decoder_passerelles(ref, lignes)
+        if progress_bar:
+            progress_bar.progress(nb_traites / len(depart))
+
+
+def passerelles_entre(ref, depart, arrivee, progress_bar=None):
+    """Toutes les passerelles entre deux ensembles d'identifiants de métiers."""
+    morceaux = list(morceaux_passerelles(ref, depart, arrivee, progress_bar=progress_bar))
+    if not morceaux:
+        return pd.DataFrame(columns=COLONNES_BRUTES)
+    return pd.concat(morceaux, ignore_index=True)
+
+
+def calculer_passerelles(metiers_depart, metiers_arrivee, progress_bar=None):
+    """Toutes les passerelles (une ligne par compétence commune) entre deux tables.
+
+    Les deux tables sont des sous-ensembles, métier par métier, du même
+    référentiel ``Macro-Compétences``.
+    """
+    ref = encoder_referentiel(pd.concat([metiers_arrivee, metiers_depart]))
+    depart = ref.identifiants(metiers_depart["Code Métier"].dropna().unique())
+    arrivee = ref.identifiants(metiers_arrivee["Code Métier"].dropna().unique())
+    return passerelles_entre(ref, depart, arrivee, progress_bar=progress_bar)
@@ -0,0 +1,182 @@
+"""Calcul parallèle de toutes les passerelles dans un pool de processus.
+
+Les matrices du référentiel sont écrites une seule fois dans un dossier
+temporaire au format ``.npy`` ; chaque processus les ouvre en mémoire mappée
+(lecture seule, partagée par le système) au lieu de recevoir une copie
+sérialisée à chaque tâche. Les métiers de départ sont découpés en lots, les
+deux sens (entrantes et sortantes) sont soumis au même pool, et les
+résultats sont restitués dans un ordre déterministe : sens après sens, lot
+après lot, comme le calcul séquentiel.
+
+Seuls :data:`LOTS_PAR_PROCESSUS` lots par processus sont en cours de calcul
+ou en attente de restitution : le lot suivant n'est soumis qu'une fois un
+lot restitué. Un consommateur lent (écriture d'un export) garde donc une
+mémoire bornée au lieu d'accumuler tous les résultats.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from passerelles.moteur import TAILLE_LOT, decoder_passerelles, passerelles_lot, postings_arrivee
+
+# Lots en cours ou en attente de restitution, par processus du pool
+LOTS_PAR_PROCESSUS = 2
+
+# État du processus de calcul, chargé une fois par l'initialiseur du pool
+_PARTAGE = {}
+
+
+def _ecrire_csr(dossier, nom, matrice):
+    for partie in ("data", "indices", "indptr"):
+        np.save(dossier / f"{nom}.{partie}.npy", getattr(matrice, partie))
+    np.save(dossier / f"{nom}.shape.npy", np.asarray(matrice.shape))
+
+
+def _lire_csr(dossier, nom):
+    parties = [np.load(dossier / f"{nom}.{partie}.npy", mmap_mode="r") for partie in ("data", "indices", "indptr")]
+    forme = tuple(np.load(dossier / f"{nom}.shape.npy"))
+    return sparse.csr_matrix(tuple(parties), shape=forme, copy=False)
+
+
+def _preparer(ref, sens, dossier):
+    """Écrit les matrices partagées : incidence binaire et postings de chaque sens."""
+    _ecrire_csr(dossier, "incidence", ref.incidence_binaire)
+    for nom, (depart, arrivee) in sens.items():
+        arrivee_t, _ = postings_arrivee(ref, arrivee)
+        _ecrire_csr(dossier, f"{nom}.arrivee_t", arrivee_t)
+        np.save(dossier / f"{nom}.depart.npy", np.asarray(depart, dtype=np.int32))
+        np.save(dossier / f"{nom}.arrivee.npy", np.asarray(arrivee, dtype=np.int32))
+
+
+def _initialiser(dossier, noms):
+    dossier = Path(dossier)
+    _PARTAGE["incidence"] = _lire_csr(dossier, "incidence")
+    for nom in noms:
+        arrivee_t = _lire_csr(dossier, f"{nom}.arrivee_t")
+        arrivee_binaire_t = sparse.csr_matrix(
+            (np.ones(arrivee_t.nnz, dtype=np.int32), arrivee_t.indices, arrivee_t.indptr),
+            shape=arrivee_t.shape, copy=False,
+        )
+        _PARTAGE[nom] = (
+            np.load(dossier / f"{nom}.depart.npy", mmap_mode="r"),
+            np.load(dossier / f"{nom}.arrivee.npy", mmap_mode="r"),
+            arrivee_t,
+            arrivee_binaire_t,
+        )
+
+
+def _calculer_lot(nom, debut, fin):
+    depart, arrivee, arrivee_t, arrivee_binaire_t = _PARTAGE[nom]
+    lot = np.asarray(depart[debut:fin])
+    return passerelles_lot(
+        _PARTAGE["incidence"][lot], arrivee_t, arrivee_binaire_t, lot, np.asarray(arrivee)
+    )
+
+
+def iterer_passerelles_paralleles(ref, sens, nb_processus=None, taille_lot=TAILLE_LOT,
+                                  progression=None, deja_calcules=()):
+    """Passerelles encodées de plusieurs sens, calculées dans un pool de processus.
+
+    ``sens`` associe un nom (ex. « Passerelles entrantes ») à un couple
+    ``(depart, arrivee)`` d'identifiants de métiers. Produit des triplets
+    ``(nom, debut, lignes)`` dans l'ordre des sens puis des lots, ``debut``
+    étant la position du lot parmi les métiers de départ du sens. Les lots
+    de ``deja_calcules`` (couples ``(nom, debut)``) sont sautés.
+    ``progression(nom, fraction)`` est appelée à chaque lot terminé, dans
+    l'ordre d'achèvement.
+    """
+    nb_processus = nb_processus or os.cpu_count() or 1
+    nb_lots_max = LOTS_PAR_PROCESSUS * nb_processus
+    deja_calcules = set(deja_calcules)
+    lots = [
+        (nom, debut, min(debut + taille_lot, len(depart)))
+        for nom, (depart, _) in sens.items()
+        for debut in range(0, len(depart), taille_lot)
+        if (nom, debut) not in deja_calcules
+    ]
+    totaux = {nom: len(depart) for nom, (depart, _) in sens.items()}
+    traites = dict.fromkeys(sens, 0)
+    for nom, (depart, _) in sens.items():
+        for debut in range(0, len(depart), taille_lot):
+            if (nom, debut) in deja_calcules:
+                traites[nom] += min(taille_lot, len(depart) - debut)
+
+    dossier = Path(tempfile.mkdtemp(prefix="passerelles_partage_"))
+    pool = None
+    try:
+        _preparer(ref, sens, dossier)
+        pool = ProcessPoolExecutor(
+            max_workers=nb_processus,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_initialiser,
+            initargs=(str(dossier), list(sens)),
+        )
+        en_cours, termines = {}, {}
+        soumis = suivant = 0
+        while suivant < len(lots):
+            # Nouveaux lots tant que la fenêtre (en cours + en attente) n'est pas pleine
+            while soumis < len(lots) and len(en_cours) + len(termines) < nb_lots_max:
+                en_cours[pool.submit(_calculer_lot, *lots[soumis])] = soumis
+                soumis += 1
+
+            # Restitution dans l'ordre déterministe des lots
+            if suivant in termines:
+                yield lots[suivant][0], lots[suivant][1], termines.pop(suivant)
+                suivant += 1
+                continue
+
+            faites, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for tache in faites:
+                rang = en_cours.pop(tache)
+                nom, debut, fin = lots[rang]
+                termines[rang] = tache.result()
+                traites[nom] += fin - debut
+                if progression:
+                    progression(nom, traites[nom] / totaux[nom])
+    finally:
+        # Interruption par le consommateur : les lots non démarrés sont abandonnés
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+def morceaux_paralleles(ref, sens, nb_processus=None, progress_bars=None):
+    """Passerelles décodées par sens : ``nom → générateur de DataFrames``.
+
+    Les générateurs partagent un même flux ordonné et doivent être consommés
+    dans l'ordre des sens (ce que font les écrivains de
+    :mod:`passerelles.export`). ``progress_bars`` associe éventuellement une
+    barre ``st.progress`` à chaque sens.
+    """
+    progress_bars = progress_bars or {}
+
+    def progression(nom, fraction):
+        if nom in progress_bars:
+            progress_bars[nom].progress(fraction)
+
+    flux = iterer_passerelles_paralleles(ref, sens, nb_processus=nb_processus, progression=progression)
+    en_attente = []
+
+    def morceaux(nom):
+        while True:
+            if en_attente:
+                suivant_nom, _, lignes = en_attente[0]
+            else:
+                element = next(flux, None)
+                if element is None:
+                    return
+                suivant_nom, _, lignes = element
+                en_attente.append(element)
+            if suivant_nom != nom:
+                return
+            en_attente.pop(0)
+            yield decoder_passerelles(ref, lignes)
+
+    return {nom: morceaux(nom) for nom in sens}
@@ -0,0 +1,187 @@
+"""Parcours professionnels en plusieurs étapes sur le graphe des passerelles.
+
+Le graphe relie chaque métier à ses passerelles directes : l'arête ``u → v``
+porte le score pondéré total de la recherche interactive (voir
+:meth:`~passerelles.index.IndexInverse.classer`), majoré de
+:data:`BONUS_SECTEUR` quand les deux métiers sont du même secteur (même lettre
+ROME). Toutes les arêtes d'au moins ``seuil`` sont gardées, et seulement
+elles : une étape de parcours est exactement une passerelle directe qui
+atteint ce score. Le graphe est creux (CSR) et construit par lots de métiers.
+
+Un parcours coûte la somme des inverses des scores de ses étapes : une étape
+faible pèse lourd. Son score est l'inverse de ce coût (le score de la
+passerelle pour un parcours direct). La recherche énumère les parcours sans
+boucle d'au plus ``nb_etapes_max`` étapes, en ne prolongeant que les parcours
+qui peuvent encore atteindre la cible à temps et qui restent moins coûteux
+que les ``k`` meilleurs déjà trouvés.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from passerelles.moteur import TAILLE_LOT, _plages
+from passerelles.recherche import _comptes_lot, tranches_retenues, verifier_poids
+
+# Majoration du score entre deux métiers du même secteur (lettre du code ROME)
+BONUS_SECTEUR = 1.25
+
+SEUIL_SCORE = 2.0
+NB_ETAPES_MAX = 3
+
+COLONNES_PARCOURS = [
+    "Rang",
+    "Nombre d'étapes",
+    "Parcours",
+    "Codes",
+    "Scores des étapes",
+    "Maillon le plus faible",
+    "Score du parcours",
+]
+
+
+@dataclass(frozen=True, eq=False)
+class GraphePasserelles:
+    """Graphe orienté et creux des passerelles d'un référentiel, pour des pondérations données.
+
+    ``scores[u, v]`` est le score (bonus compris) de l'arête ``u → v`` ;
+    ``entrants`` est la même matrice transposée, pour remonter depuis une cible.
+    """
+
+    referentiel: object
+    poids: dict
+    seuil: float
+    scores: sparse.csr_matrix
+    entrants: sparse.csr_matrix
+
+    @property
+    def nb_aretes(self):
+        return self.scores.nnz
+
+    def _identifiant(self, code):
+        identifiant = self.referentiel.encode.identifiants([code])
+        if not len(identifiant):
+            raise ValueError(f"Code métier inconnu du référentiel : {code}")
+        return int(identifiant[0])
+
+    def _distances(self, cible, nb_etapes_max):
+        """Nombre minimal d'étapes de chaque métier vers ``cible`` (au-delà : ``nb_etapes_max + 1``)."""
+        distances = np.full(self.scores.shape[0], nb_etapes_max + 1, dtype=np.int32)
+        distances[cible] = 0
+        frontiere = np.array([cible])
+        for etape in range(1, nb_etapes_max):
+            debuts, fins = self.entrants.indptr[frontiere], self.entrants.indptr[frontiere + 1]
+            precedents = self.entrants.indices[_plages(debuts, fins - debuts)]
+            frontiere = np.unique(precedents[distances[precedents] > etape])
+            distances[frontiere] = etape
+        return distances
+
+    def chemins(self, code_depart, code_arrivee, k=5, nb_etapes_max=NB_ETAPES_MAX):
+        """Les ``k`` meilleurs parcours de ``code_depart`` à ``code_arrivee`` (colonnes :data:`COLONNES_PARCOURS`)."""
+        source, cible = self._identifiant(code_depart), self._identifiant(code_arrivee)
+        distances = self._distances(cible, nb_etapes_max)
+        indptr, indices, donnees = self.scores.indptr, self.scores.indices, self.scores.data
+        # Score de l'arête de chaque métier vers la cible (0 : pas d'arête)
+        vers_cible = np.zeros(self.scores.shape[0])
+        debut, fin = self.entrants.indptr[cible:cible + 2]
+        vers_cible[self.entrants.indices[debut:fin]] = self.entrants.data[debut:fin]
+
+        # Parcours partiels : une ligne de métiers par parcours, et leur coût
+        partiels = np.array([[source]], dtype=np.int64)
+        couts = np.zeros(1)
+        trouves, couts_trouves = [], []
+        for etape in range(1, nb_etapes_max + 1 if source != cible else 1):
+            derniers = partiels[:, -1]
+            if etape == nb_etapes_max:
+                # Dernière étape : seule l'arête vers la cible compte, inutile de parcourir les voisins
+                parents = np.flatnonzero(vers_cible[derniers] > 0)
+                suivants = np.full(len(parents), cible)
+                nouveaux_couts = couts[parents] + 1 / vers_cible[derniers[parents]]
+            else:
+                longueurs = indptr[derniers + 1] - indptr[derniers]
+                positions = _plages(indptr[derniers], longueurs)
+                parents = np.repeat(np.arange(len(partiels)), longueurs)
+                suivants = indices[positions]
+                nouveaux_couts = couts[parents] + 1 / donnees[positions]
+
+            # Cible encore atteignable à temps, sans repasser par un métier déjà visité
+            garde = distances[suivants] <= nb_etapes_max - etape
+            garde &= ~(partiels[parents] == suivants[:, None]).any(axis=1)
+            # Prolonger un parcours ne fait qu'augmenter son coût : élagage par le k-ième trouvé
+            if len(couts_trouves) and sum(len(c) for c in couts_trouves) >= k:
+                borne = np.sort(np.concatenate(couts_trouves))[k - 1]
+                garde &= nouveaux_couts < borne
+            partiels = np.column_stack([partiels[parents[garde]], suivants[garde]])
+            couts = nouveaux_couts[garde]
+
+            arrives = partiels[:, -1] == cible
+            trouves.append(partiels[arrives])
+            couts_trouves.append(couts[arrives])
+            partiels, couts = partiels[~arrives], couts[~arrives]
+            if not len(partiels):
+                break
+
+        return self._tableau(trouves, couts_trouves, k)
+
+    def _tableau(self, trouves, couts_trouves, k):
+        ref = self.referentiel.encode
+        chemins = [chemin for groupe in trouves for chemin in groupe]
+        couts = np.concatenate(couts_trouves) if couts_trouves else np.empty(0)
+        # Ex aequo : le parcours le plus court d'abord
+        ordre = np.lexsort(([len(chemin) for chemin in chemins], couts))[:k] if chemins else []
+        lignes = []
+        for rang, position in enumerate(ordre, start=1):
+            chemin = chemins[position]
+            etapes = np.asarray(self.scores[chemin[:-1], chemin[1:]]).ravel()
+            lignes.append({
+                "Rang": rang,
+                "Nombre d'étapes": len(chemin) - 1,
+                "Parcours": " → ".join(ref.intitules[chemin]),
+                "Codes": " → ".join(ref.codes[chemin]),
+                "Scores des étapes": " → ".join(f"{score:.1f}" for score in etapes),
+                "Maillon le plus faible": etapes.min(),
+                "Score du parcours": 1 / couts[position],
+            })
+        return pd.DataFrame(lignes, columns=COLONNES_PARCOURS)
+
+
+def graphe_passerelles(referentiel, poids, seuil=SEUIL_SCORE, taille_lot=TAILLE_LOT, progression=None):
+    """Construit le :class:`GraphePasserelles` d'un référentiel pour des pondérations ``poids``.
+
+    Les comptes de compétences partagées sont calculés par lots de métiers,
+    comme :func:`~passerelles.recherche.top_passerelles_clients` ; seules les
+    arêtes d'au moins ``seuil`` sont conservées.
+    """
+    verifier_poids(poids)
+    ref = referentiel.encode
+    selection, ponderation = referentiel.index._selection(poids)
+    tranches = tranches_retenues(ref, selection)
+    lettres = pd.factorize(pd.Series(ref.codes, dtype=object).str[0])[0]
+    tous = np.arange(ref.nb_metiers, dtype=np.int32)
+
+    sources, cibles, valeurs = [], [], []
+    for debut in range(0, ref.nb_metiers, taille_lot):
+        lot = tous[debut:debut + taille_lot]
+        lignes, arrivees, comptes = _comptes_lot(ref, lot, tranches)
+        nb_partagees = comptes.sum(axis=1)
+        scores = (nb_partagees[:, None] * comptes * ponderation / 100).sum(axis=1)
+        metiers_depart = lot[lignes]
+        scores = scores * np.where(lettres[metiers_depart] == lettres[arrivees], BONUS_SECTEUR, 1)
+
+        garde = (scores >= seuil) & (arrivees != metiers_depart)
+        sources.append(metiers_depart[garde])
+        cibles.append(arrivees[garde])
+        valeurs.append(scores[garde])
+        if progression:
+            progression(min(debut + taille_lot, ref.nb_metiers) / ref.nb_metiers)
+
+    scores = sparse.csr_matrix(
+        (np.concatenate(valeurs), (np.concatenate(sources), np.concatenate(cibles))),
+        shape=(ref.nb_metiers, ref.nb_metiers),
+    )
+    scores.sort_indices()
+    return GraphePasserelles(
+        referentiel=referentiel, poids=dict(poids), seuil=seuil, scores=scores, entrants=scores.T.tocsr(),
+    )
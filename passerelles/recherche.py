@@ -0,0 +1,257 @@
+"""Interface Python des passerelles, indépendante de Streamlit.
+
+Regroupe ce que l'application enchaîne à chaque interaction (métiers de
+départ et d'arrivée selon le mode, recherche pondérée d'un métier, sens de
+l'export brut) et le traitement par lots : le Top N de *tous* les métiers de
+départ, pour plusieurs fichiers client à la fois, en une seule passe sur le
+référentiel. La ligne de commande (``python -m passerelles``) et
+l'application Streamlit ne sont que des façades de ce module.
+"""
+
+import numpy as np
+import pandas as pd
+
+from passerelles.chargement import charger_codes_client, charger_competences, empreinte
+from passerelles.moteur import TAILLE_LOT
+from passerelles.referentiel import construire_referentiel
+
+ENTRANTE = "Passerelle entrante"
+SORTANTE = "Passerelle sortante"
+MODES = [ENTRANTE, SORTANTE]
+
+COLONNE_FICHIER = "Fichier client"
+
+COLONNES_TOP = [
+    COLONNE_FICHIER,
+    "Code Métier Départ",
+    "Intitulé Départ",
+    "Rang",
+    "Code Métier Arrivée",
+    "Intitulé Arrivée",
+    "Score pondéré total",
+    "Nombre de compétences partagées",
+]
+
+
+def charger_referentiel(donnees, cle=None, dossier=None):
+    """Instantané :class:`~passerelles.referentiel.Referentiel` d'un fichier Excel (octets)."""
+    cle = cle or empreinte(donnees)
+    return construire_referentiel(charger_competences(donnees, cle=cle, dossier=dossier), cle)
+
+
+def verifier_poids(poids):
+    """Lève ``ValueError`` si aucune catégorie n'est retenue ou si les poids ne font pas 100 %."""
+    if not poids:
+        raise ValueError("Au moins une catégorie de compétence doit être sélectionnée.")
+    if sum(poids.values()) != 100:
+        raise ValueError("La somme des pondérations doit être égale à 100% pour les catégories sélectionnées.")
+
+
+def metiers_du_mode(referentiel, est_client, mode, categories):
+    """Masques ``(depart, arrivee)`` des métiers selon le ``mode`` de passerelle.
+
+    Entrante : de tout métier couvert par ``categories`` vers les métiers
+    client ; sortante : des métiers client couverts vers les autres.
+    """
+    couverts = referentiel.metiers_couverts(categories)
+    if mode == ENTRANTE:
+        return couverts, est_client
+    if mode == SORTANTE:
+        return couverts & est_client, ~est_client
+    raise ValueError(f"Mode de passerelle inconnu : {mode}")
+
+
+def sens_bruts(est_client):
+    """Sens de l'export brut : nom de feuille → ``(depart, arrivee)`` en identifiants."""
+    metiers_client = np.flatnonzero(est_client).astype(np.int32)
+    metiers_hors_client = np.flatnonzero(~est_client).astype(np.int32)
+    return {
+        "Passerelles entrantes": (metiers_hors_client, metiers_client),
+        "Passerelles sortantes": (metiers_client, metiers_hors_client),
+    }
+
+
+def partages(referentiel, code, arrivee, magasin=None, lsh=None, categories=None):
+    """Compétences partagées du métier ``code``, lues dans le ``magasin`` s'il est fourni.
+
+    Avec un index ``lsh`` (:class:`~passerelles.approximation.IndexLSH`), seuls
+    les candidats proches selon les signatures des ``categories`` sont évalués.
+    """
+    if lsh is not None:
+        return lsh.partages(code, arrivee, categories)
+    if magasin is not None:
+        return magasin.partages(referentiel.encode, code, arrivee)
+    return referentiel.index.partages(code, arrivee)
+
+
+def rechercher(referentiel, code, est_client, mode, poids, n=20, magasin=None, lsh=None):
+    """Top ``n`` pondéré des passerelles depuis le métier ``code`` (voir :class:`ResultatRecherche`).
+
+    ``lsh`` active la recherche approchée (voir :mod:`passerelles.approximation`).
+    """
+    _, arrivee = metiers_du_mode(referentiel, est_client, mode, poids)
+    return referentiel.index.classer(partages(referentiel, code, arrivee, magasin, lsh, poids), poids, n=n)
+
+
+def tranches_retenues(ref, selection):
+    """Tranches binaires métier × compétence de chaque catégorie cochée dans ``selection``.
+
+    Une compétence citée sous plusieurs catégories par un métier n'est rangée
+    que dans sa première catégorie cochée (voir
+    :meth:`~passerelles.moteur.ReferentielEncode.categories_retenues`).
+    """
+    if not ref.categories_multiples:
+        return {categorie: ref.incidence_par_categorie[categorie] for categorie in np.flatnonzero(selection)}
+    retenues = ref.categories_retenues(selection)[ref.incidence_profils.data - 1]
+    tranches = {}
+    for categorie in np.flatnonzero(selection):
+        tranche = ref.incidence_profils.copy()
+        tranche.data = (retenues == categorie).astype(np.int32)
+        tranche.eliminate_zeros()
+        tranches[categorie] = tranche
+    return tranches
+
+
+def _comptes_lot(ref, lot, tranches):
+    """Comptes par catégorie entre les métiers ``lot`` et tous les métiers.
+
+    Seules les compétences dont les catégories côté départ et côté arrivée
+    sont retenues sont comptées, par catégorie côté arrivée, comme
+    :meth:`~passerelles.index.IndexInverse.classer` ; ``tranches`` vient de
+    :func:`tranches_retenues`. Renvoie les couples ``(ligne dans le lot,
+    métier d'arrivée)`` triés et leurs comptes.
+    """
+    if not tranches:
+        vide = np.empty(0, dtype=np.int32)
+        return vide, vide, np.empty((0, len(ref.categories)), dtype=np.int64)
+    depart = sum(tranche[lot] for tranche in tranches.values())
+
+    lignes, colonnes, comptes, categories = [], [], [], []
+    for categorie, tranche in tranches.items():
+        produit = (depart @ tranche.T).tocoo()
+        lignes.append(produit.row)
+        colonnes.append(produit.col)
+        comptes.append(produit.data)
+        categories.append(np.full(produit.nnz, categorie))
+
+    nb_categories = len(ref.categories)
+    cles, inverse = np.unique(
+        np.concatenate(lignes).astype(np.int64) * ref.nb_metiers + np.concatenate(colonnes),
+        return_inverse=True,
+    )
+    comptes = np.bincount(
+        inverse * nb_categories + np.concatenate(categories),
+        weights=np.concatenate(comptes),
+        minlength=len(cles) * nb_categories,
+    ).astype(np.int64).reshape(len(cles), nb_categories)
+    return (cles // ref.nb_metiers).astype(np.int32), (cles % ref.nb_metiers).astype(np.int32), comptes
+
+
+def _premiers(lignes, scores, colonnes, n):
+    """Indices des ``n`` meilleurs scores de chaque ligne, et leur rang (à partir de 1).
+
+    Ex aequo départagés par métier d'arrivée, comme :func:`~passerelles.index._meilleurs`.
+    """
+    ordre = np.lexsort((colonnes, -scores, lignes))
+    lignes = lignes[ordre]
+    debuts = np.flatnonzero(np.r_[True, lignes[1:] != lignes[:-1]])
+    rangs = np.arange(len(lignes)) - np.repeat(debuts, np.diff(np.r_[debuts, len(lignes)]))
+    garde = rangs < n
+    return ordre[garde], rangs[garde] + 1
+
+
+_CHAMPS_TOP = ("fichier", "depart", "rang", "arrivee", "total", "nb_partagees", "scores")
+
+
+def _top_vide(nb_categories):
+    vide = {cle: np.empty(0, dtype=np.int32) for cle in ("fichier", "depart", "rang", "arrivee")}
+    vide.update(
+        total=np.empty(0), nb_partagees=np.empty(0, dtype=np.int64), scores=np.empty((0, nb_categories))
+    )
+    return vide
+
+
+def top_passerelles_clients(referentiel, clients, poids, n=20, modes=MODES, taille_lot=TAILLE_LOT,
+                            progression=None):
+    """Top ``n`` des passerelles de chaque métier de départ, pour plusieurs fichiers client.
+
+    ``clients`` associe un nom de fichier à ses codes ROME. Les comptes de
+    compétences partagées sont calculés une seule fois par lot de métiers de
+    départ, puis classés pour chaque fichier et chaque mode : le coût ne
+    croît presque pas avec le nombre de fichiers. Renvoie ``mode →
+    DataFrame`` aux colonnes :data:`COLONNES_TOP`, suivies du score de chaque
+    catégorie retenue ; les résultats sont identiques à ceux de
+    :func:`rechercher` métier par métier.
+    """
+    verifier_poids(poids)
+    ref = referentiel.encode
+    selection, ponderation = referentiel.index._selection(poids)
+    tranches = tranches_retenues(ref, selection)
+    noms = list(clients)
+    masques = {
+        (mode, numero): metiers_du_mode(referentiel, referentiel.masque(clients[nom]), mode, poids)
+        for numero, nom in enumerate(noms) for mode in modes
+    }
+    departs = np.flatnonzero(np.logical_or.reduce([depart for depart, _ in masques.values()]))
+    departs = departs.astype(np.int32)
+
+    morceaux = {mode: [] for mode in modes}
+    for debut in range(0, len(departs), taille_lot):
+        lot = departs[debut:debut + taille_lot]
+        lignes, arrivees, comptes = _comptes_lot(ref, lot, tranches)
+        nb_partagees = comptes.sum(axis=1)
+        scores = nb_partagees[:, None] * comptes * ponderation / 100
+        totaux = scores.sum(axis=1)
+        metiers_depart = lot[lignes]
+
+        for (mode, numero), (depart, arrivee) in masques.items():
+            garde = np.flatnonzero(depart[metiers_depart] & arrivee[arrivees] & (arrivees != metiers_depart))
+            meilleurs, rangs = _premiers(lignes[garde], totaux[garde], arrivees[garde], n)
+            meilleurs = garde[meilleurs]
+            morceaux[mode].append({
+                "fichier": np.full(len(meilleurs), numero, dtype=np.int32),
+                "depart": metiers_depart[meilleurs],
+                "rang": rangs.astype(np.int32),
+                "arrivee": arrivees[meilleurs],
+                "total": totaux[meilleurs],
+                "nb_partagees": nb_partagees[meilleurs],
+                "scores": scores[meilleurs],
+            })
+        if progression:
+            progression(min(debut + taille_lot, len(departs)) / len(departs))
+
+    colonnes_categories = [categorie for categorie in poids if categorie in list(ref.categories)]
+    resultats = {}
+    for mode, parties in morceaux.items():
+        assemble = {
+            cle: np.concatenate([partie[cle] for partie in parties]) for cle in _CHAMPS_TOP
+        } if parties else _top_vide(len(ref.categories))
+        ordre = np.lexsort((assemble["rang"], assemble["depart"], assemble["fichier"]))
+        assemble = {cle: valeurs[ordre] for cle, valeurs in assemble.items()}
+        df = pd.DataFrame({
+            COLONNE_FICHIER: pd.Categorical.from_codes(assemble["fichier"], categories=noms),
+            "Code Métier Départ": ref.colonne("code", assemble["depart"]),
+            "Intitulé Départ": ref.colonne("intitule", assemble["depart"]),
+            "Rang": assemble["rang"],
+            "Code Métier Arrivée": ref.colonne("code", assemble["arrivee"]),
+            "Intitulé Arrivée": ref.colonne("intitule", assemble["arrivee"]),
+            "Score pondéré total": assemble["total"],
+            "Nombre de compétences partagées": assemble["nb_partagees"],
+        }, columns=COLONNES_TOP)
+        for categorie in colonnes_categories:
+            df[categorie] = assemble["scores"][:, list(ref.categories).index(categorie)]
+        resultats[mode] = df
+    return resultats
+
+
+def charger_clients(chemins, dossier=None):
+    """Codes ROME de plusieurs fichiers client : nom de fichier → codes.
+
+    Les fichiers homonymes (dossiers différents) sont désignés par leur chemin.
+    """
+    noms = [chemin.name for chemin in chemins]
+    return {
+        (chemin.name if noms.count(chemin.name) == 1 else str(chemin)):
+            charger_codes_client(chemin.read_bytes(), dossier=dossier)
+        for chemin in chemins
+    }
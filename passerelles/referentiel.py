@@ -0,0 +1,169 @@
+"""Instantané immuable et indexé d'un référentiel, partagé entre les sessions.
+
+Un :class:`Referentiel` est construit une seule fois par empreinte de fichier
+(voir :func:`passerelles.chargement.empreinte`) et ne contient que des tableaux
+en lecture seule : il peut être servi tel quel à toutes les sessions Streamlit
+(``st.cache_resource``) sans copie par utilisateur.
+"""
+
+import sys
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from passerelles.index import IndexInverse
+from passerelles.moteur import ReferentielEncode, encoder_referentiel
+
+# Dictionnaire de correspondance lettre → secteur
+SECTEURS = {
+    "A": "Agriculture et Pêche, Espaces naturels et Espaces verts, Soins aux animaux",
+    "B": "Arts et Façonnage d'ouvrages d'art",
+    "C": "Banque, Assurance, Immobilier",
+    "D": "Commerce, Vente et Grande distribution",
+    "E": "Communication, Média et Multimédia",
+    "F": "Construction, Bâtiment et Travaux publics",
+    "G": "Hôtellerie-Restauration, Tourisme, Loisirs et Animation",
+    "H": "Industrie",
+    "I": "Installation et Maintenance",
+    "J": "Santé",
+    "K": "Services à la personne et à la collectivité",
+    "L": "Spectacle",
+    "M": "Support à l'entreprise",
+    "N": "Transport et Logistique",
+}
+
+TOUS_LES_SECTEURS = "Tous les secteurs"
+
+
+@dataclass(frozen=True, eq=False)
+class Referentiel:
+    """Référentiel encodé, index inversé et options d'interface précalculées."""
+
+    empreinte: str
+    encode: ReferentielEncode
+    index: IndexInverse
+    intitule_par_code: dict
+    metiers_par_secteur: dict
+    ordre_intitules: np.ndarray
+    affichages: np.ndarray
+    _code_par_affichage: dict = field(repr=False)
+
+    @property
+    def nb_metiers(self):
+        return self.encode.nb_metiers
+
+    def competences(self, code):
+        """Identifiants des macro-compétences du métier ``code``."""
+        identifiant = self.encode.identifiants([code])
+        if not len(identifiant):
+            return np.empty(0, dtype=np.int32)
+        incidence = self.encode.incidence
+        debut, fin = incidence.indptr[identifiant[0]:identifiant[0] + 2]
+        return incidence.indices[debut:fin]
+
+    def masque(self, codes):
+        """Masque booléen (par identifiant de métier) des ``codes`` fournis."""
+        masque = np.zeros(self.nb_metiers, dtype=bool)
+        masque[self.encode.identifiants(codes)] = True
+        return masque
+
+    def metiers_couverts(self, categories):
+        """Masque des métiers ayant au moins une compétence dans ``categories``."""
+        retenues = self.encode.categories_retenues(np.isin(self.encode.categories, list(categories)))
+        metiers = self.encode.metier[retenues[self.encode.profil] >= 0]
+        return np.bincount(metiers, minlength=self.nb_metiers) > 0
+
+    def options_secteurs(self, masque):
+        """Options du filtre secteur pour les métiers du ``masque``."""
+        lettres = [
+            lettre for lettre, metiers in self.metiers_par_secteur.items()
+            if masque[metiers].any()
+        ]
+        return [TOUS_LES_SECTEURS] + [f"{lettre} - {SECTEURS[lettre]}" for lettre in sorted(lettres)]
+
+    def options_metiers(self, masque, lettre=None):
+        """Libellés « code - intitulé » des métiers du ``masque``, triés par intitulé."""
+        if lettre is not None:
+            secteur = np.zeros(self.nb_metiers, dtype=bool)
+            secteur[self.metiers_par_secteur.get(lettre, [])] = True
+            masque = masque & secteur
+        return self.affichages[self.ordre_intitules[masque[self.ordre_intitules]]].tolist()
+
+    def code_affiche(self, affichage):
+        """Code métier correspondant à un libellé de :meth:`options_metiers`."""
+        return self._code_par_affichage[affichage]
+
+    @cached_property
+    def memoire(self):
+        """Empreinte mémoire approximative de l'instantané, en octets."""
+        encode = self.encode
+        tableaux = [
+            encode.codes, encode.intitules, encode.competences, encode.categories,
+            encode.metier, encode.competence, encode.categorie, encode.profils, encode.profil,
+            self.ordre_intitules, self.affichages,
+            *self.metiers_par_secteur.values(),
+        ]
+        matrices = [encode.incidence, encode.incidence_binaire, self.index.par_competence]
+        if encode.categories_multiples:
+            matrices.append(encode.incidence_profils)
+        total = sum(tableau.nbytes for tableau in tableaux)
+        total += sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in matrices)
+
+        # Les chaînes internées ne sont comptées qu'une fois
+        chaines = {}
+        for tableau in (encode.codes, encode.intitules, encode.competences, self.affichages):
+            for valeur in tableau:
+                chaines[id(valeur)] = sys.getsizeof(valeur)
+        total += sum(chaines.values())
+        for dictionnaire in (self.intitule_par_code, self.metiers_par_secteur, self._code_par_affichage):
+            total += sys.getsizeof(dictionnaire)
+        return total
+
+
+def _interner(valeurs):
+    return np.array(
+        [sys.intern(valeur) if isinstance(valeur, str) else valeur for valeur in valeurs],
+        dtype=object,
+    )
+
+
+def construire_referentiel(df, empreinte):
+    """Construit l'instantané partagé d'une table ``Macro-Compétences``."""
+    encode = encoder_referentiel(df)
+    codes = _interner(encode.codes)
+    intitules = _interner(encode.intitules)
+    encode = replace(
+        encode, codes=codes, intitules=intitules, competences=_interner(encode.competences)
+    )
+
+    # Tableaux en lecture seule : l'instantané est partagé entre les sessions
+    index = IndexInverse(encode)
+    for tableau in (encode.codes, encode.intitules, encode.competences, encode.categories,
+                    encode.metier, encode.competence, encode.categorie, encode.profils, encode.profil):
+        tableau.flags.writeable = False
+
+    lettres = pd.Series(codes, dtype=object).str[0].to_numpy()
+    metiers_par_secteur = {
+        lettre: np.flatnonzero(lettres == lettre).astype(np.int32)
+        for lettre in SECTEURS if (lettres == lettre).any()
+    }
+
+    # Tri stable par intitulé puis code, comme la liste déroulante historique
+    ordre_intitules = np.lexsort((codes.astype(str), intitules.astype(str))).astype(np.int32)
+    affichages = np.array(
+        [sys.intern(f"{code} - {intitule}") for code, intitule in zip(codes, intitules)],
+        dtype=object,
+    )
+
+    return Referentiel(
+        empreinte=empreinte,
+        encode=encode,
+        index=index,
+        intitule_par_code=dict(zip(codes, intitules)),
+        metiers_par_secteur=metiers_par_secteur,
+        ordre_intitules=ordre_intitules,
+        affichages=affichages,
+        _code_par_affichage=dict(zip(affichages, codes)),
+    )
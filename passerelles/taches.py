@@ -0,0 +1,313 @@
+"""Exécution en arrière-plan des exports longs, avec registre sur disque.
+
+Chaque tâche est identifiée par l'empreinte de ses paramètres (référentiel,
+fichier client, format) et possède un dossier ``<registre>/<identifiant>/``
+contenant son état (``etat.json``), un fichier ``.npz`` par lot de métiers de
+départ déjà calculé, puis le fichier final. Une tâche annulée ou interrompue
+reprend après son dernier lot terminé ; une tâche déjà terminée avec les mêmes
+paramètres est simplement réutilisée.
+
+Le registre est purgé au démarrage et à la fin de chaque tâche : les lots
+d'une tâche inachevée ne sont gardés que :data:`DUREE_REPRISE` secondes, les
+fichiers finaux :data:`DUREE_MAX_TACHES` secondes après leur dernière
+utilisation, et au-delà de :data:`TAILLE_MAX_TACHES` octets les tâches les
+moins récemment utilisées sont supprimées.
+
+Le calcul tourne dans un fil d'exécution séparé : la session Streamlit reste
+libre et se contente de lire l'état de la tâche à intervalles réguliers.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from passerelles.chargement import DOSSIER_CACHE
+from passerelles.export import FORMATS, exporter_passerelles
+from passerelles.moteur import TAILLE_LOT, decoder_passerelles, passerelles_lot, postings_arrivee
+from passerelles.parallele import iterer_passerelles_paralleles
+
+DOSSIER_TACHES = DOSSIER_CACHE / "taches"
+
+# Taille maximale du registre (octets) avant purge LRU
+TAILLE_MAX_TACHES = int(os.environ.get("PASSERELLES_TACHES_MAX", 2 * 1024 ** 3))
+
+# Durées de conservation sans utilisation : fichier final, lots d'une tâche inachevée
+DUREE_MAX_TACHES = 30 * 24 * 3600
+DUREE_REPRISE = 24 * 3600
+
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINEE = "terminee"
+ANNULEE = "annulee"
+INTERROMPUE = "interrompue"
+ECHEC = "echec"
+
+STATUTS_ACTIFS = {EN_ATTENTE, EN_COURS}
+
+
+class _Annulation(Exception):
+    pass
+
+
+@dataclass
+class EtatTache:
+    """État d'une tâche tel qu'enregistré dans ``etat.json``."""
+
+    identifiant: str
+    statut: str = EN_ATTENTE
+    progression: dict = field(default_factory=dict)
+    message: str = ""
+    fichier: str = ""
+    parametres: dict = field(default_factory=dict)
+    mise_a_jour: str = ""
+
+    @property
+    def active(self):
+        return self.statut in STATUTS_ACTIFS
+
+
+class GestionnaireTaches:
+    """Registre des tâches d'export et fils d'exécution de ce processus."""
+
+    def __init__(self, dossier=None):
+        self.dossier = Path(dossier or DOSSIER_TACHES)
+        self.dossier.mkdir(parents=True, exist_ok=True)
+        self._verrou = threading.Lock()
+        self._fils = {}
+        self._annulations = {}
+        self.purger()
+
+    @staticmethod
+    def identifiant(parametres):
+        """Identifiant stable d'une tâche à partir de ses paramètres."""
+        texte = json.dumps(parametres, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(texte.encode("utf-8")).hexdigest()[:20]
+
+    def _chemin_etat(self, identifiant):
+        return self.dossier / identifiant / "etat.json"
+
+    def _chemin_lot(self, identifiant, rang_sens, debut):
+        return self.dossier / identifiant / "lots" / f"{rang_sens}-{debut:08d}.npz"
+
+    def _enregistrer(self, etat):
+        etat.mise_a_jour = datetime.now().isoformat(timespec="seconds")
+        chemin = self._chemin_etat(etat.identifiant)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        temporaire = chemin.with_suffix(f".{threading.get_ident()}.tmp")
+        temporaire.write_text(json.dumps(asdict(etat), ensure_ascii=False), encoding="utf-8")
+        os.replace(temporaire, chemin)
+
+    def en_cours(self, identifiant):
+        """Vrai si la tâche tourne dans un fil de ce processus."""
+        fil = self._fils.get(identifiant)
+        return fil is not None and fil.is_alive()
+
+    def etat(self, identifiant):
+        """État de la tâche, ou ``None`` si elle n'a jamais été lancée.
+
+        Une tâche marquée active sans fil vivant (serveur redémarré) est
+        rapportée comme interrompue.
+        """
+        try:
+            etat = EtatTache(**json.loads(self._chemin_etat(identifiant).read_text(encoding="utf-8")))
+        except FileNotFoundError:  # jamais lancée, ou purgée
+            return None
+        if etat.active and not self.en_cours(identifiant):
+            etat.statut = INTERROMPUE
+        if etat.statut == TERMINEE and not (self.dossier / identifiant / etat.fichier).exists():
+            return None
+        return etat
+
+    def taches(self):
+        """États de toutes les tâches du registre."""
+        etats = (self.etat(dossier.name) for dossier in self.dossier.iterdir() if dossier.is_dir())
+        return [etat for etat in etats if etat is not None]
+
+    def chemin_fichier(self, etat):
+        """Fichier final de la tâche, marqué comme récemment utilisé."""
+        chemin = self.dossier / etat.identifiant / etat.fichier
+        os.utime(chemin)
+        return chemin
+
+    def purger(self, taille_max=None, duree_max=DUREE_MAX_TACHES, duree_reprise=DUREE_REPRISE):
+        """Supprime les tâches inactives trop anciennes, puis les moins récentes au-delà de ``taille_max``.
+
+        Une tâche inachevée (annulée, interrompue, en échec) n'est reprenable
+        que pendant ``duree_reprise`` secondes ; les tâches des fils de ce
+        processus ne sont jamais supprimées.
+        """
+        taille_max = TAILLE_MAX_TACHES if taille_max is None else taille_max
+        maintenant = time.time()
+        conservees = []
+        for dossier in self.dossier.iterdir():
+            if not dossier.is_dir() or self.en_cours(dossier.name):
+                continue
+            fichiers = [chemin for chemin in dossier.rglob("*") if chemin.is_file()]
+            try:
+                statut = json.loads(self._chemin_etat(dossier.name).read_text(encoding="utf-8"))["statut"]
+            except (OSError, ValueError, KeyError):
+                statut = None
+            utilisation = max((chemin.stat().st_mtime for chemin in fichiers), default=dossier.stat().st_mtime)
+            age = maintenant - utilisation
+            if statut in STATUTS_ACTIFS and age < duree_reprise:
+                continue  # peut-être en cours dans un autre processus
+            if age > (duree_max if statut == TERMINEE else duree_reprise):
+                shutil.rmtree(dossier, ignore_errors=True)
+            else:
+                conservees.append((utilisation, sum(chemin.stat().st_size for chemin in fichiers), dossier))
+
+        total = 0
+        for rang, (_, taille, dossier) in enumerate(sorted(conservees, reverse=True)):
+            total += taille
+            if rang and total > taille_max:  # la tâche la plus récente est toujours conservée
+                shutil.rmtree(dossier, ignore_errors=True)
+
+    def lancer(self, parametres, ref, sens, format_export="xlsx", parallele=False, magasin=None):
+        """Lance (ou reprend) la tâche correspondant à ``parametres``.
+
+        ``parametres`` doit identifier le résultat (empreintes des fichiers,
+        format…) ; ``sens`` associe chaque feuille à un couple ``(depart,
+        arrivee)`` d'identifiants de métiers. Avec un ``magasin`` de
+        similarités précalculées, les lots sont lus au lieu d'être calculés.
+        Renvoie l'identifiant de la tâche ; rien n'est recalculé si elle est
+        déjà terminée ou en cours.
+        """
+        identifiant = self.identifiant(parametres)
+        with self._verrou:
+            etat = self.etat(identifiant)
+            if etat is not None and (etat.statut == TERMINEE or self.en_cours(identifiant)):
+                return identifiant
+
+            etat = etat or EtatTache(identifiant=identifiant, parametres=parametres)
+            etat.statut = EN_ATTENTE
+            etat.message = "En attente…"
+            self._enregistrer(etat)
+
+            annulation = threading.Event()
+            fil = threading.Thread(
+                target=self._executer,
+                args=(etat, ref, sens, format_export, parallele, magasin, annulation),
+                name=f"passerelles-{identifiant}",
+                daemon=True,
+            )
+            self._annulations[identifiant] = annulation
+            self._fils[identifiant] = fil
+            fil.start()
+        return identifiant
+
+    def annuler(self, identifiant):
+        """Demande l'arrêt de la tâche après le lot en cours."""
+        annulation = self._annulations.get(identifiant)
+        if annulation is not None:
+            annulation.set()
+
+    def _lots_calcules(self, identifiant, noms):
+        calcules = set()
+        dossier = self.dossier / identifiant / "lots"
+        if dossier.exists():
+            for chemin in dossier.glob("*.npz"):
+                rang_sens, debut = chemin.stem.split("-")
+                calcules.add((noms[int(rang_sens)], int(debut)))
+        return calcules
+
+    def _sauvegarder_lot(self, identifiant, rang_sens, debut, lignes):
+        chemin = self._chemin_lot(identifiant, rang_sens, debut)
+        chemin.parent.mkdir(parents=True, exist_ok=True)
+        temporaire = chemin.with_suffix(".tmp")
+        with open(temporaire, "wb") as fichier:
+            np.savez(fichier, **lignes)
+        os.replace(temporaire, chemin)
+
+    def _calculer(self, etat, ref, sens, parallele, magasin, annulation):
+        """Calcule les lots manquants, en enregistrant chacun dès qu'il est terminé."""
+        noms = list(sens)
+        deja_calcules = self._lots_calcules(etat.identifiant, noms)
+        traites = dict.fromkeys(noms, 0)
+        for nom, debut in deja_calcules:
+            traites[nom] += min(TAILLE_LOT, len(sens[nom][0]) - debut)
+
+        def avancer(nom, debut, lignes):
+            self._sauvegarder_lot(etat.identifiant, noms.index(nom), debut, lignes)
+            traites[nom] += min(TAILLE_LOT, len(sens[nom][0]) - debut)
+            etat.progression = {
+                nom: traites[nom] / max(len(depart), 1) for nom, (depart, _) in sens.items()
+            }
+            self._enregistrer(etat)
+            if annulation.is_set():
+                raise _Annulation
+
+        if parallele and magasin is None:
+            for nom, debut, lignes in iterer_passerelles_paralleles(ref, sens, deja_calcules=deja_calcules):
+                avancer(nom, debut, lignes)
+            return
+
+        for nom, (depart, arrivee) in sens.items():
+            depart = np.asarray(depart, dtype=np.int32)
+            arrivee = np.asarray(arrivee, dtype=np.int32)
+            restants = [
+                debut for debut in range(0, len(depart), TAILLE_LOT)
+                if (nom, debut) not in deja_calcules
+            ]
+            if not restants:
+                continue
+            if magasin is None:
+                arrivee_t, arrivee_binaire_t = postings_arrivee(ref, arrivee)
+            for debut in restants:
+                lot = depart[debut:debut + TAILLE_LOT]
+                if magasin is not None:
+                    lignes = magasin.passerelles_lot(lot, arrivee)
+                else:
+                    lignes = passerelles_lot(
+                        ref.incidence_binaire[lot], arrivee_t, arrivee_binaire_t, lot, arrivee
+                    )
+                avancer(nom, debut, lignes)
+
+    def _morceaux(self, identifiant, ref, rang_sens, nb_departs):
+        for debut in range(0, nb_departs, TAILLE_LOT):
+            with np.load(self._chemin_lot(identifiant, rang_sens, debut)) as lignes:
+                yield decoder_passerelles(ref, dict(lignes))
+
+    def _executer(self, etat, ref, sens, format_export, parallele, magasin, annulation):
+        try:
+            etat.statut = EN_COURS
+            etat.message = "Calcul des passerelles…"
+            etat.progression = etat.progression or dict.fromkeys(sens, 0.0)
+            self._enregistrer(etat)
+            self._calculer(etat, ref, sens, parallele, magasin, annulation)
+
+            etat.message = "Écriture du fichier…"
+            self._enregistrer(etat)
+            feuilles = {
+                nom: self._morceaux(etat.identifiant, ref, rang_sens, len(depart))
+                for rang_sens, (nom, (depart, _)) in enumerate(sens.items())
+            }
+            chemin = exporter_passerelles(feuilles, format_export)
+            extension, _ = FORMATS[format_export]
+            etat.fichier = f"passerelles_brutes.{extension}"
+            shutil.move(chemin, self.dossier / etat.identifiant / etat.fichier)
+            shutil.rmtree(self.dossier / etat.identifiant / "lots", ignore_errors=True)
+
+            etat.statut = TERMINEE
+            etat.message = "Terminé"
+        except _Annulation:
+            etat.statut = ANNULEE
+            etat.message = "Annulée"
+        except Exception as erreur:  # l'erreur est rapportée dans l'interface
+            etat.statut = ECHEC
+            etat.message = f"Échec : {erreur}"
+        self._enregistrer(etat)
+
+        # Le fil se retire du registre, puis les tâches anciennes sont purgées
+        with self._verrou:
+            if self._fils.get(etat.identifiant) is threading.current_thread():
+                del self._fils[etat.identifiant]
+                del self._annulations[etat.identifiant]
+        self.purger()
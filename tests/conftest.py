@@ -0,0 +1,51 @@
+"""Référentiels de test : petits, avec catégories mélangées et lignes incomplètes."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from passerelles.moteur import CATEGORIES, COLONNES_REFERENTIEL
+
+
+def generer_referentiel_mixte(graine=0, nb_metiers=40, nb_competences=30):
+    """Table ``Macro-Compétences`` où une même compétence change parfois de catégorie d'un métier à l'autre.
+
+    Un métier cite parfois une même compétence sous deux catégories. S'y
+    ajoutent des lignes en double, des lignes incomplètes, une catégorie hors
+    interface et une catégorie manquante, dans un ordre quelconque.
+    """
+    rng = np.random.default_rng(graine)
+    lettres = ["A", "H", "J", "M"]
+    categorie_competence = rng.integers(len(CATEGORIES), size=nb_competences)
+    lignes = []
+    for rang in range(nb_metiers):
+        code = f"{lettres[rang % len(lettres)]}{1100 + rang:04d}"
+        for competence in rng.choice(nb_competences, size=rng.integers(1, 10), replace=False):
+            categorie = CATEGORIES[categorie_competence[competence]]
+            if rng.random() < 0.2:
+                categorie = CATEGORIES[rng.integers(len(CATEGORIES))]
+            lignes.append((code, f"Métier {rang}", f"Compétence {competence}", categorie))
+            if rng.random() < 0.1:  # même compétence citée sous une autre catégorie par ce métier
+                autre = CATEGORIES[(CATEGORIES.index(categorie) + rng.integers(1, len(CATEGORIES))) % len(CATEGORIES)]
+                lignes.append((code, f"Métier {rang}", f"Compétence {competence}", autre))
+    lignes += [
+        lignes[0],
+        (lignes[1][0], lignes[1][1], None, "Savoirs"),
+        ("Z1999", "Métier hors interface", "Compétence 1", "Autre"),
+        ("Z1998", "Métier sans catégorie", "Compétence 2", None),
+        ("Z1997", None, "Compétence 3", "Savoirs"),
+    ]
+    df = pd.DataFrame(lignes, columns=COLONNES_REFERENTIEL)
+    return df.sample(frac=1, random_state=graine).reset_index(drop=True)
+
+
+def tirer_codes_client(df, graine=0, part=0.3):
+    """Codes d'un portefeuille client : une part des métiers, plus un code inconnu du référentiel."""
+    codes = np.sort(df["Code Métier"].unique())
+    rng = np.random.default_rng(graine)
+    return list(rng.choice(codes, size=round(part * len(codes)), replace=False)) + ["X0000"]
+
+
+@pytest.fixture(params=[0, 1, 2], ids=lambda graine: f"graine{graine}")
+def graine(request):
+    return request.param
@@ -0,0 +1,128 @@
+"""L'actualisation incrémentale donne toujours les mêmes passerelles qu'un calcul complet."""
+
+import pandas as pd
+import pytest
+
+from passerelles.actualisation import SEGMENTS_MAX, actualiser, lire_etat, lire_resultats
+from passerelles.moteur import passerelles_entre
+from passerelles.recherche import sens_bruts
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+
+def calcul_complet(df, codes_client):
+    referentiel = construire_referentiel(df, "complet")
+    return {
+        nom: passerelles_entre(referentiel.encode, depart, arrivee)
+        for nom, (depart, arrivee) in sens_bruts(referentiel.masque(codes_client)).items()
+    }
+
+
+def verifier(dossier, df, codes_client):
+    attendus = calcul_complet(df, codes_client)
+    obtenus = lire_resultats(dossier)
+    assert list(obtenus) == list(attendus)
+    for nom, attendu in attendus.items():
+        pd.testing.assert_frame_equal(obtenus[nom].astype(object), attendu.astype(object), obj=nom)
+
+
+def mettre_a_jour(dossier, df, codes_client):
+    differences = actualiser(construire_referentiel(df, "version"), codes_client, dossier)
+    verifier(dossier, df, codes_client)
+    return differences
+
+
+# Chaque scénario transforme (référentiel, codes client) en une nouvelle version
+def ajouter_clients(df, codes):
+    return df, codes + [code for code in sorted(df["Code Métier"].unique()) if code not in codes][:3]
+
+
+def retirer_clients(df, codes):
+    return df, codes[2:]
+
+
+def changer_categorie(df, codes):
+    df = df.copy()
+    df.loc[df.index[:4], "Catégorie"] = "Savoirs"
+    return df, codes
+
+
+def ajouter_metier(df, codes):
+    nouveau = df[df["Code Métier"] == df["Code Métier"].iloc[0]].assign(**{"Code Métier": "N1999", "Intitulé": "Nouveau"})
+    return pd.concat([df, nouveau], ignore_index=True), codes
+
+
+def supprimer_metier(df, codes):
+    return df[df["Code Métier"] != codes[0]], codes
+
+
+def renommer_competence(df, codes):
+    return df.replace({"Macro Compétence": {"Compétence 3": "Compétence 3 (révisée)"}}), codes
+
+
+def renommer_metier(df, codes):
+    df = df.copy()
+    df.loc[df["Code Métier"] == df["Code Métier"].iloc[0], "Intitulé"] = "Intitulé révisé"
+    return df, codes
+
+
+def melanger_lignes(df, codes):
+    return df.sample(frac=1, random_state=1).reset_index(drop=True), codes
+
+
+SCENARIOS = [
+    ajouter_clients, retirer_clients, changer_categorie, ajouter_metier,
+    supprimer_metier, renommer_competence, renommer_metier, melanger_lignes,
+]
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.__name__)
+def test_actualisation_identique_au_calcul_complet(tmp_path, graine, scenario):
+    df = generer_referentiel_mixte(graine)
+    codes_client = tirer_codes_client(df, graine)
+    assert mettre_a_jour(tmp_path, df, codes_client).complet
+
+    df, codes_client = scenario(df, codes_client)
+    differences = mettre_a_jour(tmp_path, df, codes_client)
+    assert not differences.complet
+    if scenario is melanger_lignes:
+        # La catégorie d'une compétence citée plusieurs fois est celle de sa première ligne
+        distinctes = df.drop_duplicates(["Code Métier", "Macro Compétence", "Catégorie"])
+        multiples = distinctes[distinctes.duplicated(["Code Métier", "Macro Compétence"])]
+        assert set(differences.touches) <= set(multiples["Code Métier"])
+    else:
+        assert differences.touches
+
+
+def test_actualisations_successives_et_fusion_des_segments(tmp_path):
+    df = generer_referentiel_mixte()
+    codes_client = tirer_codes_client(df)
+    mettre_a_jour(tmp_path, df, codes_client)
+    for scenario in SCENARIOS + [ajouter_clients]:
+        df, codes_client = scenario(df, codes_client)
+        mettre_a_jour(tmp_path, df, codes_client)
+        etat = lire_etat(tmp_path)
+        assert len(etat["segments"]) <= SEGMENTS_MAX
+        # Seuls les segments référencés par l'état restent sur disque
+        fichiers = {chemin.name for chemin in tmp_path.glob("segment-*.parquet")}
+        assert fichiers == {segment["fichier"] for segment in etat["segments"]} - {None}
+    assert len(etat["segments"]) < len(SCENARIOS) + 2  # au moins une fusion
+
+
+def test_sans_changement_aucun_segment_n_est_ecrit(tmp_path):
+    df = generer_referentiel_mixte()
+    codes_client = tirer_codes_client(df)
+    mettre_a_jour(tmp_path, df, codes_client)
+    segments = lire_etat(tmp_path)["segments"]
+    assert mettre_a_jour(tmp_path, df, list(reversed(codes_client))).vide
+    assert lire_etat(tmp_path)["segments"] == segments
+
+
+def test_calcul_complet_force(tmp_path):
+    df = generer_referentiel_mixte()
+    codes_client = tirer_codes_client(df)
+    mettre_a_jour(tmp_path, df, codes_client)
+    df, codes_client = retirer_clients(df, codes_client)
+    assert actualiser(construire_referentiel(df, "version"), codes_client, tmp_path, complet=True).complet
+    verifier(tmp_path, df, codes_client)
+    assert len(lire_etat(tmp_path)["segments"]) == 1
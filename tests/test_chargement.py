@@ -0,0 +1,80 @@
+"""Chargement des fichiers Excel : colonnes textuelles et cache Parquet partagé entre les sessions."""
+
+import io
+import threading
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from passerelles.chargement import FORMAT_CACHE, charger_codes_client, charger_competences
+from passerelles.moteur import COLONNES_REFERENTIEL
+
+LIGNES = [
+    ("A1101", "Conducteur d'engins", "Conduite", "Savoir-faire"),
+    (1102, "Métier au code numérique", 2024, "Savoirs"),
+    ("A1103", "Métier sans catégorie", "Compétence 3", None),
+    ("A1104", 3.5, "Compétence 4", "Savoir-être professionnels"),
+]
+
+
+def classeur(onglet, entete, lignes):
+    """Octets d'un fichier Excel d'un seul onglet."""
+    livre = Workbook()
+    feuille = livre.active
+    feuille.title = onglet
+    feuille.append(list(entete))
+    for ligne in lignes:
+        feuille.append(list(ligne))
+    sortie = io.BytesIO()
+    livre.save(sortie)
+    return sortie.getvalue()
+
+
+@pytest.fixture
+def referentiel_xlsx():
+    return classeur("Macro-Compétences", COLONNES_REFERENTIEL + ["Autre colonne"], [ligne + (1,) for ligne in LIGNES])
+
+
+def test_colonnes_lues_en_texte(tmp_path, referentiel_xlsx):
+    attendu = pd.DataFrame(
+        [[None if valeur is None else str(valeur) for valeur in ligne] for ligne in LIGNES],
+        columns=COLONNES_REFERENTIEL,
+    )
+    premier = charger_competences(referentiel_xlsx, dossier=tmp_path)
+    pd.testing.assert_frame_equal(premier, attendu)
+
+    # Le cache Parquet, versionné, s'écrit malgré les colonnes de types mélangés et se relit à l'identique
+    (cache,) = tmp_path.glob("*.parquet")
+    assert cache.name.endswith(f"-competences.v{FORMAT_CACHE}.parquet")
+    pd.testing.assert_frame_equal(charger_competences(referentiel_xlsx, dossier=tmp_path), attendu)
+
+
+def test_codes_client_numeriques(tmp_path):
+    donnees = classeur("Métiers", ["Code ROME"], [("A1101",), (1102,), (None,), ("A1101",)])
+    assert list(charger_codes_client(donnees, dossier=tmp_path)) == ["A1101", "1102"]
+
+
+@pytest.mark.parametrize("essai", range(5))
+def test_premiers_chargements_simultanes(tmp_path, referentiel_xlsx, essai):
+    """Plusieurs sessions (fils d'un même processus) chargent ensemble un fichier encore absent du cache."""
+    depart = threading.Barrier(6)
+    resultats, erreurs = [], []
+
+    def charger():
+        depart.wait()
+        try:
+            resultats.append(charger_competences(referentiel_xlsx, dossier=tmp_path))
+        except Exception as erreur:  # remontée au fil principal
+            erreurs.append(erreur)
+
+    fils = [threading.Thread(target=charger) for _ in range(6)]
+    for fil in fils:
+        fil.start()
+    for fil in fils:
+        fil.join()
+
+    assert not erreurs
+    for resultat in resultats:
+        pd.testing.assert_frame_equal(resultat, resultats[0])
+    assert [chemin.suffix for chemin in tmp_path.iterdir()] == [".parquet"]
@@ -0,0 +1,66 @@
+"""L'export xlsx bascule sur des feuilles de continuation sans perdre ni dupliquer de ligne."""
+
+import numpy as np
+import pandas as pd
+
+from passerelles.export import ecrire_xlsx
+
+# Nom de plus de 31 caractères, avec une espace là où la continuation le coupe
+NOM_LONG = "Passerelles sortantes vers le fichier client 2025"
+
+
+def tableau(nb_lignes):
+    return pd.DataFrame({
+        "Code": [f"M{rang:04d}" for rang in range(nb_lignes)],
+        "Nombre": np.arange(nb_lignes),
+    })
+
+
+def morceaux(df, tailles):
+    positions = np.cumsum([0, *tailles])
+    return [df.iloc[debut:fin] for debut, fin in zip(positions[:-1], positions[1:])]
+
+
+def relire(chemin, entete=0):
+    return pd.read_excel(chemin, sheet_name=None, header=entete)
+
+
+def test_feuilles_de_continuation(tmp_path):
+    df = tableau(11)
+    chemin = tmp_path / "export.xlsx"
+    # Morceaux qui chevauchent les limites de feuille, dont un morceau vide
+    ecrire_xlsx({NOM_LONG: morceaux(df, [3, 0, 6, 2]), "Court": [df.head(2)]}, chemin, lignes_max=5)
+
+    feuilles = relire(chemin)
+    # En-tête en ligne 0, données sur les lignes 1 à 4 : 4 lignes par feuille
+    assert list(feuilles) == [
+        "Passerelles sortantes vers le f",
+        "Passerelles sortantes vers (2)",
+        "Passerelles sortantes vers (3)",
+        "Court",
+    ]
+    assert all(len(nom) <= 31 for nom in feuilles)
+    assert [len(feuille) for feuille in feuilles.values()] == [4, 4, 3, 2]
+    relu = pd.concat(list(feuilles.values())[:3], ignore_index=True)
+    pd.testing.assert_frame_equal(relu, df)
+
+
+def test_continuation_avec_titres(tmp_path):
+    df = tableau(9)
+    chemin = tmp_path / "export.xlsx"
+    titres = [("Métier de départ : test", {"bold": True}), ("Date d’export : aujourd'hui", {"italic": True})]
+    ecrire_xlsx({"Feuille": [df]}, chemin, titres=titres, lignes_max=8)
+
+    # Titres en lignes 0-1, ligne vide, en-tête en ligne 3 : 4 lignes de données par feuille
+    feuilles = relire(chemin, entete=3)
+    assert list(feuilles) == ["Feuille", "Feuille (2)", "Feuille (3)"]
+    assert [len(feuille) for feuille in feuilles.values()] == [4, 4, 1]
+    pd.testing.assert_frame_equal(pd.concat(feuilles.values(), ignore_index=True), df)
+    brut = pd.read_excel(chemin, sheet_name="Feuille (3)", header=None)
+    assert list(brut[0][:2]) == [texte for texte, _ in titres]
+
+
+def test_limite_exacte_sans_feuille_vide(tmp_path):
+    chemin = tmp_path / "export.xlsx"
+    ecrire_xlsx({"Feuille": [tableau(8)]}, chemin, lignes_max=5)
+    assert list(relire(chemin)) == ["Feuille", "Feuille (2)"]
@@ -0,0 +1,161 @@
+"""La recherche interactive par index inversé reproduit la boucle historique de l'application."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from passerelles.moteur import CATEGORIES
+from passerelles.recherche import ENTRANTE, MODES, metiers_du_mode
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+PONDERATIONS = [
+    {"Savoir-faire": 20, "Savoir-être professionnels": 20, "Savoirs": 60},
+    {"Savoir-faire": 70, "Savoirs": 30},
+    {"Savoir-être professionnels": 100},
+]
+
+
+def recherche_historique(df_comp_brut, codes_client, mode, code_selectionne, poids):
+    """Boucle de l'application d'origine pour un métier de départ : une ligne par compétence commune."""
+    df_comp = df_comp_brut[df_comp_brut["Catégorie"].isin(list(poids))].copy()
+    df_comp = df_comp.dropna(subset=["Code Métier", "Intitulé", "Macro Compétence"])
+    if mode == ENTRANTE:
+        df_depart = df_comp.copy()
+        df_arrivee = df_comp[df_comp["Code Métier"].isin(codes_client)]
+    else:
+        df_depart = df_comp[df_comp["Code Métier"].isin(codes_client)]
+        df_arrivee = df_comp[~df_comp["Code Métier"].isin(codes_client)]
+
+    competences_selection = set(df_depart[df_depart["Code Métier"] == code_selectionne]["Macro Compétence"].dropna())
+    lignes_resultats = []
+    for code_metier, groupe in df_arrivee.groupby("Code Métier"):
+        if code_metier == code_selectionne:
+            continue
+        intitule = groupe["Intitulé"].iloc[0]
+        competences_metier = set(groupe["Macro Compétence"].dropna())
+        intersection = competences_selection & competences_metier
+        score = len(intersection)
+        for comp in intersection:
+            categorie = groupe[groupe["Macro Compétence"] == comp]["Catégorie"].iloc[0]
+            lignes_resultats.append({
+                "Code Métier": code_metier,
+                "Intitulé": intitule,
+                "Nb de passerelles communes": score,
+                "Score pondéré": score * poids.get(categorie, 0) / 100,
+                "Catégorie": categorie,
+                "Compétence commune": comp,
+            })
+    return pd.DataFrame(lignes_resultats, columns=[
+        "Code Métier", "Intitulé", "Nb de passerelles communes", "Score pondéré", "Catégorie", "Compétence commune",
+    ])
+
+
+def classement_attendu(historique, poids):
+    """Scores par métier (total, nombre de compétences, part de chaque catégorie), triés comme le Top N."""
+    scores = historique.pivot_table(
+        index=["Code Métier", "Intitulé"], columns="Catégorie", values="Score pondéré", aggfunc="sum", fill_value=0,
+    ).reindex(columns=list(poids), fill_value=0)
+    scores["Score total"] = scores.sum(axis=1)
+    scores["Nombre de compétences partagées"] = historique.groupby(["Code Métier", "Intitulé"]).size()
+    return trier(scores.reset_index().rename_axis(columns=None), "Score total")
+
+
+def trier(df, colonne_score):
+    """Tri par score décroissant puis par code : l'ordre historique des ex aequo n'était pas défini.
+
+    Les scores sont arrondis avant le tri, des sommes égales pouvant différer
+    au dernier bit selon l'ordre des additions.
+    """
+    ordre = np.lexsort((df["Code Métier"].to_numpy(object), -df[colonne_score].to_numpy().round(9)))
+    return df.iloc[ordre].reset_index(drop=True)
+
+
+def departs(referentiel, codes_client, mode, poids):
+    """Codes des métiers de départ proposés par l'application pour ce mode."""
+    depart, _ = metiers_du_mode(referentiel, referentiel.masque(codes_client), mode, list(poids))
+    return referentiel.encode.codes[depart]
+
+
+def verifier_classement(resultat, historique, poids):
+    """Top, répartition par catégorie et détail identiques au résultat de la boucle historique."""
+    assert resultat.vide == historique.empty
+    if historique.empty:
+        return
+    attendu = classement_attendu(historique, poids)
+
+    assert (np.diff(resultat.top["Score pondéré total"].to_numpy()) <= 1e-9).all()
+    top = trier(resultat.top.astype({"Code Métier": object, "Intitulé": object}), "Score pondéré total")
+    attendu_top = attendu.rename(columns={"Score total": "Score pondéré total"})[list(top.columns)]
+    pd.testing.assert_frame_equal(top, attendu_top, check_dtype=False)
+
+    repartition = trier(resultat.repartition.astype({"Code Métier": object, "Intitulé": object}), "Score total")
+    pd.testing.assert_frame_equal(repartition, attendu[list(repartition.columns)], check_dtype=False)
+
+    # Détail : mêmes compétences communes, avec le score total de leur métier
+    historique = historique.copy()
+    historique["Score pondéré total"] = historique["Code Métier"].map(attendu.set_index("Code Métier")["Score total"])
+    cles = ["Code Métier", "Compétence commune"]
+    detail = resultat.detail.astype(object).sort_values(cles).reset_index(drop=True)
+    historique = historique[list(resultat.detail.columns)].sort_values(cles).reset_index(drop=True)
+    pd.testing.assert_frame_equal(detail, historique, check_dtype=False)
+    assert resultat.detail["Score pondéré total"].is_monotonic_decreasing
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("poids", PONDERATIONS, ids=["trois", "deux", "une"])
+def test_recherche_identique_a_la_boucle_historique(graine, mode, poids):
+    df = generer_referentiel_mixte(graine)
+    codes_client = tirer_codes_client(df, graine)
+    referentiel = construire_referentiel(df, "test")
+    _, arrivee = metiers_du_mode(referentiel, referentiel.masque(codes_client), mode, list(poids))
+    assert referentiel.encode.categories_multiples
+
+    nb_compares = nb_heterogenes = 0
+    for code in departs(referentiel, codes_client, mode, poids)[::2]:
+        historique = recherche_historique(df, codes_client, mode, code, poids)
+        calcules = referentiel.index.partages(code, arrivee)
+        resultat = referentiel.index.classer(calcules, poids, n=len(df))
+        verifier_classement(resultat, historique, poids)
+        nb_compares += not historique.empty
+        nb_heterogenes += not historique.empty and not calcules.homogene
+
+        # Top 20 : tête du classement complet
+        pd.testing.assert_frame_equal(referentiel.index.rechercher(code, arrivee, poids).top, resultat.top.head(20))
+    # Des compétences de catégories différentes selon le métier sont bien rencontrées
+    assert nb_compares > 0 and nb_heterogenes > 0
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_reponderation_sans_recalcul_des_partages(graine, mode):
+    """Les mêmes :class:`Partages`, reclassés pour chaque pondération, donnent le résultat historique."""
+    df = generer_referentiel_mixte(graine)
+    codes_client = tirer_codes_client(df, graine)
+    referentiel = construire_referentiel(df, "test")
+    # Arrivée commune à toutes les pondérations : les partages ne dépendent pas des catégories cochées
+    _, arrivee = metiers_du_mode(referentiel, referentiel.masque(codes_client), mode, CATEGORIES)
+
+    for code in departs(referentiel, codes_client, mode, CATEGORIES)[1::2]:
+        calcules = referentiel.index.partages(code, arrivee)
+        for poids in PONDERATIONS:
+            resultat = referentiel.index.classer(calcules, poids, n=len(df))
+            verifier_classement(resultat, recherche_historique(df, codes_client, mode, code, poids), poids)
+
+
+def test_competence_citee_sous_deux_categories_par_un_metier():
+    """Comme la boucle historique, chaque métier garde la première catégorie cochée d'une compétence."""
+    df = pd.DataFrame([
+        ("A1100", "Métier A", "Compétence 1", "Savoirs"),
+        ("A1100", "Métier A", "Compétence 1", "Savoir-faire"),
+        ("A1100", "Métier A", "Compétence 2", "Savoir-faire"),
+        ("B1100", "Métier B", "Compétence 1", "Savoir-être professionnels"),
+        ("B1100", "Métier B", "Compétence 1", "Savoir-faire"),
+        ("B1100", "Métier B", "Compétence 2", "Savoir-faire"),
+    ], columns=["Code Métier", "Intitulé", "Macro Compétence", "Catégorie"])
+    referentiel = construire_referentiel(df, "test")
+    for poids in ({"Savoir-faire": 100}, {"Savoirs": 50, "Savoir-faire": 50}, {"Savoirs": 100}):
+        _, arrivee = metiers_du_mode(referentiel, referentiel.masque(["B1100"]), ENTRANTE, list(poids))
+        resultat = referentiel.index.rechercher("A1100", arrivee, poids, n=len(df))
+        verifier_classement(resultat, recherche_historique(df, ["B1100"], ENTRANTE, "A1100", poids), poids)
+    # Savoir-faire seul : les deux compétences sont partagées, en Savoir-faire des deux côtés
+    assert len(referentiel.index.rechercher("A1100", arrivee, {"Savoir-faire": 100}).detail) == 2
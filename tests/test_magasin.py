@@ -0,0 +1,61 @@
+"""Le magasin précalculé donne les mêmes partages et les mêmes passerelles que le calcul direct."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from passerelles.magasin import chemin_magasin, materialiser, ouvrir_magasin
+from passerelles.moteur import iterer_passerelles
+from passerelles.recherche import MODES, metiers_du_mode, partages, sens_bruts
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+POIDS = {"Savoir-faire": 20, "Savoir-être professionnels": 20, "Savoirs": 60}
+
+
+@pytest.fixture
+def referentiel_et_magasin(tmp_path, graine):
+    df = generer_referentiel_mixte(graine)
+    referentiel = construire_referentiel(df, "test")
+    materialiser(referentiel.encode, "test", dossier=tmp_path)
+    return referentiel, tirer_codes_client(df, graine), ouvrir_magasin("test", dossier=tmp_path)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_recherche_par_le_magasin(referentiel_et_magasin, mode):
+    referentiel, codes_client, magasin = referentiel_et_magasin
+    depart, arrivee = metiers_du_mode(referentiel, referentiel.masque(codes_client), mode, list(POIDS))
+    for code in referentiel.encode.codes[depart]:
+        attendu = referentiel.index.rechercher(code, arrivee, POIDS)
+        obtenu = referentiel.index.classer(partages(referentiel, code, arrivee, magasin=magasin), POIDS)
+        pd.testing.assert_frame_equal(obtenu.top, attendu.top)
+        pd.testing.assert_frame_equal(obtenu.repartition, attendu.repartition)
+        pd.testing.assert_frame_equal(obtenu.detail, attendu.detail)
+
+
+def test_export_par_le_magasin(referentiel_et_magasin):
+    referentiel, codes_client, magasin = referentiel_et_magasin
+    ref = referentiel.encode
+    for depart, arrivee in sens_bruts(referentiel.masque(codes_client)).values():
+        for (nb_lus, lus), (nb_calcules, calcules) in zip(
+            iterer_passerelles(ref, depart, arrivee, taille_lot=5, magasin=magasin),
+            iterer_passerelles(ref, depart, arrivee, taille_lot=5),
+            strict=True,
+        ):
+            assert nb_lus == nb_calcules
+            for cle, valeurs in calcules.items():
+                np.testing.assert_array_equal(lus[cle], valeurs, err_msg=cle)
+
+
+def test_materialisation_independante_de_la_taille_des_lots(tmp_path):
+    ref = construire_referentiel(generer_referentiel_mixte(), "test").encode
+    materialiser(ref, "lots", dossier=tmp_path / "lots")
+    materialiser(ref, "lots", dossier=tmp_path / "petits", taille_lot=3)
+    fichiers = sorted(chemin.name for chemin in chemin_magasin("lots", tmp_path / "lots").glob("*.npy"))
+    assert fichiers
+    for nom in fichiers:
+        np.testing.assert_array_equal(
+            np.load(chemin_magasin("lots", tmp_path / "petits") / nom),
+            np.load(chemin_magasin("lots", tmp_path / "lots") / nom),
+            err_msg=nom,
+        )
@@ -0,0 +1,73 @@
+"""Le moteur vectorisé reproduit exactement le calcul historique des passerelles brutes."""
+
+import pandas as pd
+import pytest
+
+from passerelles.moteur import COLONNES_BRUTES, calculer_passerelles
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+
+def passerelles_historiques(metiers_depart, metiers_arrivee):
+    """Double boucle de l'application d'origine (sans la barre de progression)."""
+    lignes = []
+    for code_depart, groupe_depart in metiers_depart.groupby("Code Métier"):
+        intitule_depart = groupe_depart["Intitulé"].iloc[0]
+        competences_depart = set(groupe_depart["Macro Compétence"].dropna())
+        for code_arrivee, groupe_arrivee in metiers_arrivee.groupby("Code Métier"):
+            intitule_arrivee = groupe_arrivee["Intitulé"].iloc[0]
+            competences_arrivee = set(groupe_arrivee["Macro Compétence"].dropna())
+            intersection = competences_depart & competences_arrivee
+            for comp in intersection:
+                if comp in groupe_arrivee["Macro Compétence"].values:
+                    cat = groupe_arrivee[groupe_arrivee["Macro Compétence"] == comp]["Catégorie"].iloc[0]
+                else:
+                    cat = groupe_depart[groupe_depart["Macro Compétence"] == comp]["Catégorie"].iloc[0]
+                lignes.append({
+                    "Code Métier Départ": code_depart,
+                    "Intitulé Départ": intitule_depart,
+                    "Code Métier Arrivée": code_arrivee,
+                    "Intitulé Arrivée": intitule_arrivee,
+                    "Nombre de compétences partagées": len(intersection),
+                    "Catégorie": cat,
+                    "Compétence commune": comp,
+                })
+    return pd.DataFrame(lignes, columns=COLONNES_BRUTES)
+
+
+def normaliser(df):
+    """Valeurs Python (catégories décodées, manquants à ``None``), lignes triées."""
+    df = df.astype(object)
+    df = df.where(df.notna(), None)
+    df["Nombre de compétences partagées"] = df["Nombre de compétences partagées"].astype(int)
+    return df.sort_values(["Code Métier Départ", "Code Métier Arrivée", "Compétence commune"]).reset_index(drop=True)
+
+
+def sens_historiques(df, codes_client):
+    """Tables de départ et d'arrivée des deux feuilles de l'export brut d'origine."""
+    df = df.dropna(subset=["Code Métier", "Intitulé", "Macro Compétence"])
+    client = df["Code Métier"].isin(codes_client)
+    return {
+        "entrantes": (df[~client], df[client]),
+        "sortantes": (df[client], df[~client]),
+        "tous": (df, df),  # couples d'un métier avec lui-même compris
+    }
+
+
+@pytest.mark.parametrize("sens", ["entrantes", "sortantes", "tous"])
+def test_calculer_passerelles_identique_au_calcul_historique(graine, sens):
+    df = generer_referentiel_mixte(graine)
+    depart, arrivee = sens_historiques(df, tirer_codes_client(df, graine))[sens]
+
+    attendu = passerelles_historiques(depart, arrivee)
+    obtenu = calculer_passerelles(depart, arrivee)
+
+    assert list(obtenu.columns) == COLONNES_BRUTES
+    assert len(attendu) > 0
+    pd.testing.assert_frame_equal(normaliser(obtenu), normaliser(attendu))
+
+
+def test_calculer_passerelles_sans_competence_commune():
+    df = generer_referentiel_mixte()
+    depart = df[df["Code Métier"] == "Z1999"]
+    arrivee = df[df["Code Métier"] == "Z1998"]
+    assert calculer_passerelles(depart, arrivee).empty
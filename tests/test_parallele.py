@@ -0,0 +1,69 @@
+"""Le calcul parallèle restitue les mêmes lots que le calcul séquentiel, avec une fenêtre bornée."""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from passerelles import parallele
+from passerelles.moteur import iterer_passerelles
+from passerelles.parallele import LOTS_PAR_PROCESSUS, iterer_passerelles_paralleles
+from passerelles.recherche import sens_bruts
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+TAILLE_LOT = 3
+
+
+def preparer():
+    df = generer_referentiel_mixte()
+    referentiel = construire_referentiel(df, "test")
+    return referentiel.encode, sens_bruts(referentiel.masque(tirer_codes_client(df)))
+
+
+def lots_sequentiels(ref, sens):
+    return [
+        (nom, debut, lignes)
+        for nom, (depart, arrivee) in sens.items()
+        for debut, (_, lignes) in zip(
+            range(0, len(depart), TAILLE_LOT), iterer_passerelles(ref, depart, arrivee, taille_lot=TAILLE_LOT)
+        )
+    ]
+
+
+def verifier_lots(obtenus, attendus):
+    assert [(nom, debut) for nom, debut, _ in obtenus] == [(nom, debut) for nom, debut, _ in attendus]
+    for (_, _, lignes), (_, _, reference) in zip(obtenus, attendus):
+        for cle, valeurs in reference.items():
+            np.testing.assert_array_equal(lignes[cle], valeurs, err_msg=cle)
+
+
+def test_paralleles_identiques_au_calcul_sequentiel():
+    ref, sens = preparer()
+    attendus = lots_sequentiels(ref, sens)
+    verifier_lots(list(iterer_passerelles_paralleles(ref, sens, nb_processus=2, taille_lot=TAILLE_LOT)), attendus)
+
+    # Reprise : les lots déjà calculés sont sautés, les autres restent dans l'ordre
+    deja_calcules = {(nom, debut) for nom, debut, _ in attendus[::2]}
+    reprise = iterer_passerelles_paralleles(
+        ref, sens, nb_processus=2, taille_lot=TAILLE_LOT, deja_calcules=deja_calcules
+    )
+    verifier_lots(list(reprise), attendus[1::2])
+
+
+def test_lots_en_vol_bornes(monkeypatch):
+    soumissions = []
+
+    class PoolCompte(ProcessPoolExecutor):
+        def submit(self, *arguments, **options):
+            soumissions.append(arguments[1:])
+            return super().submit(*arguments, **options)
+
+    monkeypatch.setattr(parallele, "ProcessPoolExecutor", PoolCompte)
+    ref, sens = preparer()
+    nb_lots_max = LOTS_PAR_PROCESSUS * 2
+    flux = iterer_passerelles_paralleles(ref, sens, nb_processus=2, taille_lot=TAILLE_LOT)
+    nb_restitues = 0
+    for nb_restitues, _ in enumerate(flux, start=1):
+        # Lots soumis et pas encore restitués (celui-ci compris) : jamais plus que la fenêtre
+        assert len(soumissions) - (nb_restitues - 1) <= nb_lots_max
+    assert nb_restitues == len(soumissions) > nb_lots_max
@@ -0,0 +1,90 @@
+"""Les parcours du graphe des passerelles sont les meilleurs d'une énumération exhaustive."""
+
+import numpy as np
+import pytest
+
+from passerelles.parcours import BONUS_SECTEUR, graphe_passerelles
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte
+
+POIDS = {"Savoir-faire": 20, "Savoir-être professionnels": 20, "Savoirs": 60}
+
+
+def aretes_attendues(referentiel, poids, seuil):
+    """Arêtes ``départ → {arrivée: score}`` tirées de la recherche interactive, bonus secteur compris."""
+    tous = np.ones(referentiel.nb_metiers, dtype=bool)
+    aretes = {}
+    for code in referentiel.encode.codes:
+        top = referentiel.index.rechercher(code, tous, poids, n=referentiel.nb_metiers).top
+        aretes[code] = {}
+        for arrivee, score in zip(top["Code Métier"], top["Score pondéré total"]):
+            score *= BONUS_SECTEUR if arrivee[0] == code[0] else 1
+            if score >= seuil:
+                aretes[code][arrivee] = score
+    return aretes
+
+
+def parcours_exhaustifs(aretes, depart, arrivee, nb_etapes_max):
+    """Tous les parcours sans boucle de ``depart`` à ``arrivee`` : (coût, codes)."""
+    trouves = []
+
+    def prolonger(chemin, cout):
+        for suivant, score in aretes[chemin[-1]].items():
+            if suivant in chemin:
+                continue
+            if suivant == arrivee:
+                trouves.append((cout + 1 / score, chemin + [suivant]))
+            elif len(chemin) < nb_etapes_max:
+                prolonger(chemin + [suivant], cout + 1 / score)
+
+    prolonger([depart], 0.0)
+    return sorted(trouves, key=lambda parcours: (round(parcours[0], 9), len(parcours[1])))
+
+
+@pytest.mark.parametrize("seuil", [2.0, 6.0])
+def test_graphe_garde_toutes_les_passerelles_au_dessus_du_seuil(graine, seuil):
+    referentiel = construire_referentiel(generer_referentiel_mixte(graine), "test")
+    graphe = graphe_passerelles(referentiel, POIDS, seuil=seuil, taille_lot=7)
+    codes = list(referentiel.encode.codes)
+    attendues = aretes_attendues(referentiel, POIDS, seuil)
+    obtenues = graphe.scores.tocoo()
+    assert {(codes[u], codes[v]) for u, v in zip(obtenues.row, obtenues.col)} == {
+        (depart, arrivee) for depart, suivants in attendues.items() for arrivee in suivants
+    }
+    for u, v, score in zip(obtenues.row, obtenues.col, obtenues.data):
+        assert score == pytest.approx(attendues[codes[u]][codes[v]])
+
+
+@pytest.mark.parametrize("nb_etapes_max", [1, 2, 3])
+def test_chemins_identiques_a_l_enumeration_exhaustive(graine, nb_etapes_max):
+    referentiel = construire_referentiel(generer_referentiel_mixte(graine), "test")
+    graphe = graphe_passerelles(referentiel, POIDS)
+    aretes = aretes_attendues(referentiel, POIDS, graphe.seuil)
+    rng = np.random.default_rng(graine)
+    k = 5
+
+    nb_trouves = 0
+    for rang, depart in enumerate(rng.choice(referentiel.encode.codes, size=40)):
+        # Une fois sur deux, une passerelle directe : elle doit être proposée en une étape
+        voisins = sorted(aretes[depart]) if rang % 2 and aretes[depart] else list(referentiel.encode.codes)
+        arrivee = rng.choice(voisins)
+        if depart == arrivee:
+            continue
+        attendus = parcours_exhaustifs(aretes, depart, arrivee, nb_etapes_max)
+        obtenus = graphe.chemins(depart, arrivee, k=k, nb_etapes_max=nb_etapes_max)
+        assert len(obtenus) == min(k, len(attendus))
+        nb_trouves += len(obtenus)
+        if obtenus.empty:
+            continue
+
+        # Chaque parcours proposé existe et coûte ce qu'il annonce
+        for codes, score in zip(obtenus["Codes"], obtenus["Score du parcours"]):
+            etapes = codes.split(" → ")
+            cout = sum(1 / aretes[u][v] for u, v in zip(etapes, etapes[1:]))
+            assert score == pytest.approx(1 / cout)
+        # ... et ce sont les k meilleurs (les ex aequo au k-ième pouvant s'échanger)
+        np.testing.assert_allclose(1 / obtenus["Score du parcours"], [cout for cout, _ in attendus[:k]])
+        borne = 1 / obtenus["Score du parcours"].iloc[-1]
+        meilleurs = {" → ".join(codes) for cout, codes in attendus if cout < borne - 1e-9}
+        assert meilleurs <= set(obtenus["Codes"])
+    assert nb_trouves > 0
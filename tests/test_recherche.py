@@ -0,0 +1,54 @@
+"""L'interface sans Streamlit reproduit la recherche interactive, métier par métier ou par lots."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from passerelles.recherche import COLONNE_FICHIER, MODES, metiers_du_mode, rechercher, top_passerelles_clients
+from passerelles.referentiel import construire_referentiel
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+POIDS = {"Savoir-faire": 70, "Savoirs": 30}
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_rechercher_identique_a_l_index(graine, mode):
+    df = generer_referentiel_mixte(graine)
+    referentiel = construire_referentiel(df, "test")
+    est_client = referentiel.masque(tirer_codes_client(df, graine))
+    depart, arrivee = metiers_du_mode(referentiel, est_client, mode, POIDS)
+    for code in referentiel.encode.codes[depart]:
+        obtenu = rechercher(referentiel, code, est_client, mode, POIDS)
+        attendu = referentiel.index.rechercher(code, arrivee, POIDS)
+        pd.testing.assert_frame_equal(obtenu.top, attendu.top)
+        pd.testing.assert_frame_equal(obtenu.detail, attendu.detail)
+
+
+def test_top_par_lots_identique_a_rechercher(graine):
+    df = generer_referentiel_mixte(graine)
+    referentiel = construire_referentiel(df, "test")
+    clients = {"a.xlsx": tirer_codes_client(df, graine), "b.xlsx": tirer_codes_client(df, graine + 10, part=0.5)}
+    resultats = top_passerelles_clients(referentiel, clients, POIDS, n=5, taille_lot=7)
+
+    for mode in MODES:
+        for nom, codes_client in clients.items():
+            est_client = referentiel.masque(codes_client)
+            depart, _ = metiers_du_mode(referentiel, est_client, mode, POIDS)
+            obtenus = resultats[mode][resultats[mode][COLONNE_FICHIER] == nom]
+            attendus = []
+            for code in referentiel.encode.codes[depart]:
+                resultat = rechercher(referentiel, code, est_client, mode, POIDS, n=5)
+                top, repartition = resultat.top, resultat.repartition
+                attendus.append(pd.DataFrame({
+                    "Code Métier Départ": code,
+                    "Rang": np.arange(1, len(top) + 1),
+                    "Code Métier Arrivée": top["Code Métier"].astype(object),
+                    "Score pondéré total": top["Score pondéré total"],
+                    "Nombre de compétences partagées": top["Nombre de compétences partagées"],
+                    **{categorie: repartition[categorie] for categorie in POIDS},
+                }))
+            attendus = pd.concat(attendus, ignore_index=True)
+            assert len(attendus)
+            colonnes = list(attendus.columns)
+            obtenus = obtenus[colonnes].astype({"Code Métier Départ": object, "Code Métier Arrivée": object})
+            pd.testing.assert_frame_equal(obtenus.reset_index(drop=True), attendus, check_dtype=False)
@@ -0,0 +1,69 @@
+"""Une tâche d'export annulée reprend après ses lots enregistrés et donne le même fichier qu'un calcul complet."""
+
+import time
+
+import pandas as pd
+
+from passerelles import taches
+from passerelles.export import COLONNE_SENS
+from passerelles.moteur import passerelles_entre
+from passerelles.recherche import sens_bruts
+from passerelles.referentiel import construire_referentiel
+from passerelles.taches import ANNULEE, TERMINEE, GestionnaireTaches
+from tests.conftest import generer_referentiel_mixte, tirer_codes_client
+
+TAILLE_LOT = 3
+NB_LOTS_AVANT_ANNULATION = 3
+
+
+def attendre(gestionnaire, identifiant):
+    while gestionnaire.en_cours(identifiant):
+        time.sleep(0.01)
+    return gestionnaire.etat(identifiant)
+
+
+def test_annulation_puis_reprise(tmp_path, monkeypatch):
+    monkeypatch.setattr(taches, "TAILLE_LOT", TAILLE_LOT)
+    df = generer_referentiel_mixte()
+    referentiel = construire_referentiel(df, "test")
+    sens = sens_bruts(referentiel.masque(tirer_codes_client(df)))
+    nb_lots = sum(-(-len(depart) // TAILLE_LOT) for depart, _ in sens.values())
+    parametres = {"referentiel": "test", "format": "parquet"}
+
+    gestionnaire = GestionnaireTaches(tmp_path)
+    sauvegarder_lot = gestionnaire._sauvegarder_lot
+    sauvegardes = []
+
+    annuler = True
+
+    def sauvegarder_compte(identifiant, rang_sens, debut, lignes):
+        sauvegarder_lot(identifiant, rang_sens, debut, lignes)
+        sauvegardes.append((rang_sens, debut))
+        if annuler and len(sauvegardes) == NB_LOTS_AVANT_ANNULATION:
+            gestionnaire.annuler(identifiant)
+
+    monkeypatch.setattr(gestionnaire, "_sauvegarder_lot", sauvegarder_compte)
+    identifiant = gestionnaire.lancer(parametres, referentiel.encode, sens, "parquet")
+    assert attendre(gestionnaire, identifiant).statut == ANNULEE
+    calcules = gestionnaire._lots_calcules(identifiant, list(sens))
+    assert len(calcules) == NB_LOTS_AVANT_ANNULATION
+
+    # Reprise : seuls les lots manquants sont calculés
+    annuler = False
+    assert gestionnaire.lancer(parametres, referentiel.encode, sens, "parquet") == identifiant
+    etat = attendre(gestionnaire, identifiant)
+    assert etat.statut == TERMINEE
+    assert len(sauvegardes) == nb_lots
+    assert len(set(sauvegardes)) == nb_lots
+
+    resultat = pd.read_parquet(gestionnaire.chemin_fichier(etat))
+    assert list(resultat[COLONNE_SENS].unique()) == list(sens)
+    for nom, (depart, arrivee) in sens.items():
+        obtenu = resultat[resultat[COLONNE_SENS] == nom].drop(columns=COLONNE_SENS).reset_index(drop=True)
+        attendu = passerelles_entre(referentiel.encode, depart, arrivee)
+        pd.testing.assert_frame_equal(obtenu.astype(object), attendu.astype(object), obj=nom)
+
+    # Une tâche terminée est réutilisée telle quelle
+    assert gestionnaire.lancer(parametres, referentiel.encode, sens, "parquet") == identifiant
+    assert not gestionnaire.en_cours(identifiant)
+    assert len(sauvegardes) == nb_lots